@@ -45,6 +45,7 @@ export default function CoachPage() {
   const [loginUserId, setLoginUserId] = useState("")
   const [isLoggingIn, setIsLoggingIn] = useState(false)
   const [userData, setUserData] = useState<any>(null)
+  const [sessionToken, setSessionToken] = useState<string | null>(null)
   const [audioBlob, setAudioBlob] = useState<Blob | null>(null)
   const [fatigueStatus, setFatigueStatus] = useState<string | null>(null)
   const messagesEndRef = useRef<HTMLDivElement>(null)
@@ -58,6 +59,29 @@ export default function CoachPage() {
     scrollToBottom()
   }, [messages])
 
+  // Images are generated in the background; they arrive on the chat event stream
+  useEffect(() => {
+    if (!sessionToken) return
+    const events = new EventSource(`${API_BASE_URL}/api/chat/events?session_token=${encodeURIComponent(sessionToken)}`)
+    events.addEventListener("image_ready", (event) => {
+      const job = JSON.parse((event as MessageEvent).data)
+      setMessages(prev => [...prev, {
+        id: `image-${job.job_id}`,
+        content: "🖼️ Your meal image is ready!",
+        sender: "coach",
+        timestamp: new Date(),
+        type: "nutrition",
+        emoji: "🖼️",
+        data: {
+          image_url: `${API_BASE_URL}${job.image_url || job.file_url}`,
+          thumbnail_url: job.thumbnail_url ? `${API_BASE_URL}${job.thumbnail_url}` : undefined,
+          image_job: job.job_id
+        }
+      }])
+    })
+    return () => events.close()
+  }, [sessionToken])
+
   // Auto-send message when both transcript and audio are ready
   useEffect(() => {
     if (inputMessage && audioBlob && !isTyping) {
@@ -84,6 +108,7 @@ export default function CoachPage() {
       if (data.success) {
         setIsLoggedIn(true)
         setUserData(data.user_data)
+        setSessionToken(data.session_token ?? null)
         setMessages([
           {
             id: "1",
@@ -151,7 +176,8 @@ export default function CoachPage() {
     try {
       const chatData: any = { 
         message: content.trim(),
-        user_id: loginUserId 
+        user_id: loginUserId,
+        session_token: sessionToken
       }
       
       // Include fatigue data if available
@@ -460,11 +486,23 @@ export default function CoachPage() {
                           
                           {/* Message content with enhanced formatting */}
                           {message.sender === "coach" ? (
-                            <FormattedMessageContent 
-                              content={message.content}
-                              type={message.type}
-                              data={message.data}
-                            />
+                            <>
+                              <FormattedMessageContent 
+                                content={message.content}
+                                type={message.type}
+                                data={message.data}
+                              />
+                              {message.data?.image_url && (
+                                <a href={message.data.image_url} target="_blank" rel="noopener noreferrer">
+                                  <img
+                                    src={message.data.thumbnail_url || message.data.image_url}
+                                    alt="Generated meal"
+                                    loading="lazy"
+                                    className="mt-3 rounded-xl max-w-xs shadow-lg"
+                                  />
+                                </a>
+                              )}
+                            </>
                           ) : (
                             <p className="text-sm leading-relaxed font-medium tracking-wide">
                               {message.content}
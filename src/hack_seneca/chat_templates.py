@@ -0,0 +1,345 @@
+"""Declarative template engine for chat intents answered from local data.
+
+Greetings, "what did I eat yesterday", "how many steps this week" and "my
+weight trend" don't need a crew: the answer is a lookup over the user's own
+records. Intents, matchers and response text live in
+``config/chat_templates.yaml``; the handlers below turn the extracted slots and
+the user's data into template values.
+"""
+
+import os
+import random
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import yaml
+
+from .context_builder import user_records
+
+TEMPLATES_CONFIG = os.path.join(os.path.dirname(__file__), "config", "chat_templates.yaml")
+
+# Politeness that may wrap any templated question
+_PREFIX = r"(?:(?:hey|hi|ok|okay|so|coach|please|can you tell me|could you tell me|tell me|do you know)[\s,]+)*"
+_SUFFIX = r"(?:[\s,]+(?:please|coach|thanks))*"
+_STRIP_RE = re.compile(r"[^a-z0-9\s\-]")
+_SPACE_RE = re.compile(r"\s+")
+
+# Questions the templates answer without the crew, offered while the coaching model is down
+LOCAL_SUGGESTIONS = ["How many steps this week", "What did I eat yesterday", "Show my weight trend"]
+
+
+def normalize(message: str) -> str:
+    """Lowercase, drop punctuation (keeping dashes for dates) and collapse spaces"""
+    text = _STRIP_RE.sub(" ", (message or "").lower().replace("'", ""))
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+@dataclass
+class TemplateContext:
+    user_data: Dict[str, Any]
+    slots: Dict[str, str]
+    fatigued: bool = False
+    now: datetime = field(default_factory=datetime.now)
+
+    @property
+    def today(self) -> date:
+        return self.now.date()
+
+    def records(self, kind: str) -> List[Dict[str, Any]]:
+        """User records of one kind, newest first"""
+        return user_records(self.user_data, kind)
+
+
+@dataclass
+class TemplateAnswer:
+    intent: str
+    response: str
+    message_type: str
+    emoji: Optional[str]
+    priority: str
+    suggestions: List[str]
+    data: Dict[str, Any]
+
+
+# ---------------------------------------------------------------------- handlers
+
+def _period_window(period: Optional[str], today: date) -> Tuple[date, date, str]:
+    """(start, end, label) for a named period; defaults to this week"""
+    period = period or "this week"
+    if period == "today":
+        return today, today, "today"
+    if period == "yesterday":
+        day = today - timedelta(days=1)
+        return day, day, "yesterday"
+    monday = today - timedelta(days=today.weekday())
+    if period == "last week":
+        return monday - timedelta(days=7), monday - timedelta(days=1), "last week"
+    return monday, today, "this week"
+
+
+def _in_window(rows: List[Dict[str, Any]], start: date, end: date) -> List[Dict[str, Any]]:
+    start_s, end_s = start.isoformat(), end.isoformat()
+    return [row for row in rows if start_s <= row.get("date", "") <= end_s]
+
+
+def _greeting(ctx: TemplateContext) -> Tuple[str, Dict[str, Any]]:
+    hour = ctx.now.hour
+    if hour < 12:
+        time_greeting, time_emoji = "Good morning", "🌅"
+    elif hour < 17:
+        time_greeting, time_emoji = "Good afternoon", "☀️"
+    else:
+        time_greeting, time_emoji = "Good evening", "🌙"
+    profile = ctx.user_data.get("profile") or {}
+    values = {
+        "time_greeting": time_greeting,
+        "time_emoji": time_emoji,
+        "user_name": profile.get("name", "there"),
+    }
+    return ("fatigued" if ctx.fatigued else "default"), values
+
+
+def _meals_on_day(ctx: TemplateContext) -> Tuple[str, Dict[str, Any]]:
+    rows = ctx.records("nutrition")
+    if not rows:
+        return "empty", {}
+    day = ctx.slots.get("day") or "today"
+    if day == "today":
+        target = ctx.today.isoformat()
+    elif day == "yesterday":
+        target = (ctx.today - timedelta(days=1)).isoformat()
+    else:
+        target = day
+    match = next((row for row in rows if row.get("date") == target), None)
+    row = match or rows[0]
+    values = {
+        "day_label": day if day in ("today", "yesterday") else target,
+        "date": row.get("date"),
+        "calories": row.get("calories_consumed", 0),
+        "protein_g": row.get("protein_g", 0),
+        "carbs_g": row.get("carbs_g", 0),
+        "fat_g": row.get("fat_g", 0),
+        "fiber_g": row.get("fiber_g", 0),
+        "sugar_g": row.get("sugar_g", 0),
+    }
+    return ("found" if match else "missing"), values
+
+
+def _steps_in_period(ctx: TemplateContext) -> Tuple[str, Dict[str, Any]]:
+    rows = ctx.records("activities")
+    if not rows:
+        return "empty", {}
+    start, end, label = _period_window(ctx.slots.get("period"), ctx.today)
+    window = _in_window(rows, start, end)
+    variant = "found" if window else "missing"
+    window = window or rows[:7]
+    steps = sum(row.get("steps", 0) for row in window)
+    values = {
+        "period_label": label,
+        "period_label_title": label.capitalize(),
+        "days": len(window),
+        "start": window[-1].get("date"),
+        "end": window[0].get("date"),
+        "steps": steps,
+        "avg_steps": round(steps / len(window)),
+        "distance_km": round(sum(row.get("distance_km", 0) for row in window), 1),
+        "active_minutes": sum(row.get("active_minutes", 0) for row in window),
+    }
+    return variant, values
+
+
+def _nutrition_in_period(ctx: TemplateContext) -> Tuple[str, Dict[str, Any]]:
+    rows = ctx.records("nutrition")
+    if not rows:
+        return "empty", {}
+    start, end, label = _period_window(ctx.slots.get("period"), ctx.today)
+    window = _in_window(rows, start, end)
+    variant = "found" if window else "missing"
+    window = window or rows[:7]
+    total_calories = sum(row.get("calories_consumed", 0) for row in window)
+    values = {
+        "period_label": label,
+        "period_label_title": label.capitalize(),
+        "days": len(window),
+        "start": window[-1].get("date"),
+        "end": window[0].get("date"),
+        "total_calories": total_calories,
+        "avg_calories": round(total_calories / len(window)),
+        "avg_protein": round(sum(row.get("protein_g", 0) for row in window) / len(window)),
+    }
+    return variant, values
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _weight_trend(ctx: TemplateContext) -> Tuple[str, Dict[str, Any]]:
+    # Measurements without a weight (body fat or waist only) say nothing about the trend
+    rows = [row for row in ctx.records("measurements") if _is_number(row.get("weight"))][:5]
+    if not rows:
+        return "empty", {}
+    last, first = rows[0], rows[-1]
+    has_body_fat = _is_number(last.get("body_fat"))
+    values = {
+        "count": len(rows),
+        "start": first.get("date"),
+        "end": last.get("date"),
+        "first_weight": first["weight"],
+        "last_weight": last["weight"],
+        "last_body_fat": last.get("body_fat"),
+    }
+    if len(rows) < 2:
+        return ("single" if has_body_fat else "single_weight_only"), values
+    change = last["weight"] - first["weight"]
+    values["change"] = change
+    values["direction"] = "trending down" if change < -0.2 else "trending up" if change > 0.2 else "holding steady"
+    if not (has_body_fat and _is_number(first.get("body_fat"))):
+        return "weight_only", values
+    values["fat_change"] = last["body_fat"] - first["body_fat"]
+    return "found", values
+
+
+HANDLERS: Dict[str, Callable[[TemplateContext], Tuple[str, Dict[str, Any]]]] = {
+    "greeting": _greeting,
+    "meals_on_day": _meals_on_day,
+    "steps_in_period": _steps_in_period,
+    "nutrition_in_period": _nutrition_in_period,
+    "weight_trend": _weight_trend,
+}
+
+
+# ------------------------------------------------------------------------ engine
+
+class TemplateIntent:
+    """One intent from the YAML file with its compiled matchers"""
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.name = spec["name"]
+        self.handler = HANDLERS[spec.get("handler", self.name)]
+        self.message_type = spec.get("message_type", "text")
+        self.emoji = spec.get("emoji")
+        self.priority = spec.get("priority", "normal")
+        self.suggestions = spec.get("suggestions", [])
+        self.variants = spec.get("variants", {})
+
+        match = spec.get("match", {})
+        self.words = [normalize(w) for w in match.get("words_only", [])]
+        self.filler = set(match.get("filler", []))
+        self.max_words = match.get("max_words", 4)
+        self.patterns = [
+            re.compile(f"{_PREFIX}(?:{pattern}){_SUFFIX}") for pattern in match.get("patterns", [])
+        ]
+
+    def match(self, text: str) -> Optional[Dict[str, str]]:
+        """Slots extracted from the normalized message, or None if it doesn't match"""
+        if self.words and self._words_only(text):
+            return {}
+        for pattern in self.patterns:
+            found = pattern.fullmatch(text)
+            if found:
+                return {k: v for k, v in found.groupdict().items() if v}
+        return None
+
+    def _words_only(self, text: str) -> bool:
+        tokens = text.split()
+        if not tokens or len(tokens) > self.max_words:
+            return False
+        matched_any = False
+        i = 0
+        while i < len(tokens):
+            for phrase in self.words:
+                parts = phrase.split()
+                if len(parts) > 1 and tokens[i:i + len(parts)] == parts:
+                    i += len(parts)
+                    matched_any = True
+                    break
+                # Allow stretched greetings such as "hiii" or "heyyy"
+                if len(parts) == 1 and tokens[i].startswith(phrase) and set(tokens[i][len(phrase):]) <= {phrase[-1]}:
+                    i += 1
+                    matched_any = True
+                    break
+            else:
+                if tokens[i] not in self.filler:
+                    return False
+                i += 1
+        return matched_any
+
+    def render(self, ctx: TemplateContext) -> TemplateAnswer:
+        variant_name, values = self.handler(ctx)
+        variant = self.variants[variant_name]
+        if not isinstance(variant, dict):
+            variant = {"text": variant}
+        text = variant["text"]
+        if isinstance(text, list):
+            text = random.choice(text)
+        return TemplateAnswer(
+            intent=self.name,
+            response=text.format(**values),
+            message_type=variant.get("message_type", self.message_type),
+            emoji=variant.get("emoji", self.emoji),
+            priority=variant.get("priority", self.priority),
+            suggestions=variant.get("suggestions", self.suggestions),
+            data={"template": self.name, "variant": variant_name, **ctx.slots},
+        )
+
+
+class TemplateEngine:
+    """Matches chat messages against the YAML intents and answers them locally"""
+
+    def __init__(self, config_path: str = TEMPLATES_CONFIG):
+        with open(config_path, "r") as f:
+            config = yaml.safe_load(f) or {}
+        self.intents = [TemplateIntent(spec) for spec in config.get("intents", [])]
+        self._lock = threading.Lock()
+        self.messages_seen = 0
+        self.hits = Counter()
+
+    def answer(
+        self,
+        message: str,
+        user_data: Dict[str, Any],
+        fatigued: bool = False,
+        now: Optional[datetime] = None,
+    ) -> Optional[TemplateAnswer]:
+        """Answer the message from a template, or None if no intent matches"""
+        text = normalize(message)
+        result = None
+        for intent in self.intents:
+            slots = intent.match(text)
+            if slots is None:
+                continue
+            ctx = TemplateContext(user_data=user_data or {}, slots=slots, fatigued=fatigued, now=now or datetime.now())
+            result = intent.render(ctx)
+            break
+
+        with self._lock:
+            self.messages_seen += 1
+            if result:
+                self.hits[result.intent] += 1
+            stats = self._stats_locked()
+        if result:
+            print(f"[TEMPLATES] {result.intent} answered locally (coverage {stats['coverage']:.1%} of {stats['messages_seen']} messages)")
+        return result
+
+    def _stats_locked(self) -> Dict[str, Any]:
+        answered = sum(self.hits.values())
+        return {
+            "messages_seen": self.messages_seen,
+            "answered": answered,
+            "coverage": answered / self.messages_seen if self.messages_seen else 0.0,
+            "hits_by_intent": {intent.name: self.hits[intent.name] for intent in self.intents},
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = self._stats_locked()
+        stats["coverage"] = round(stats["coverage"], 3)
+        return stats
+
+
+template_engine = TemplateEngine()
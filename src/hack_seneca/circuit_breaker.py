@@ -0,0 +1,190 @@
+"""Per-provider circuit breakers.
+
+When Groq, Azure or FLUX degrade, every request used to wait out the full
+timeout and worker slots piled up. Each provider gets a breaker that watches
+a rolling window of calls (the last ``window_seconds``); when enough of them
+fail or take longer than ``slow_seconds`` it opens and calls are rejected
+immediately with ``CircuitOpenError``, so the API can answer with a degraded
+response instead. After ``open_seconds`` a few probe calls are let through
+(half-open); if they succeed the breaker closes again.
+
+Breakers are applied in the pooled HTTP transports (``http_clients.py``), so
+every Groq, FLUX and Azure call is counted. Thresholds are tunable per
+provider, e.g. ``CIRCUIT_FLUX_SLOW_SECONDS=45``, ``CIRCUIT_GROQ_OPEN_SECONDS=60``.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose circuit is open"""
+
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(f"{provider} circuit is open; retry in {retry_in:.0f}s")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+def caused_by_open_circuit(exc: BaseException) -> bool:
+    """True if the exception or anything in its cause/context chain is a CircuitOpenError (SDKs wrap transport errors)"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        if isinstance(exc, CircuitOpenError):
+            return True
+        seen.add(id(exc))
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker over a rolling window of call outcomes and latencies"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        slow_seconds: float = 30.0,
+        window_seconds: float = 60.0,
+        min_calls: int = 5,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_seconds = slow_seconds
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._lock = threading.Lock()
+        self._calls: Deque[Tuple[float, bool]] = deque(maxlen=500)  # (finished at, counted as failure)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._stats = {"calls": 0, "failures": 0, "slow": 0, "rejected": 0, "opened": 0}
+
+    def _trim_locked(self, now: float):
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    def _state_locked(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def _open_locked(self, now: float, reason: str):
+        self._state = OPEN
+        self._opened_at = now
+        self._stats["opened"] += 1
+        print(f"[CIRCUIT] {self.name} opened ({reason}); failing fast for {self.open_seconds:.0f}s")
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state_locked(time.monotonic())
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected (doesn't take a half-open probe slot)"""
+        return self.state == OPEN
+
+    def before_call(self):
+        """Reserve a call, or raise CircuitOpenError when the circuit rejects it"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._state_locked(now)
+            if state == OPEN or (state == HALF_OPEN and self._probes >= self.half_open_calls):
+                self._stats["rejected"] += 1
+                retry_in = max(0.0, self.open_seconds - (now - self._opened_at)) if state == OPEN else 1.0
+                raise CircuitOpenError(self.name, retry_in)
+            if state == HALF_OPEN:
+                self._probes += 1
+
+    def release(self):
+        """Give back a call reserved by before_call that never reached the provider"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record(self, ok: bool, seconds: float):
+        """Outcome of a call that before_call let through"""
+        now = time.monotonic()
+        slow = seconds > self.slow_seconds
+        failed = not ok or slow
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["failures"] += 0 if ok else 1
+            self._stats["slow"] += 1 if slow else 0
+            state = self._state_locked(now)
+            if state == HALF_OPEN:
+                if failed:
+                    self._open_locked(now, "probe failed" if not ok else f"probe took {seconds:.1f}s")
+                elif self._probes >= self.half_open_calls:
+                    self._state = CLOSED
+                    self._calls.clear()
+                    print(f"[CIRCUIT] {self.name} closed after a successful probe")
+                return
+            self._calls.append((now, failed))
+            self._trim_locked(now)
+            if state == CLOSED and len(self._calls) >= self.min_calls:
+                failures = sum(1 for _, bad in self._calls if bad)
+                if failures / len(self._calls) >= self.failure_rate:
+                    self._open_locked(now, f"{failures}/{len(self._calls)} calls failed or slow")
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            state = self._state_locked(now)
+            self._trim_locked(now)
+            recent = len(self._calls)
+            failures = sum(1 for _, bad in self._calls if bad)
+            stats = dict(self._stats)
+        stats.update({
+            "state": state,
+            "recent_calls": recent,
+            "recent_failure_rate": round(failures / recent, 3) if recent else 0.0,
+            "retry_in_s": round(max(0.0, self.open_seconds - (now - self._opened_at)), 1) if state == OPEN else 0.0,
+        })
+        return stats
+
+
+# Slow-call thresholds follow each provider's normal latency (vision ~10 s, crew LLM turns and images ~30-60 s)
+_SLOW_DEFAULTS = {"groq": 20.0, "azure": 60.0, "flux": 60.0}
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    """Process-wide breaker for the provider, configured from CIRCUIT_<PROVIDER>_* variables"""
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            prefix = f"CIRCUIT_{provider.upper()}_"
+            breaker = _breakers[provider] = CircuitBreaker(
+                provider,
+                failure_rate=float(os.getenv(prefix + "FAILURE_RATE", "0.5")),
+                slow_seconds=float(os.getenv(prefix + "SLOW_SECONDS", _SLOW_DEFAULTS.get(provider, 30.0))),
+                window_seconds=float(os.getenv(prefix + "WINDOW_SECONDS", "60")),
+                min_calls=int(os.getenv(prefix + "MIN_CALLS", "5")),
+                open_seconds=float(os.getenv(prefix + "OPEN_SECONDS", "30")),
+            )
+        return breaker
+
+
+def is_open(provider: str) -> bool:
+    return get_breaker(provider).is_open()
+
+
+def snapshot(providers: Optional[Tuple[str, ...]] = None) -> Dict[str, Dict[str, Any]]:
+    """State of the given providers' breakers (all created ones by default)"""
+    names = providers or tuple(_breakers)
+    return {name: get_breaker(name).snapshot() for name in names}
@@ -0,0 +1,246 @@
+"""Compact per-user prompt context for the crew tasks.
+
+``tasks.yaml`` interpolates the user's profile, activities, measurements and
+nutrition into every agent prompt, so passing raw record lists makes prompt
+size (and latency, and cost) grow with the user's history. The builder turns
+the records into short digests — rolling averages, deltas and the last few
+rows — trims them to a token budget and caches the result until the user's
+data changes.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "400"))
+DEFAULT_LAST_ROWS = 3
+
+_encoder = None
+_encoder_loaded = False
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when its encoding is available, else ~4 chars per token"""
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        _encoder_loaded = True
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoder = None
+    if _encoder is not None:
+        return len(_encoder.encode(text))
+    return (len(text) + 3) // 4
+
+
+def user_records(user_data: Dict[str, Any], kind: str) -> List[Dict[str, Any]]:
+    """Records of one kind, newest first; accepts both the API and CLI data layouts"""
+    rows = user_data.get(kind) or user_data.get(f"recent_{kind}") or []
+    return sorted(rows, key=lambda row: row.get("date", ""), reverse=True)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+# (field, unit) shown for the latest measurement
+_MEASUREMENT_FIELDS = (("weight", "kg"), ("body_fat", "% body fat"), ("muscle_mass", "kg muscle"), ("waist", "cm waist"))
+
+
+def _mean(rows: List[Dict[str, Any]], key: str) -> Optional[float]:
+    values = [row[key] for row in rows if isinstance(row.get(key), (int, float))]
+    return sum(values) / len(values) if values else None
+
+
+def _delta(current: Optional[float], previous: Optional[float]) -> str:
+    if current is None or previous is None:
+        return ""
+    return f" ({current - previous:+.0f} vs prior week)"
+
+
+@dataclass
+class UserDigest:
+    user_id: str
+    profile: str
+    activities: str
+    measurements: str
+    nutrition: str
+    tokens: int
+    raw_tokens: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(self.raw_tokens - self.tokens, 0)
+
+    def as_inputs(self) -> Dict[str, str]:
+        """Values for the user_* placeholders in tasks.yaml"""
+        return {
+            "user_profile": self.profile,
+            "user_activities": self.activities,
+            "user_measurements": self.measurements,
+            "user_nutrition": self.nutrition,
+        }
+
+
+class ContextBuilder:
+    """Builds and caches compact digests of a user's data"""
+
+    def __init__(self, token_budget: int = DEFAULT_TOKEN_BUDGET, last_rows: int = DEFAULT_LAST_ROWS):
+        self.token_budget = token_budget
+        self.last_rows = last_rows
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[str, UserDigest]] = {}
+        self._stats = {"requests": 0, "builds": 0, "tokens_sent": 0, "tokens_saved": 0}
+
+    # ----------------------------------------------------------------- caching
+
+    @staticmethod
+    def data_version(user_data: Dict[str, Any]) -> str:
+        """Cheap fingerprint over the profile, record counts and newest record of each kind"""
+        parts = [json.dumps(user_data.get("profile"), sort_keys=True, default=str)]
+        for kind in ("activities", "measurements", "nutrition"):
+            rows = user_data.get(kind) or user_data.get(f"recent_{kind}") or []
+            newest = max(rows, key=lambda row: row.get("date", ""), default=None)
+            parts.append(f"{kind}:{len(rows)}:{json.dumps(newest, sort_keys=True, default=str)}")
+        return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+    def digest(self, user_id: str, user_data: Dict[str, Any]) -> UserDigest:
+        """Digest for the user, rebuilt only when their data changed"""
+        version = self.data_version(user_data)
+        with self._lock:
+            cached = self._cache.get(user_id)
+        if cached and cached[0] == version:
+            digest = cached[1]
+        else:
+            digest = self.build(user_id, user_data)
+            with self._lock:
+                self._cache[user_id] = (version, digest)
+                self._stats["builds"] += 1
+
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["tokens_sent"] += digest.tokens
+            self._stats["tokens_saved"] += digest.tokens_saved
+        return digest
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._cache.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        requests = stats["requests"] or 1
+        stats["avg_tokens_saved_per_request"] = round(stats["tokens_saved"] / requests, 1)
+        return stats
+
+    # ---------------------------------------------------------------- building
+
+    def build(self, user_id: str, user_data: Dict[str, Any]) -> UserDigest:
+        profile = user_data.get("profile") or {}
+        activities = user_records(user_data, "activities")
+        measurements = user_records(user_data, "measurements")
+        nutrition = user_records(user_data, "nutrition")
+
+        raw_tokens = sum(
+            count_tokens(str(value)) for value in (profile, activities, measurements, nutrition)
+        )
+
+        # Shrink the number of raw rows shown until the digest fits the budget
+        last_rows = self.last_rows
+        while True:
+            sections = (
+                self._profile_digest(profile),
+                self._activity_digest(activities, last_rows),
+                self._measurement_digest(measurements, last_rows),
+                self._nutrition_digest(nutrition, last_rows),
+            )
+            tokens = sum(count_tokens(section) for section in sections)
+            if tokens <= self.token_budget or last_rows == 0:
+                break
+            last_rows -= 1
+
+        return UserDigest(user_id, *sections, tokens=tokens, raw_tokens=raw_tokens)
+
+    @staticmethod
+    def _profile_digest(profile: Dict[str, Any]) -> str:
+        if not profile:
+            return "No profile data available"
+        labels = [
+            ("name", "Name", ""), ("age", "Age", ""), ("weight", "Weight", "kg"),
+            ("height", "Height", "cm"), ("bmi", "BMI", ""),
+            ("fitness_level", "Fitness Level", ""), ("goals", "Goals", ""),
+        ]
+        return ", ".join(
+            f"{label}: {profile[key]}{unit}" for key, label, unit in labels if profile.get(key) is not None
+        )
+
+    @staticmethod
+    def _activity_digest(rows: List[Dict[str, Any]], last_rows: int) -> str:
+        if not rows:
+            return "No recent activity data"
+        week, prior = rows[:7], rows[7:14]
+        steps, prior_steps = _mean(week, "steps"), _mean(prior, "steps")
+        calories, prior_calories = _mean(week, "calories_burned"), _mean(prior, "calories_burned")
+        lines = [
+            f"7-day avg: {steps or 0:.0f} steps/day{_delta(steps, prior_steps)}, "
+            f"{calories or 0:.0f} kcal burned/day{_delta(calories, prior_calories)}, "
+            f"{_mean(week, 'active_minutes') or 0:.0f} active min/day, "
+            f"avg HR {_mean(week, 'heart_rate_avg') or 0:.0f}"
+        ]
+        for row in rows[:last_rows]:
+            lines.append(
+                f"{row.get('date')}: {row.get('steps')} steps, {row.get('calories_burned')} kcal, "
+                f"{row.get('active_minutes')} active min, workout {row.get('workout_duration')} min"
+            )
+        return "; ".join(lines)
+
+    @staticmethod
+    def _measurement_digest(rows: List[Dict[str, Any]], last_rows: int) -> str:
+        if not rows:
+            return "No recent measurements"
+        latest = rows[0]
+        fields = [
+            f"{latest[key]}{unit}" for key, unit in _MEASUREMENT_FIELDS if _is_number(latest.get(key))
+        ]
+        text = f"Latest ({latest.get('date')}): {', '.join(fields) or 'no values recorded'}"
+        # Each delta compares the two newest rows that actually recorded that field
+        changes = []
+        for key, label in (("weight", "kg weight"), ("body_fat", " pts body fat")):
+            recorded = [row for row in rows if _is_number(row.get(key))][:2]
+            if len(recorded) == 2:
+                changes.append(f"{recorded[0][key] - recorded[1][key]:+.1f}{label} since {recorded[1].get('date')}")
+        if changes:
+            text += ". Change: " + ", ".join(changes)
+        weighed = [row for row in rows[1:] if _is_number(row.get("weight"))]
+        older = [f"{row.get('date')}: {row['weight']}kg" for row in weighed[:max(last_rows - 1, 0)]]
+        if older:
+            text += ". Earlier: " + ", ".join(older)
+        return text
+
+    @staticmethod
+    def _nutrition_digest(rows: List[Dict[str, Any]], last_rows: int) -> str:
+        if not rows:
+            return "No recent nutrition data"
+        week, prior = rows[:7], rows[7:14]
+        calories, prior_calories = _mean(week, "calories_consumed"), _mean(prior, "calories_consumed")
+        protein, prior_protein = _mean(week, "protein_g"), _mean(prior, "protein_g")
+        lines = [
+            f"7-day avg: {calories or 0:.0f} kcal/day{_delta(calories, prior_calories)}, "
+            f"{protein or 0:.0f}g protein{_delta(protein, prior_protein)}, "
+            f"{_mean(week, 'carbs_g') or 0:.0f}g carbs, {_mean(week, 'fat_g') or 0:.0f}g fat, "
+            f"{_mean(week, 'fiber_g') or 0:.0f}g fiber"
+        ]
+        for row in rows[:last_rows]:
+            lines.append(
+                f"{row.get('date')}: {row.get('calories_consumed')} kcal, {row.get('protein_g')}g P, "
+                f"{row.get('carbs_g')}g C, {row.get('fat_g')}g F"
+            )
+        return "; ".join(lines)
+
+
+context_builder = ContextBuilder()
@@ -0,0 +1,258 @@
+"""Per-user conversation history shared by the API and the CLI.
+
+Turns are kept in an in-memory ring buffer per (user, session) and written
+through to SQLite, so history survives restarts and is shared by both entry
+points. Once the uncompacted turns exceed a token budget, the older ones are
+folded into a rolling summary on a background thread; the prompt context is
+always "summary + last few turns", so its size stays bounded however long the
+chat goes.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from .context_builder import count_tokens
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_DB_PATH = os.getenv(
+    "CONVERSATION_DB_PATH", os.path.join(_PROJECT_ROOT, "users_data", "conversations.db")
+)
+
+NEW_CONVERSATION = "This is the start of a new conversation."
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+@dataclass
+class Turn:
+    role: str  # "user" or "assistant"
+    content: str
+    tokens: int
+    row_id: Optional[int] = None
+
+
+@dataclass
+class SessionBuffer:
+    turns: Deque[Turn]
+    summary: str = ""
+    compacting: bool = False
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+def _clip(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens, on a word boundary"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    words = text.split()
+    clipped = " ".join(words[: max_tokens * 3 // 4])
+    return clipped + " …"
+
+
+def extractive_summary(previous: str, turns: List[Turn], max_tokens: int) -> str:
+    """Local summarizer: first sentence of each turn appended to the previous summary"""
+    lines = [previous] if previous else []
+    for turn in turns:
+        first = _SENTENCE_RE.split(" ".join(turn.content.split()), maxsplit=1)[0]
+        speaker = "User" if turn.role == "user" else "Coach"
+        lines.append(f"{speaker}: {_clip(first, 40)}")
+    summary = " | ".join(lines)
+    # Keep the most recent part of the summary when it outgrows its budget
+    while count_tokens(summary) > max_tokens and " | " in summary:
+        summary = summary.split(" | ", 1)[1]
+    return summary
+
+
+class ConversationStore:
+    """Ring-buffered, SQLite-backed conversation history with background compaction"""
+
+    def __init__(
+        self,
+        db_path: str = DEFAULT_DB_PATH,
+        buffer_turns: int = 20,
+        token_budget: int = 600,
+        keep_recent: int = 6,
+        turn_tokens: int = 150,
+        summary_tokens: int = 250,
+        summarizer: Optional[Callable[[str, List[Turn], int], str]] = None,
+    ):
+        self.db_path = db_path
+        self.buffer_turns = buffer_turns
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.turn_tokens = turn_tokens
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer or extractive_summary
+        self._buffers: Dict[Tuple[str, str], SessionBuffer] = {}
+        self._buffers_lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversation-compactor")
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._db_lock:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS turns (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    session_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    tokens INTEGER NOT NULL,
+                    compacted INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_turns_session ON turns (user_id, session_id, compacted, id);
+                CREATE INDEX IF NOT EXISTS idx_turns_user ON turns (user_id, id);
+                CREATE TABLE IF NOT EXISTS summaries (
+                    user_id TEXT NOT NULL,
+                    session_id TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (user_id, session_id)
+                );
+                """
+            )
+            if db_path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.commit()
+
+    # ----------------------------------------------------------------- buffers
+
+    def _buffer(self, user_id: str, session_id: str) -> SessionBuffer:
+        key = (user_id, session_id)
+        with self._buffers_lock:
+            buffer = self._buffers.get(key)
+            if buffer is not None:
+                return buffer
+
+        # Lazily restore the session from SQLite
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT id, role, content, tokens FROM turns "
+                "WHERE user_id = ? AND session_id = ? AND compacted = 0 ORDER BY id DESC LIMIT ?",
+                (user_id, session_id, self.buffer_turns),
+            ).fetchall()
+            summary_row = self._conn.execute(
+                "SELECT summary FROM summaries WHERE user_id = ? AND session_id = ?",
+                (user_id, session_id),
+            ).fetchone()
+        turns = deque(
+            (Turn(role, content, tokens, row_id) for row_id, role, content, tokens in reversed(rows)),
+            maxlen=self.buffer_turns,
+        )
+        buffer = SessionBuffer(turns=turns, summary=summary_row[0] if summary_row else "")
+        with self._buffers_lock:
+            return self._buffers.setdefault(key, buffer)
+
+    # ------------------------------------------------------------------ writes
+
+    def append(self, user_id: str, session_id: str, role: str, content: str):
+        """Record a turn and schedule compaction if the session outgrew its budget"""
+        turn = Turn(role=role, content=content, tokens=count_tokens(content))
+        # Restore the buffer before writing so the new turn isn't loaded twice
+        buffer = self._buffer(user_id, session_id)
+        with self._db_lock:
+            cursor = self._conn.execute(
+                "INSERT INTO turns (user_id, session_id, role, content, tokens, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, session_id, role, content, turn.tokens, time.time()),
+            )
+            self._conn.commit()
+        turn.row_id = cursor.lastrowid
+
+        with buffer.lock:
+            if len(buffer.turns) == buffer.turns.maxlen:
+                # The oldest turn is about to fall out of the ring; fold it in first
+                self._compact_locked(user_id, session_id, buffer, [buffer.turns[0]])
+            buffer.turns.append(turn)
+            over_budget = sum(min(t.tokens, self.turn_tokens) for t in buffer.turns) > self.token_budget
+            schedule = over_budget and not buffer.compacting and len(buffer.turns) > self.keep_recent
+            if schedule:
+                buffer.compacting = True
+        if schedule:
+            self._executor.submit(self._compact, user_id, session_id, buffer)
+
+    def record_exchange(self, user_id: str, session_id: str, user_message: str, reply: str):
+        self.append(user_id, session_id, "user", user_message)
+        self.append(user_id, session_id, "assistant", reply)
+
+    # -------------------------------------------------------------- compaction
+
+    def _compact(self, user_id: str, session_id: str, buffer: SessionBuffer):
+        try:
+            with buffer.lock:
+                old = list(buffer.turns)[: -self.keep_recent]
+                if old:
+                    self._compact_locked(user_id, session_id, buffer, old)
+        except Exception as e:
+            print(f"[CONVERSATION] Compaction failed for {user_id}/{session_id}: {e}")
+        finally:
+            buffer.compacting = False
+
+    def _compact_locked(self, user_id: str, session_id: str, buffer: SessionBuffer, old: List[Turn]):
+        """Fold the given oldest turns into the summary (buffer.lock must be held)"""
+        summary = self.summarizer(buffer.summary, old, self.summary_tokens)
+        ids = [(turn.row_id,) for turn in old if turn.row_id is not None]
+        with self._db_lock:
+            self._conn.executemany("UPDATE turns SET compacted = 1 WHERE id = ?", ids)
+            self._conn.execute(
+                "INSERT INTO summaries (user_id, session_id, summary, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(user_id, session_id) DO UPDATE SET summary = excluded.summary, "
+                "updated_at = excluded.updated_at",
+                (user_id, session_id, summary, time.time()),
+            )
+            self._conn.commit()
+        buffer.summary = summary
+        for _ in old:
+            buffer.turns.popleft()
+
+    # ------------------------------------------------------------------- reads
+
+    def context(self, user_id: str, session_id: str) -> str:
+        """Prompt-ready history: rolling summary plus the most recent turns"""
+        buffer = self._buffer(user_id, session_id)
+        with buffer.lock:
+            summary = buffer.summary
+            recent = list(buffer.turns)[-self.keep_recent:]
+        if not summary and not recent:
+            return NEW_CONVERSATION
+
+        parts = []
+        if summary:
+            parts.append(f"Summary of earlier conversation: {summary}")
+        if recent:
+            lines = [
+                f"{'User' if turn.role == 'user' else 'Assistant'}: {_clip(turn.content, self.turn_tokens)}"
+                for turn in recent
+            ]
+            parts.append("Recent turns:\n" + "\n".join(lines))
+        return "\n\n".join(parts)
+
+    def recent_turns(self, user_id: str, after_id: int, limit: int) -> List[Tuple[int, str, str, str]]:
+        """(id, session_id, role, content) of the user's newest turns after the given row id, oldest first"""
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT id, session_id, role, content FROM turns WHERE user_id = ? AND id > ? ORDER BY id DESC LIMIT ?",
+                (user_id, after_id, limit),
+            ).fetchall()
+        return rows[::-1]
+
+    def flush(self, timeout: float = 5.0):
+        """Wait for pending background compactions (used by the CLI on exit)"""
+        self._executor.submit(lambda: None).result(timeout=timeout)
+
+
+@lru_cache(maxsize=1)
+def get_conversation_store() -> ConversationStore:
+    """Shared store; the database is opened on first use"""
+    return ConversationStore()
@@ -1,12 +1,74 @@
 from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
 from crewai.llm import LLM
+from crewai.llms.base_llm import BaseLLM
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+import litellm
 import os
+import threading
 from dotenv import load_dotenv
 from .tools.custom_tool import FluxImageGenerator
+from .tools.meal_plan_tool import MealPlanOptimizer
+from .router import ROUTE_FITNESS, ROUTE_NUTRITION
+from .http_clients import get_client
+from .llm_router import LLMProvider, hedged_llm_from_env
+from .retrieval import MEMORY_MODE
+from .prompt_cache import check_layout
+from .structured_output import LocalRepairConverter, NutritionPlan, WorkoutPlan
+from .tiers import CrewTier, resolve_tier
 
 load_dotenv()
 
+def _azure_llm(model, api_key, base_url, api_version) -> LLM:
+    return LLM(
+        model=model or "azure/gpt-4",
+        api_key=api_key,
+        base_url=base_url,
+        api_version=api_version or "2024-12-01-preview",
+        temperature=0.1,
+        max_retries=0  # retried once, quota-aware, by the pooled transport instead of blindly by the SDK
+    )
+
+@lru_cache(maxsize=4)
+def get_llm(model: Optional[str] = None) -> BaseLLM:
+    """Crew LLM shared by every crew: configured Azure endpoints behind the hedging router (per tier model)"""
+    # Configure Azure LLM
+    model = model or os.getenv("model")
+    api_key = os.getenv("AZURE_AI_API_KEY")
+    base_url = os.getenv("AZURE_AI_ENDPOINT")
+    api_version = os.getenv("AZURE_AI_API_VERSION")
+    
+    print(f"🔧 Configuring Azure LLM:")
+    print(f"   Model: {model}")
+    print(f"   Base URL: {base_url}")
+    print(f"   API Version: {api_version}")
+    print(f"   API Key: {'✅ Set' if api_key else '❌ Missing'}")
+    
+    if not api_key or not base_url:
+        print("Warning: Azure AI API credentials not found in environment variables.")
+        os.environ["OPENAI_API_KEY"] = "dummy-key-for-azure"
+        return LLM(model="gpt-3.5-turbo")
+    os.environ["OPENAI_API_KEY"] = "dummy-key-for-azure"
+    try:
+        litellm.client_session = get_client("azure")
+        providers = [LLMProvider("primary", _azure_llm(model, api_key, base_url, api_version))]
+        # Optional second deployment/endpoint to hedge slow calls against; unset values reuse the primary's
+        secondary_model = os.getenv("AZURE_AI_SECONDARY_MODEL")
+        secondary_url = os.getenv("AZURE_AI_SECONDARY_ENDPOINT")
+        if secondary_model or secondary_url:
+            providers.append(LLMProvider("secondary", _azure_llm(
+                secondary_model or model,
+                os.getenv("AZURE_AI_SECONDARY_API_KEY", api_key),
+                secondary_url or base_url,
+                os.getenv("AZURE_AI_SECONDARY_API_VERSION", api_version),
+            )))
+        print(f"   Providers: {', '.join(provider.name for provider in providers)}")
+        return hedged_llm_from_env(providers)
+    except Exception as e:
+        print(f"Warning: Failed to configure Azure LLM: {e}")
+        return LLM(model="gpt-3.5-turbo")
+
 @CrewBase
 class FitnessCrew():
     """Hierarchical fitness crew with manager delegation"""
@@ -14,39 +76,15 @@ class FitnessCrew():
     agents_config = 'config/agents.yaml'
     tasks_config = 'config/tasks.yaml'
     
-    def __init__(self):
-        # Configure Azure LLM
-        model = os.getenv("model")
-        api_key = os.getenv("AZURE_AI_API_KEY")
-        base_url = os.getenv("AZURE_AI_ENDPOINT")
-        api_version = os.getenv("AZURE_AI_API_VERSION")
-        
-        print(f"🔧 Configuring Azure LLM:")
-        print(f"   Model: {model}")
-        print(f"   Base URL: {base_url}")
-        print(f"   API Version: {api_version}")
-        print(f"   API Key: {'✅ Set' if api_key else '❌ Missing'}")
-        
-        if not api_key or not base_url:
-            print("Warning: Azure AI API credentials not found in environment variables.")
-            os.environ["OPENAI_API_KEY"] = "dummy-key-for-azure"
-            self.llm = LLM(model="gpt-3.5-turbo")
-        else:
-            os.environ["OPENAI_API_KEY"] = "dummy-key-for-azure"
-            try:
-                self.llm = LLM(
-                    model=model or "azure/gpt-4",
-                    api_key=api_key,
-                    base_url=base_url,
-                    api_version=api_version or "2024-12-01-preview",
-                    temperature=0.1
-                )
-            except Exception as e:
-                print(f"Warning: Failed to configure Azure LLM: {e}")
-                self.llm = LLM(model="gpt-3.5-turbo")
+    def __init__(self, tier: Optional[CrewTier] = None):
+        # Reasoning, iteration cap, tools and model follow the request's latency tier
+        self.tier = tier or resolve_tier(None)
+        # The LLM (and its connection pool) is built once per process, not per crew
+        self.llm = get_llm(self.tier.model)
         
         # Tools
         self.flux_tool = FluxImageGenerator()
+        self.meal_plan_tool = MealPlanOptimizer()
 
     @agent
     def manager_agent(self) -> Agent:
@@ -54,11 +92,11 @@ class FitnessCrew():
         return Agent(
             config=self.agents_config['manager_agent'],
             llm=self.llm,
-            verbose=True,
-            memory=True,
+            verbose=self.tier.verbose,
+            memory=MEMORY_MODE == "crewai",
             allow_delegation=True,
-            max_iter=3,
-            reasoning=True
+            max_iter=self.tier.max_iter,
+            reasoning=self.tier.reasoning
         )
 
     @agent
@@ -67,8 +105,8 @@ class FitnessCrew():
         return Agent(
             config=self.agents_config['fitness_agent'],
             llm=self.llm,
-            max_iter=3,
-            verbose=True,
+            max_iter=self.tier.max_iter,
+            verbose=self.tier.verbose,
             allow_delegation=False
         )
 
@@ -79,10 +117,10 @@ class FitnessCrew():
             config=self.agents_config['nutritionist_agent'],
             llm=self.llm,
             function_calling_llm=self.llm,
-            verbose=True,
-            max_iter=3,
+            verbose=self.tier.verbose,
+            max_iter=self.tier.max_iter,
             allow_delegation=False,
-            tools=[self.flux_tool]
+            tools=[self.flux_tool, self.meal_plan_tool] if self.tier.tools else []
         )
 
     @task
@@ -98,7 +136,9 @@ class FitnessCrew():
         """Create the fitness task for workout and exercise requests"""
         return Task(
             config=self.tasks_config['fitness_task'],
-            agent=self.fitness_agent()
+            agent=self.fitness_agent(),
+            output_pydantic=WorkoutPlan,
+            converter_cls=LocalRepairConverter
         )
 
     @task
@@ -106,7 +146,9 @@ class FitnessCrew():
         """Create the nutritionist task with image generation capability"""
         return Task(
             config=self.tasks_config['nutritionist_task'],
-            agent=self.nutritionist_agent()
+            agent=self.nutritionist_agent(),
+            output_pydantic=NutritionPlan,
+            converter_cls=LocalRepairConverter
         )
 
     @crew
@@ -123,6 +165,51 @@ class FitnessCrew():
             ],
             process=Process.hierarchical,
             manager_llm=self.llm,
-            verbose=True,
+            verbose=self.tier.verbose,
+            memory=MEMORY_MODE == "crewai"  # CrewAI memory embeds remotely on every turn; local mode uses {knowledge}
+        )
+
+    @crew
+    def fitness_crew(self) -> Crew:
+        """Single-agent crew used when the router sends a request straight to the fitness coach"""
+        return Crew(
+            agents=[self.fitness_agent()],
+            tasks=[self.fitness_task()],
+            process=Process.sequential,
+            verbose=self.tier.verbose,
             memory=False
-        )
\ No newline at end of file
+        )
+
+    @crew
+    def nutrition_crew(self) -> Crew:
+        """Single-agent crew used when the router sends a request straight to the nutritionist"""
+        return Crew(
+            agents=[self.nutritionist_agent()],
+            tasks=[self.nutritionist_task()],
+            process=Process.sequential,
+            verbose=self.tier.verbose,
+            memory=False
+        )
+
+    def crew_for_route(self, route: str) -> Crew:
+        """Pick the crew for a routing decision; unknown routes go through the manager"""
+        if route == ROUTE_FITNESS:
+            return self.fitness_crew()
+        if route == ROUTE_NUTRITION:
+            return self.nutrition_crew()
+        return self.chat_crew()
+
+
+_templates: Dict[Tuple[str, str], Crew] = {}
+_templates_lock = threading.Lock()
+
+
+def tier_crew(tier: CrewTier, route: str) -> Crew:
+    """Fresh copy of the crew precompiled for this tier and route (copying is ~3x cheaper than building)"""
+    key = (tier.name, route)
+    with _templates_lock:
+        template = _templates.get(key)
+        if template is None:
+            template = _templates[key] = FitnessCrew(tier).crew_for_route(route)
+            check_layout(template.tasks)
+    return template.copy()
@@ -0,0 +1,353 @@
+"""Pooled, retrying HTTP clients for the model providers.
+
+Groq, FLUX and the Azure LLM used to open a fresh client (and so fresh TCP and
+TLS handshakes) on every call. This module keeps one ``httpx`` client per
+provider and process, sync and async, with keep-alive pools, HTTP/2 when the
+``h2`` package is installed, per-provider timeouts and retries with jittered
+exponential backoff on connection errors, 429 and 5xx (honouring
+``Retry-After``). Each provider's calls go through its circuit breaker
+(``circuit_breaker.py``): the final outcome after retries is recorded, and an
+open circuit raises ``CircuitOpenError`` without touching the network. Before
+each attempt a call also waits for its model's requests/tokens-per-minute
+budget (``rate_limiter.py``), so 429s are avoided rather than retried.
+
+Timeouts and retries are tunable per provider, e.g. ``HTTP_GROQ_TIMEOUT=30``,
+``HTTP_FLUX_RETRIES=1``.
+
+Run ``python -m hack_seneca.http_clients`` to compare pooled and per-call
+clients against a local stub server.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+import httpx
+
+from .circuit_breaker import get_breaker
+from .instrumentation import span
+from .rate_limiter import ModelLimiter, RateLimitTimeout, current_user, describe_request, get_limiter
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+@dataclass(frozen=True)
+class ProviderConfig:
+    name: str
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0
+    retries: int = 2
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    max_connections: int = 50
+    max_keepalive: int = 20
+
+    @property
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+    @property
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive)
+
+
+# Read timeouts follow each provider's typical latency: vision ~10 s, images ~60 s, crew LLM turns ~120 s
+_DEFAULTS: Dict[str, ProviderConfig] = {
+    "groq": ProviderConfig("groq", read_timeout=60.0),
+    "flux": ProviderConfig("flux", read_timeout=90.0, retries=1),
+    "azure": ProviderConfig("azure", read_timeout=120.0),
+}
+
+
+def provider_config(provider: str) -> ProviderConfig:
+    """Defaults for the provider, overridden by HTTP_<PROVIDER>_TIMEOUT / _CONNECT_TIMEOUT / _RETRIES"""
+    base = _DEFAULTS.get(provider, ProviderConfig(provider))
+    prefix = f"HTTP_{provider.upper()}_"
+    return ProviderConfig(
+        name=provider,
+        connect_timeout=float(os.getenv(prefix + "CONNECT_TIMEOUT", base.connect_timeout)),
+        read_timeout=float(os.getenv(prefix + "TIMEOUT", base.read_timeout)),
+        retries=int(os.getenv(prefix + "RETRIES", base.retries)),
+        backoff_base=base.backoff_base,
+        backoff_max=base.backoff_max,
+        max_connections=base.max_connections,
+        max_keepalive=base.max_keepalive,
+    )
+
+
+class RetryStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, provider: str, key: str):
+        with self._lock:
+            counts = self.counts.setdefault(provider, {"requests": 0, "retries": 0, "gave_up": 0})
+            counts[key] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {provider: dict(counts) for provider, counts in self.counts.items()}
+
+
+retry_stats = RetryStats()
+
+
+def _backoff(config: ProviderConfig, attempt: int, response: Optional[httpx.Response]) -> float:
+    """Full-jitter exponential backoff, or the server's Retry-After when it sends one"""
+    if response is not None:
+        retry_after = response.headers.get("retry-after", "")
+        try:
+            return min(float(retry_after), config.backoff_max)
+        except ValueError:
+            pass
+    return random.uniform(0, min(config.backoff_max, config.backoff_base * (2 ** attempt)))
+
+
+def _quota(provider: str, request: httpx.Request):
+    """Limiter and estimated token cost of the request"""
+    try:
+        body = request.content
+    except httpx.RequestNotRead:  # streamed upload, cost unknown
+        body = b""
+    model, tokens = describe_request(request.url.path, body)
+    return get_limiter(provider, model), tokens
+
+
+def _wait_for_quota(limiter: ModelLimiter, tokens: int):
+    if not limiter.try_acquire(tokens):
+        with span("rate_limit_wait", kind="queue", provider=limiter.provider, model=limiter.model):
+            limiter.acquire(tokens, current_user())
+
+
+async def _wait_for_quota_async(limiter: ModelLimiter, tokens: int):
+    if not limiter.try_acquire(tokens):
+        with span("rate_limit_wait", kind="queue", provider=limiter.provider, model=limiter.model):
+            await limiter.acquire_async(tokens, current_user())
+
+
+class RetryTransport(httpx.HTTPTransport):
+    """Keep-alive transport that retries connection errors, 429 and 5xx behind the provider's circuit breaker and rate limiter"""
+
+    def __init__(self, config: ProviderConfig, **kwargs):
+        super().__init__(**kwargs)
+        self.config = config
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        breaker = get_breaker(self.config.name)
+        breaker.before_call()
+        limiter, tokens = _quota(self.config.name, request)
+        try:
+            _wait_for_quota(limiter, tokens)
+        except RateLimitTimeout:
+            breaker.release()
+            raise
+        started = time.perf_counter()
+        try:
+            response = self._send(request, limiter, tokens)
+        except Exception:
+            breaker.record(False, time.perf_counter() - started)
+            raise
+        breaker.record(response.status_code not in RETRY_STATUSES, time.perf_counter() - started)
+        return response
+
+    def _send(self, request: httpx.Request, limiter: ModelLimiter, tokens: int) -> httpx.Response:
+        retry_stats.record(self.config.name, "requests")
+        attempt = 0
+        while True:
+            if attempt:
+                _wait_for_quota(limiter, tokens)
+            sent = time.perf_counter()
+            try:
+                response = super().handle_request(request)
+                limiter.observe(response.status_code, response.headers, time.perf_counter() - sent)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError) as error:
+                if not isinstance(error, httpx.RemoteProtocolError):
+                    limiter.refund(tokens)  # no connection, so the request never reached the provider
+                if attempt >= self.config.retries:
+                    retry_stats.record(self.config.name, "gave_up")
+                    raise
+                response = None
+            if response is not None and (response.status_code not in RETRY_STATUSES or attempt >= self.config.retries):
+                if response.status_code in RETRY_STATUSES:
+                    retry_stats.record(self.config.name, "gave_up")
+                return response
+            delay = _backoff(self.config, attempt, response)
+            if response is not None:
+                response.close()
+            retry_stats.record(self.config.name, "retries")
+            print(f"[HTTP] {self.config.name}: retrying {request.url.host} in {delay:.2f}s (attempt {attempt + 1})")
+            time.sleep(delay)
+            attempt += 1
+
+
+class AsyncRetryTransport(httpx.AsyncHTTPTransport):
+    """Async counterpart of RetryTransport"""
+
+    def __init__(self, config: ProviderConfig, **kwargs):
+        super().__init__(**kwargs)
+        self.config = config
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        breaker = get_breaker(self.config.name)
+        breaker.before_call()
+        limiter, tokens = _quota(self.config.name, request)
+        try:
+            await _wait_for_quota_async(limiter, tokens)
+        except RateLimitTimeout:
+            breaker.release()
+            raise
+        started = time.perf_counter()
+        try:
+            response = await self._send(request, limiter, tokens)
+        except Exception:
+            breaker.record(False, time.perf_counter() - started)
+            raise
+        breaker.record(response.status_code not in RETRY_STATUSES, time.perf_counter() - started)
+        return response
+
+    async def _send(self, request: httpx.Request, limiter: ModelLimiter, tokens: int) -> httpx.Response:
+        retry_stats.record(self.config.name, "requests")
+        attempt = 0
+        while True:
+            if attempt:
+                await _wait_for_quota_async(limiter, tokens)
+            sent = time.perf_counter()
+            try:
+                response = await super().handle_async_request(request)
+                limiter.observe(response.status_code, response.headers, time.perf_counter() - sent)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError) as error:
+                if not isinstance(error, httpx.RemoteProtocolError):
+                    limiter.refund(tokens)  # no connection, so the request never reached the provider
+                if attempt >= self.config.retries:
+                    retry_stats.record(self.config.name, "gave_up")
+                    raise
+                response = None
+            if response is not None and (response.status_code not in RETRY_STATUSES or attempt >= self.config.retries):
+                if response.status_code in RETRY_STATUSES:
+                    retry_stats.record(self.config.name, "gave_up")
+                return response
+            delay = _backoff(self.config, attempt, response)
+            if response is not None:
+                await response.aclose()
+            retry_stats.record(self.config.name, "retries")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+@lru_cache(maxsize=None)
+def get_client(provider: str) -> httpx.Client:
+    """Process-wide pooled client for the provider"""
+    config = provider_config(provider)
+    transport = RetryTransport(config, http2=HTTP2_AVAILABLE, limits=config.limits)
+    return httpx.Client(transport=transport, timeout=config.timeout, http2=HTTP2_AVAILABLE)
+
+
+@lru_cache(maxsize=None)
+def get_async_client(provider: str) -> httpx.AsyncClient:
+    """Process-wide pooled async client for the provider (use from one event loop)"""
+    config = provider_config(provider)
+    transport = AsyncRetryTransport(config, http2=HTTP2_AVAILABLE, limits=config.limits)
+    return httpx.AsyncClient(transport=transport, timeout=config.timeout, http2=HTTP2_AVAILABLE)
+
+
+@lru_cache(maxsize=4)
+def get_groq_client(api_key: str) -> Any:
+    """Groq SDK client reusing the pooled transport; retries happen in the transport"""
+    from groq import Groq
+    return Groq(api_key=api_key, http_client=get_client("groq"), max_retries=0)
+
+
+def stats() -> Dict[str, Any]:
+    return {"http2": HTTP2_AVAILABLE, "providers": retry_stats.snapshot()}
+
+
+# -------------------------------------------------------------------- benchmark
+
+def _start_stub_server(fail_every: int):
+    """Local HTTP/1.1 keep-alive server returning small JSON; every Nth request gets a 503"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    counter = {"n": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+        wbufsize = 64 * 1024  # send headers and body in one write
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("content-length", 0)))
+            with lock:
+                counter["n"] += 1
+                fail = fail_every and counter["n"] % fail_every == 0
+            body = b'{"error":"busy"}' if fail else b'{"ok":true}'
+            self.send_response(503 if fail else 200)
+            if fail:
+                self.send_header("Retry-After", "0")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _measure(label: str, call, requests: int):
+    latencies = []
+    failures = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        t = time.perf_counter()
+        if call().status_code != 200:
+            failures += 1
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print(
+        f"📊 {label:<28} {requests / elapsed:8,.0f} req/s   p50 {statistics.median(latencies) * 1000:6.2f} ms   "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:6.2f} ms   non-200: {failures}"
+    )
+
+
+def _benchmark(requests: int, fail_every: int):
+    server = _start_stub_server(fail_every)
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/chat"
+    payload = {"prompt": "grilled chicken with quinoa"}
+    print(f"Stub server at {url}, every {fail_every or 'no'}th request returns 503")
+
+    _measure("fresh client per call", lambda: httpx.post(url, json=payload), max(requests // 10, 1))
+    config = ProviderConfig("bench-no-retry", retries=0)
+    no_retry = httpx.Client(transport=RetryTransport(config, limits=config.limits), timeout=config.timeout)
+    _measure("pooled, no retries", lambda: no_retry.post(url, json=payload), requests)
+    config = ProviderConfig("bench", retries=2, backoff_base=0.001)
+    pooled = httpx.Client(transport=RetryTransport(config, limits=config.limits), timeout=config.timeout)
+    _measure("pooled + retries", lambda: pooled.post(url, json=payload), requests)
+    print(f"   retries: {retry_stats.snapshot().get('bench')}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pooled provider clients against a local stub server")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--fail-every", type=int, default=50, help="Return 503 for every Nth request (0 = never)")
+    args = parser.parse_args()
+    _benchmark(args.requests, args.fail_every)
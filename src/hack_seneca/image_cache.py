@@ -0,0 +1,404 @@
+"""Prompt-keyed cache for generated images.
+
+Meal suggestions keep asking FLUX for near-identical pictures ("grilled
+chicken with quinoa and broccoli"). Generated images are stored
+content-addressed (``<root>/cas/ab/<sha256>.png``) so identical bytes are kept
+once, and a JSON manifest maps normalized prompt signatures to those blobs.
+A lookup is an exact signature match first, then (optionally) the closest
+earlier prompt by token Jaccard similarity. Total blob size is bounded; the
+least recently used prompts are evicted and unreferenced blobs deleted.
+
+Every API worker has its own ``ImageCache`` over the same directory, so the
+manifest is never just overwritten: each save takes an exclusive lock on
+``manifest.lock``, merges the manifest other workers wrote, and only then
+evicts and writes it back. Blobs are written and deleted under that lock, so
+eviction sees every worker's references.
+
+Each new blob also gets WebP thumbnails at fixed widths
+(``<sha256>_256.webp``, ``<sha256>_512.webp``; ``IMAGE_THUMBNAIL_SIZES``) when
+Pillow is installed. Since every file is named by its hash it never changes,
+so the API serves them under ``/static/images/`` with the hash as a strong
+ETag and ``immutable`` cache headers.
+
+Run ``python -m hack_seneca.image_cache --stats`` to inspect the cache.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Set, Tuple
+
+try:
+    from PIL import Image
+    PILLOW_AVAILABLE = True
+except ImportError:
+    PILLOW_AVAILABLE = False
+
+try:
+    import fcntl
+    FILE_LOCKS_AVAILABLE = True
+except ImportError:  # Windows: workers merge manifests without locking
+    FILE_LOCKS_AVAILABLE = False
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_ROOT = os.getenv("IMAGE_CACHE_DIR", os.path.join(_PROJECT_ROOT, "assets", "images"))
+THUMBNAIL_SIZES = tuple(sorted(int(s) for s in os.getenv("IMAGE_THUMBNAIL_SIZES", "256,512").split(",") if s.strip()))
+STATIC_PREFIX = "/static/images"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# <sha256>.png or <sha256>_<size>.webp
+_ASSET_NAME_RE = re.compile(r"^([0-9a-f]{64})(?:_(\d+))?\.(png|webp)$")
+
+# Words that don't change what the picture shows
+_STOPWORDS = frozenset(
+    "a an the of with and or in on for to some fresh healthy delicious tasty plate bowl "
+    "serving image photo picture showing professional clean fitness related meal".split()
+)
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+def prompt_tokens(prompt: str) -> FrozenSet[str]:
+    """Content words of a prompt, lowercased and crudely singularized"""
+    tokens = set()
+    for word in _WORD_RE.findall((prompt or "").lower()):
+        if word in _STOPWORDS or len(word) < 2:
+            continue
+        if len(word) > 3 and word.endswith("es") and word[:-2].endswith(("sh", "ch", "o", "x")):
+            word = word[:-2]
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.add(word)
+    return frozenset(tokens)
+
+
+def prompt_signature(prompt: str) -> str:
+    """Order- and phrasing-insensitive key of a prompt"""
+    return hashlib.sha1(" ".join(sorted(prompt_tokens(prompt))).encode("utf-8")).hexdigest()
+
+
+def parse_asset_name(name: str) -> Optional[Tuple[str, Optional[int]]]:
+    """(digest, thumbnail size or None) of a static asset file name, or None if it isn't one"""
+    match = _ASSET_NAME_RE.match(name)
+    if match is None or (match.group(2) is None) != (match.group(3) == "png"):
+        return None
+    size = int(match.group(2)) if match.group(2) else None
+    if size is not None and size not in THUMBNAIL_SIZES:
+        return None
+    return match.group(1), size
+
+
+def asset_urls(path: Optional[str]) -> Dict[str, Any]:
+    """Static URLs of a stored image and its thumbnails, given its blob path"""
+    if not path:
+        return {}
+    match = _ASSET_NAME_RE.match(os.path.basename(path))
+    if match is None or match.group(2):
+        return {}
+    digest = match.group(1)
+    image_url = f"{STATIC_PREFIX}/{digest}.png"
+    thumbnails = {size: f"{STATIC_PREFIX}/{digest}_{size}.webp" for size in THUMBNAIL_SIZES} if PILLOW_AVAILABLE else {}
+    return {
+        "image_url": image_url,
+        # The chat bubble is ~320 px wide, so the largest thumbnail stays sharp on 2x screens
+        "thumbnail_url": thumbnails[max(thumbnails)] if thumbnails else image_url,
+        "thumbnails": thumbnails,
+    }
+
+
+@dataclass
+class CachedImage:
+    signature: str
+    prompt: str
+    tokens: List[str]
+    digest: str
+    created_at: float
+    last_access: float
+    hits: int = 0
+
+
+class ImageCache:
+    """Content-addressed image store with a prompt index, LRU size bound and JSON manifest"""
+
+    def __init__(
+        self,
+        root: str = DEFAULT_ROOT,
+        max_bytes: int = 500 * 1024 * 1024,
+        fuzzy_threshold: Optional[float] = 0.8,
+        save_interval: float = 30.0,
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.fuzzy_threshold = fuzzy_threshold
+        self.save_interval = save_interval
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.lock_path = os.path.join(root, "manifest.lock")
+        self._lock = threading.RLock()
+        self._entries: Dict[str, CachedImage] = {}
+        self._blobs: Dict[str, int] = {}  # digest -> size in bytes
+        self._token_sets: Dict[str, FrozenSet[str]] = {}
+        self._unsaved: Set[str] = set()  # signatures stored here but not yet in the manifest on disk
+        self._dirty_since: Optional[float] = None
+        self._stats = {
+            "lookups": 0, "hits": 0, "fuzzy_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "thumbnails": 0,
+        }
+        self._load()
+
+    # --------------------------------------------------------------- storage
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, "cas", digest[:2], f"{digest}.png")
+
+    def thumbnail_path(self, digest: str, size: int) -> str:
+        return os.path.join(self.root, "cas", digest[:2], f"{digest}_{size}.webp")
+
+    def asset_path(self, digest: str, size: Optional[int] = None) -> Optional[str]:
+        """File of a stored image or one of its thumbnails (rendered now if missing), or None"""
+        if size is None:
+            path = self.blob_path(digest)
+            return path if os.path.exists(path) else None
+        path = self.thumbnail_path(digest, size)
+        if os.path.exists(path):
+            return path
+        if not PILLOW_AVAILABLE or not os.path.exists(self.blob_path(digest)):
+            return None
+        # Blobs stored before thumbnails existed, or whose thumbnail write failed
+        with open(self.blob_path(digest), "rb") as f:
+            written = self._write_thumbnails(digest, f.read(), sizes=(size,))
+        with self._lock:
+            if digest in self._blobs:
+                self._blobs[digest] += written
+        return path if os.path.exists(path) else None
+
+    def _write_thumbnails(self, digest: str, image_bytes: bytes, sizes: Tuple[int, ...] = THUMBNAIL_SIZES) -> int:
+        """Render WebP thumbnails next to the blob; returns the bytes written"""
+        if not PILLOW_AVAILABLE or not sizes:
+            return 0
+        written = 0
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as source:
+                source.load()
+                if source.mode not in ("RGB", "RGBA"):
+                    source = source.convert("RGBA" if "A" in source.getbands() else "RGB")
+                for size in sizes:
+                    thumbnail = source.copy()
+                    thumbnail.thumbnail((size, size), Image.LANCZOS)
+                    path = self.thumbnail_path(digest, size)
+                    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                    thumbnail.save(tmp_path, format="WEBP", quality=80, method=4)
+                    os.replace(tmp_path, path)
+                    written += os.path.getsize(path)
+                    self._stats["thumbnails"] += 1
+        except (OSError, ValueError) as e:
+            print(f"[IMAGE-CACHE] Could not render thumbnails for {digest[:12]}: {e}")
+        return written
+
+    @contextmanager
+    def _manifest_lock(self) -> Iterator[None]:
+        """Exclusive lock on the manifest, shared by every process using this root"""
+        os.makedirs(self.root, exist_ok=True)
+        if not FILE_LOCKS_AVAILABLE:
+            yield
+            return
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.manifest_path):
+            return None
+        try:
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[IMAGE-CACHE] Ignoring unreadable manifest: {e}")
+            return None
+
+    def _load(self):
+        manifest = self._read_manifest()
+        if manifest is not None:
+            self._merge_locked(manifest)
+
+    def _merge_locked(self, manifest: Dict[str, Any]):
+        """Adopt the manifest on disk, keeping this process's newer access times and unsaved stores
+
+        Entries missing from it (and not stored here since the last save) were
+        evicted by another worker and are dropped.
+        """
+        entries: Dict[str, CachedImage] = {}
+        for raw in manifest.get("entries", []):
+            entry = CachedImage(**raw)
+            mine = self._entries.get(entry.signature)
+            if mine is not None and mine.digest == entry.digest:
+                entry.last_access = max(entry.last_access, mine.last_access)
+                entry.hits = max(entry.hits, mine.hits)
+            entries[entry.signature] = entry
+        for signature in self._unsaved:
+            if signature in self._entries:
+                entries[signature] = self._entries[signature]
+        sizes = {**manifest.get("blobs", {}), **self._blobs}
+        self._entries = {
+            signature: entry for signature, entry in entries.items() if os.path.exists(self.blob_path(entry.digest))
+        }
+        self._token_sets = {signature: frozenset(entry.tokens) for signature, entry in self._entries.items()}
+        referenced = {entry.digest for entry in self._entries.values()}
+        self._blobs = {digest: size for digest, size in sizes.items() if digest in referenced}
+
+    def _save_locked(self, keep: Optional[str] = None):
+        """Merge with the manifest on disk, evict down to max_bytes and write it back (manifest lock held)"""
+        manifest = self._read_manifest()
+        if manifest is not None:
+            self._merge_locked(manifest)
+        self._evict_locked(keep=keep)
+        manifest = {
+            "version": 1,
+            "entries": [asdict(entry) for entry in self._entries.values()],
+            "blobs": self._blobs,
+        }
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+        self._unsaved.clear()
+        self._dirty_since = None
+
+    def flush(self):
+        with self._lock:
+            if self._dirty_since is not None:
+                with self._manifest_lock():
+                    self._save_locked()
+
+    # ---------------------------------------------------------------- lookup
+
+    def get(self, prompt: str) -> Optional[str]:
+        """Path of a cached image for the prompt, or None"""
+        signature = prompt_signature(prompt)
+        with self._lock:
+            self._stats["lookups"] += 1
+            entry = self._entries.get(signature)
+            if entry is None and self.fuzzy_threshold:
+                entry = self._closest_locked(prompt_tokens(prompt))
+                if entry is not None:
+                    self._stats["fuzzy_hits"] += 1
+            if entry is None or not os.path.exists(self.blob_path(entry.digest)):
+                self._stats["misses"] += 1
+                return None
+            entry.hits += 1
+            entry.last_access = time.time()
+            self._stats["hits"] += 1
+            # Access times only need to survive restarts roughly; don't rewrite the manifest per hit
+            if self._dirty_since is None:
+                self._dirty_since = time.time()
+            elif time.time() - self._dirty_since > self.save_interval:
+                with self._manifest_lock():
+                    self._save_locked()
+            return self.blob_path(entry.digest)
+
+    def _closest_locked(self, tokens: FrozenSet[str]) -> Optional[CachedImage]:
+        if not tokens:
+            return None
+        best, best_score = None, 0.0
+        for signature, other in self._token_sets.items():
+            union = len(tokens | other)
+            score = len(tokens & other) / union if union else 0.0
+            if score > best_score:
+                best, best_score = signature, score
+        if best is None or best_score < self.fuzzy_threshold:
+            return None
+        return self._entries.get(best)
+
+    # ----------------------------------------------------------------- store
+
+    def put(self, prompt: str, image_bytes: bytes) -> str:
+        """Store a generated image for the prompt and return its path"""
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        path = self.blob_path(digest)
+        tokens = prompt_tokens(prompt)
+        signature = prompt_signature(prompt)
+        now = time.time()
+        with self._lock, self._manifest_lock():
+            # Another worker may have evicted the blob; it isn't deleted while the lock is held
+            if digest not in self._blobs or not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(image_bytes)
+                os.replace(tmp_path, path)
+                self._blobs[digest] = len(image_bytes) + self._write_thumbnails(digest, image_bytes)
+            self._entries[signature] = CachedImage(
+                signature=signature, prompt=prompt, tokens=sorted(tokens), digest=digest,
+                created_at=now, last_access=now,
+            )
+            self._token_sets[signature] = tokens
+            self._unsaved.add(signature)
+            self._stats["stores"] += 1
+            self._save_locked(keep=signature)
+        return path
+
+    def _evict_locked(self, keep: Optional[str] = None):
+        while sum(self._blobs.values()) > self.max_bytes and len(self._entries) > 1:
+            victim = min(
+                (entry for entry in self._entries.values() if entry.signature != keep),
+                key=lambda entry: entry.last_access,
+            )
+            del self._entries[victim.signature]
+            self._token_sets.pop(victim.signature, None)
+            self._stats["evictions"] += 1
+            if not any(entry.digest == victim.digest for entry in self._entries.values()):
+                self._blobs.pop(victim.digest, None)
+                for path in [self.blob_path(victim.digest)] + [
+                    self.thumbnail_path(victim.digest, size) for size in THUMBNAIL_SIZES
+                ]:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                try:
+                    os.rmdir(os.path.dirname(self.blob_path(victim.digest)))
+                except OSError:
+                    pass
+
+    # ----------------------------------------------------------------- stats
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["prompts"] = len(self._entries)
+            stats["blobs"] = len(self._blobs)
+            stats["bytes"] = sum(self._blobs.values())
+        stats["thumbnail_sizes"] = list(THUMBNAIL_SIZES) if PILLOW_AVAILABLE else []
+        stats["hit_rate"] = round(stats["hits"] / stats["lookups"], 3) if stats["lookups"] else 0.0
+        return stats
+
+
+def _fuzzy_threshold_from_env() -> Optional[float]:
+    value = os.getenv("IMAGE_CACHE_FUZZY_THRESHOLD", "0.8").strip().lower()
+    return None if value in ("", "off", "0", "none") else float(value)
+
+
+image_cache = ImageCache(
+    max_bytes=int(float(os.getenv("IMAGE_CACHE_MAX_MB", "500")) * 1024 * 1024),
+    fuzzy_threshold=_fuzzy_threshold_from_env(),
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the generated-image cache")
+    parser.add_argument("--stats", action="store_true", help="Print cache size and entries")
+    parser.add_argument("--lookup", help="Show which cached image a prompt would hit")
+    args = parser.parse_args()
+    if args.lookup:
+        started = time.perf_counter()
+        path = image_cache.get(args.lookup)
+        print(f"{path or 'miss'} ({(time.perf_counter() - started) * 1000:.2f} ms)")
+    else:
+        print(json.dumps(image_cache.stats(), indent=2))
@@ -0,0 +1,192 @@
+"""Background image generation jobs.
+
+The FLUX call takes tens of seconds; run inside the nutritionist agent it
+held every nutrition answer hostage. The tool now submits a job here and
+returns a placeholder reference straight away. A small thread pool generates
+the image; the job's status is served at ``/api/images/{job_id}`` and a
+``image_ready`` event is pushed to the owner's chat event stream
+(``/api/chat/events``) carrying the image's static and thumbnail URLs.
+
+Open event streams wait on a per-stream ``asyncio.Event`` that the worker
+thread sets through ``loop.call_soon_threadsafe``, so an idle stream costs no
+thread (the default executor is shared with chat and food analysis).
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from .image_cache import asset_urls
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# User whose chat request is running, so jobs started by the crew can be delivered to them
+_current_owner: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("image_job_owner", default=None)
+_current_jobs: contextvars.ContextVar[Optional[List[str]]] = contextvars.ContextVar("image_jobs_started", default=None)
+
+
+@dataclass
+class ImageJob:
+    job_id: str
+    prompt: str
+    owner: Optional[str]
+    status: str = QUEUED
+    path: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def status_url(self) -> str:
+        return f"/api/images/{self.job_id}"
+
+    @property
+    def file_url(self) -> Optional[str]:
+        return f"/api/images/{self.job_id}/file" if self.status == DONE else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["status_url"] = self.status_url
+        data["file_url"] = self.file_url
+        # Hash-named static URLs (full PNG and WebP thumbnails) that browsers may cache forever
+        data.update(asset_urls(self.path) if self.status == DONE else {})
+        return data
+
+
+class ImageJobQueue:
+    """Thread-pool backed generation queue with per-owner completion events"""
+
+    def __init__(self, generate: Callable[[str], str], max_workers: int = 2, max_jobs: int = 1000):
+        self.generate = generate
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-jobs")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, ImageJob]" = OrderedDict()
+        # Per-owner event log: (sequence, event name, job snapshot)
+        self._events: Dict[str, List[Tuple[int, str, Dict[str, Any]]]] = defaultdict(list)
+        # Event streams waiting for an owner's next event: (their loop, their wake-up event)
+        self._waiters: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = defaultdict(set)
+        self._sequence = 0
+        self._stats = {"submitted": 0, "done": 0, "failed": 0, "generation_seconds": 0.0}
+
+    def submit(self, prompt: str, owner: Optional[str] = None) -> ImageJob:
+        """Queue an image for the prompt and return its job immediately"""
+        job = ImageJob(job_id=uuid.uuid4().hex[:12], prompt=prompt, owner=owner or _current_owner.get())
+        with self._lock:
+            self._jobs[job.job_id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+            self._stats["submitted"] += 1
+        started = _current_jobs.get()
+        if started is not None:
+            started.append(job.job_id)
+        self._executor.submit(self._run, job)
+        print(f"[IMAGES] Queued job {job.job_id} for {job.owner or 'anonymous'}")
+        return job
+
+    def _run(self, job: ImageJob):
+        job.status = RUNNING
+        started = time.perf_counter()
+        try:
+            job.path = self.generate(job.prompt)
+            job.status = DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        job.finished_at = time.time()
+        elapsed = time.perf_counter() - started
+        print(f"[IMAGES] Job {job.job_id} {job.status} in {elapsed:.1f}s" + (f": {job.path}" if job.path else ""))
+        with self._lock:
+            self._stats[job.status] += 1
+            self._stats["generation_seconds"] += elapsed
+            waiters = ()
+            if job.owner:
+                self._sequence += 1
+                name = "image_ready" if job.status == DONE else "image_failed"
+                events = self._events[job.owner]
+                events.append((self._sequence, name, job.to_dict()))
+                del events[:-50]
+                waiters = list(self._waiters.get(job.owner, ()))
+        for loop, wake in waiters:
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:
+                pass  # the stream's loop has closed
+
+    def get(self, job_id: str) -> Optional[ImageJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def latest_sequence(self) -> int:
+        with self._lock:
+            return self._sequence
+
+    def _events_after(self, owner: str, after: int) -> List[Tuple[int, str, Dict[str, Any]]]:
+        return [event for event in self._events.get(owner, ()) if event[0] > after]
+
+    async def wait_events(self, owner: str, after: int, timeout: float) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """Owner's events newer than ``after``, waiting up to ``timeout`` seconds for one (no thread held)"""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            events = self._events_after(owner, after)
+            if events:
+                return events
+            self._waiters[owner].add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(owner)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[owner]
+        with self._lock:
+            return self._events_after(owner, after)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = sum(1 for job in self._jobs.values() if job.status in (QUEUED, RUNNING))
+        stats["generation_seconds"] = round(stats["generation_seconds"], 1)
+        return stats
+
+
+@contextmanager
+def image_owner(owner: Optional[str]) -> Iterator[List[str]]:
+    """Attribute jobs started in this block to the owner; yields the list of their IDs"""
+    started: List[str] = []
+    owner_token = _current_owner.set(owner)
+    jobs_token = _current_jobs.set(started)
+    try:
+        yield started
+    finally:
+        _current_owner.reset(owner_token)
+        _current_jobs.reset(jobs_token)
+
+
+_queue: Optional[ImageJobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_image_queue() -> ImageJobQueue:
+    """Process-wide queue running the FLUX generator"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            from .tools.custom_tool import generate_flux_image
+            _queue = ImageJobQueue(generate_flux_image, max_workers=int(os.getenv("IMAGE_JOB_WORKERS", "2")))
+        return _queue
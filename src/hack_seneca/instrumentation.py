@@ -0,0 +1,387 @@
+"""Per-request tracing of crew agents, tasks, LLM calls and tools.
+
+Every instrumented API request gets a trace ID. While the request runs, a
+listener on the CrewAI event bus turns task, agent, LLM and tool events into
+spans on that trace: wall time, LLM calls, prompt/completion tokens (and how
+many prompt tokens the provider served from its prefix cache) and agent
+iterations. Code outside the crew (routing, caches, the Groq vision call) adds
+its own spans with ``span()``.
+
+Finished traces go into a rolling in-memory store (``/debug/traces``) and are
+folded into per-step latency/token aggregates (``/api/metrics``).
+"""
+
+import contextvars
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+TRACE_HEADER = "X-Trace-ID"
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("current_trace", default=None)
+
+
+@dataclass
+class Span:
+    kind: str  # request, step, crew, task, agent, llm, tool
+    name: str
+    started_at: float
+    duration_ms: float = 0.0
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0  # prompt tokens the provider served from its prompt-prefix cache
+    iterations: int = 0
+    error: Optional[str] = None
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Trace:
+    trace_id: str
+    label: str
+    started_at: float
+    duration_ms: float = 0.0
+    spans: List[Span] = field(default_factory=list)
+    # Spans started by crew events and not finished yet, keyed by (kind, id)
+    open: Dict[Tuple[str, Any], Tuple[Span, Any]] = field(default_factory=dict, repr=False)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, span: Span):
+        with self.lock:
+            self.spans.append(span)
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            spans = list(self.spans)
+        return {
+            "trace_id": self.trace_id,
+            "label": self.label,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 1),
+            "spans": len(spans),
+            "llm_calls": sum(s.llm_calls for s in spans if s.kind == "llm"),
+            "prompt_tokens": sum(s.prompt_tokens for s in spans if s.kind == "llm"),
+            "completion_tokens": sum(s.completion_tokens for s in spans if s.kind == "llm"),
+            "cached_tokens": sum(s.cached_tokens for s in spans if s.kind == "llm"),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = self.summary()
+        with self.lock:
+            data["spans"] = [asdict(s) for s in sorted(self.spans, key=lambda s: s.started_at)]
+        for span in data["spans"]:
+            span["offset_ms"] = round((span.pop("started_at") - self.started_at) * 1000, 1)
+            span["duration_ms"] = round(span["duration_ms"], 1)
+        return data
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+class TraceStore:
+    """Rolling store of finished traces plus per-step aggregates"""
+
+    def __init__(self, max_traces: int = 200, window: int = 500):
+        self.window = window
+        self._lock = threading.Lock()
+        self._traces: "OrderedDict[str, Trace]" = OrderedDict()
+        self.max_traces = max_traces
+        self._durations: Dict[Tuple[str, str], Deque[float]] = defaultdict(lambda: deque(maxlen=self.window))
+        self._totals: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(
+            lambda: {"count": 0, "errors": 0, "llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                     "cached_tokens": 0, "iterations": 0}
+        )
+
+    def add(self, trace: Trace):
+        with self._lock:
+            self._traces[trace.trace_id] = trace
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+            for span in trace.spans:
+                key = (span.kind, span.name)
+                self._durations[key].append(span.duration_ms)
+                totals = self._totals[key]
+                totals["count"] += 1
+                totals["errors"] += 1 if span.error else 0
+                totals["llm_calls"] += span.llm_calls
+                totals["prompt_tokens"] += span.prompt_tokens
+                totals["completion_tokens"] += span.completion_tokens
+                totals["cached_tokens"] += span.cached_tokens
+                totals["iterations"] += span.iterations
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        with self._lock:
+            return self._traces.get(trace_id)
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            traces = list(self._traces.values())[-limit:]
+        return [trace.summary() for trace in reversed(traces)]
+
+    def metrics(self) -> Dict[str, Any]:
+        """Latency percentiles and token totals per (kind, name) step"""
+        with self._lock:
+            items = [(key, list(self._durations[key]), dict(totals)) for key, totals in self._totals.items()]
+            stored = len(self._traces)
+        steps = []
+        for (kind, name), durations, totals in sorted(items):
+            steps.append({
+                "kind": kind,
+                "name": name,
+                **{k: int(v) for k, v in totals.items()},
+                "p50_ms": round(_percentile(durations, 0.5), 1),
+                "p95_ms": round(_percentile(durations, 0.95), 1),
+                "max_ms": round(max(durations, default=0.0), 1),
+            })
+        return {"traces_stored": stored, "steps": steps}
+
+
+trace_store = TraceStore(max_traces=int(os.getenv("TRACE_STORE_SIZE", "200")))
+
+
+# ------------------------------------------------------------------ tracing API
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+@contextmanager
+def trace_request(label: str, trace_id: Optional[str] = None) -> Iterator[Trace]:
+    """Open a trace for one request; crew events and spans inside it attach to it"""
+    trace = Trace(trace_id=trace_id or uuid.uuid4().hex[:16], label=label, started_at=time.time())
+    token = _current_trace.set(trace)
+    started = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        trace.duration_ms = (time.perf_counter() - started) * 1000
+        _current_trace.reset(token)
+        # Anything still open (an aborted crew run) is closed at the request end
+        for span, _ in list(trace.open.values()):
+            span.duration_ms = (time.time() - span.started_at) * 1000
+            span.error = span.error or "unfinished"
+            trace.add(span)
+        trace.open.clear()
+        trace_store.add(trace)
+        summary = trace.summary()
+        print(
+            f"[TRACE] {trace.trace_id} {label}: {summary['duration_ms']:.0f}ms, "
+            f"{summary['llm_calls']} LLM calls, {summary['prompt_tokens']}+{summary['completion_tokens']} tokens "
+            f"({summary['cached_tokens']} cached)"
+        )
+
+
+@contextmanager
+def span(name: str, kind: str = "step", **attrs) -> Iterator[Span]:
+    """Time a block of code as a span on the current trace (no-op outside a trace)"""
+    trace = _current_trace.get()
+    current = Span(kind=kind, name=name, started_at=time.time(), attrs=attrs)
+    started = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.error = str(e)[:200]
+        raise
+    finally:
+        current.duration_ms = (time.perf_counter() - started) * 1000
+        if trace is not None:
+            trace.add(current)
+
+
+# --------------------------------------------------------------- crew listener
+
+def _agent_name(agent: Any) -> str:
+    return (getattr(agent, "role", None) or "agent").strip()
+
+
+def _task_name(task: Any) -> str:
+    return getattr(task, "name", None) or (getattr(task, "description", "") or "task")[:40].strip()
+
+
+def _token_totals(agent: Any) -> Tuple[int, int, int]:
+    """The agent's cumulative (prompt, completion, cached prompt) tokens from CrewAI's own counter"""
+    process = getattr(agent, "_token_process", None)
+    if process is None:
+        return 0, 0, 0
+    return process.prompt_tokens, process.completion_tokens, process.cached_prompt_tokens
+
+
+def _apply_tokens(current: Span, agent: Any, before: Tuple[int, int, int]):
+    """Tokens the agent used since the ``before`` snapshot"""
+    prompt, completion, cached = _token_totals(agent)
+    current.prompt_tokens = prompt - before[0]
+    current.completion_tokens = completion - before[1]
+    current.cached_tokens = cached - before[2]
+
+
+def _open(kind: str, key: Any, name: str, snapshot: Any = None, **attrs):
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    trace.open[(kind, key)] = (Span(kind=kind, name=name, started_at=time.time(), attrs=attrs), snapshot)
+
+
+def _close(kind: str, key: Any, error: Optional[str] = None) -> Optional[Tuple[Span, Any]]:
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    entry = trace.open.pop((kind, key), None)
+    if entry is None:
+        return None
+    current, snapshot = entry
+    current.duration_ms = (time.time() - current.started_at) * 1000
+    if error:
+        current.error = str(error)[:200]
+    trace.add(current)
+    return current, snapshot
+
+
+def _llm_agent(event: Any) -> Any:
+    """Agent behind an LLM call; falls back to the innermost running agent of the trace"""
+    agent = getattr(event, "from_agent", None)
+    trace = _current_trace.get()
+    if agent is not None or trace is None:
+        return agent
+    running = [snapshot for (kind, _), (_, snapshot) in list(trace.open.items()) if kind == "agent"]
+    return running[-1][0] if running else None
+
+
+def _agentless_llm_key(event: Any) -> Optional[str]:
+    model = getattr(event, "model", None)
+    trace = _current_trace.get()
+    if model is not None or trace is None:
+        return model
+    # LLMCallFailedEvent carries no model: close the newest agentless call still open
+    keys = [key for kind, key in list(trace.open) if kind == "llm" and isinstance(key, str)]
+    return keys[-1] if keys else None
+
+
+def _close_llm(event: Any, error: Optional[str] = None):
+    agent = _llm_agent(event)
+    closed = _close("llm", id(agent) if agent is not None else _agentless_llm_key(event), error)
+    if closed is None:
+        return
+    current, before = closed
+    current.llm_calls = 1
+    if agent is not None and before is not None:
+        _apply_tokens(current, agent, before)
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install_crew_instrumentation():
+    """Register the CrewAI event handlers once per process"""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        _installed = True
+
+    from crewai.events import (
+        AgentExecutionCompletedEvent,
+        AgentExecutionErrorEvent,
+        AgentExecutionStartedEvent,
+        CrewKickoffCompletedEvent,
+        CrewKickoffFailedEvent,
+        CrewKickoffStartedEvent,
+        LLMCallCompletedEvent,
+        LLMCallFailedEvent,
+        LLMCallStartedEvent,
+        TaskCompletedEvent,
+        TaskFailedEvent,
+        TaskStartedEvent,
+        ToolUsageErrorEvent,
+        ToolUsageFinishedEvent,
+        ToolUsageStartedEvent,
+        crewai_event_bus,
+    )
+
+    @crewai_event_bus.on(CrewKickoffStartedEvent)
+    def on_crew_started(source, event):
+        _open("crew", id(source), event.crew_name or "crew")
+
+    @crewai_event_bus.on(CrewKickoffCompletedEvent)
+    def on_crew_completed(source, event):
+        _close("crew", id(source))
+
+    @crewai_event_bus.on(CrewKickoffFailedEvent)
+    def on_crew_failed(source, event):
+        _close("crew", id(source), event.error)
+
+    @crewai_event_bus.on(TaskStartedEvent)
+    def on_task_started(source, event):
+        _open("task", id(event.task), _task_name(event.task))
+
+    @crewai_event_bus.on(TaskCompletedEvent)
+    def on_task_completed(source, event):
+        _close("task", id(event.task))
+
+    @crewai_event_bus.on(TaskFailedEvent)
+    def on_task_failed(source, event):
+        _close("task", id(event.task), event.error)
+
+    @crewai_event_bus.on(AgentExecutionStartedEvent)
+    def on_agent_started(source, event):
+        key = (id(event.agent), id(event.task))
+        _open("agent", key, _agent_name(event.agent), (event.agent, *_token_totals(event.agent)), task=_task_name(event.task))
+
+    def close_agent(event, error=None):
+        closed = _close("agent", (id(event.agent), id(event.task)), error)
+        if closed is None:
+            return
+        current, (_, *before) = closed
+        _apply_tokens(current, event.agent, tuple(before))
+        executor = getattr(event.agent, "agent_executor", None)
+        current.iterations = getattr(executor, "iterations", 0) or 0
+
+    @crewai_event_bus.on(AgentExecutionCompletedEvent)
+    def on_agent_completed(source, event):
+        close_agent(event)
+
+    @crewai_event_bus.on(AgentExecutionErrorEvent)
+    def on_agent_failed(source, event):
+        close_agent(event, event.error)
+
+    @crewai_event_bus.on(LLMCallStartedEvent)
+    def on_llm_started(source, event):
+        agent = _llm_agent(event)
+        key = id(agent) if agent is not None else event.model
+        name = _agent_name(agent) if agent is not None else (event.model or "llm")
+        _open("llm", key, name, _token_totals(agent) if agent is not None else None, model=event.model)
+
+    @crewai_event_bus.on(LLMCallCompletedEvent)
+    def on_llm_completed(source, event):
+        _close_llm(event)
+
+    @crewai_event_bus.on(LLMCallFailedEvent)
+    def on_llm_failed(source, event):
+        _close_llm(event, event.error)
+
+    @crewai_event_bus.on(ToolUsageStartedEvent)
+    def on_tool_started(source, event):
+        _open("tool", (event.agent_key, event.tool_name), event.tool_name, agent=event.agent_role)
+
+    @crewai_event_bus.on(ToolUsageFinishedEvent)
+    def on_tool_finished(source, event):
+        closed = _close("tool", (event.agent_key, event.tool_name))
+        if closed is not None:
+            closed[0].attrs["from_cache"] = event.from_cache
+
+    @crewai_event_bus.on(ToolUsageErrorEvent)
+    def on_tool_failed(source, event):
+        _close("tool", (event.agent_key, event.tool_name), event.error)
+
+    print("[TRACE] CrewAI instrumentation installed")
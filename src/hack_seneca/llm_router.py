@@ -0,0 +1,399 @@
+"""Latency-aware, hedged routing of crew LLM calls across providers.
+
+Every crew turn used to wait on one Azure deployment, however slow it was at
+the moment. ``HedgedLLM`` is a CrewAI ``BaseLLM`` that wraps one or more
+configured endpoints/models. It keeps a rolling latency and error profile
+per provider, sends each call to the provider that currently looks fastest
+and, if no answer has arrived after that provider's p95 latency, fires a
+duplicate request at the next provider (or the same one when only one is
+configured) and returns whichever answers first. Hedges are capped at a
+fraction of recent calls (``LLM_HEDGE_MAX_RATIO``, default 10%) so a slow
+provider can't double the load. A call that fails outright fails over to
+the next untried provider.
+
+A request that loses the race isn't cancelled (the SDK call can't be), so
+each provider gets its own bounded thread pool
+(``LLM_PROVIDER_WORKERS``, default 8): losers only occupy their own
+provider's pool, and no hedge is sent to a provider whose pool is already
+busy. Hedges and failures are recorded as spans on the request's trace;
+only the first of each per provider is printed.
+
+Run ``python -m hack_seneca.llm_router`` to compare a single provider with
+hedging against local mock providers with a heavy latency tail.
+"""
+
+import argparse
+import contextvars
+import os
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from crewai.llms.base_llm import BaseLLM
+
+from .instrumentation import span
+
+
+class LatencyProfile:
+    """Rolling window of call latencies and outcomes for one provider"""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._samples: Deque[Tuple[float, bool]] = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+
+    def record(self, seconds: float, ok: bool):
+        with self._lock:
+            self._samples.append((seconds, ok))
+            self.calls += 1
+            if not ok:
+                self.errors += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            latencies = sorted(seconds for seconds, ok in self._samples if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self._samples:
+                return 0.0
+            return sum(1 for _, ok in self._samples if not ok) / len(self._samples)
+
+    def sample_count(self) -> int:
+        with self._lock:
+            return sum(1 for _, ok in self._samples if ok)
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate(), 3),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class HedgeBudget:
+    """Allows a hedge only while hedges stay under ``max_ratio`` of the last ``window`` calls"""
+
+    def __init__(self, max_ratio: float = 0.1, window: int = 200, burst: int = 2):
+        self.max_ratio = max_ratio
+        self.window = window
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._calls = 0
+        # Call count at the moment of each granted hedge; every hedge is counted, even when
+        # concurrent calls time out together
+        self._hedges: Deque[int] = deque()
+
+    def record_call(self):
+        with self._lock:
+            self._calls += 1
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            while self._hedges and self._hedges[0] <= self._calls - self.window:
+                self._hedges.popleft()
+            if len(self._hedges) >= self.burst + self.max_ratio * min(self._calls, self.window):
+                return False
+            self._hedges.append(self._calls)
+            return True
+
+    def hedges_in_window(self) -> int:
+        with self._lock:
+            return sum(1 for at in self._hedges if at > self._calls - self.window)
+
+
+class LLMProvider:
+    def __init__(self, name: str, llm: BaseLLM, window: int = 200):
+        self.name = name
+        self.llm = llm
+        self.profile = LatencyProfile(window)
+        self.wins = 0
+        self.in_flight = 0  # calls running or queued on this provider's pool, losers of a race included
+
+    def score(self, default_latency: float) -> float:
+        """Expected latency, penalized by recent errors (lower is better)"""
+        p50 = self.profile.percentile(0.5)
+        return (p50 if p50 is not None else default_latency) * (1 + 4 * self.profile.error_rate())
+
+
+class HedgedLLM(BaseLLM):
+    """BaseLLM that routes each call to the fastest provider and hedges slow ones"""
+
+    def __init__(
+        self,
+        providers: List[LLMProvider],
+        hedging: bool = True,
+        max_hedge_ratio: float = 0.1,
+        initial_delay: float = 8.0,
+        min_delay: float = 0.5,
+        max_delay: float = 30.0,
+        min_samples: int = 20,
+        hedge_percentile: float = 0.95,
+        workers_per_provider: int = 8,
+    ):
+        if not providers:
+            raise ValueError("HedgedLLM needs at least one provider")
+        self.providers = providers
+        self.hedging = hedging
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.hedge_percentile = hedge_percentile
+        self.budget = HedgeBudget(max_ratio=max_hedge_ratio)
+        self.workers_per_provider = workers_per_provider
+        self._executors: Dict[str, ThreadPoolExecutor] = {
+            provider.name: ThreadPoolExecutor(max_workers=workers_per_provider, thread_name_prefix=f"llm-{provider.name}")
+            for provider in providers
+        }
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0, "hedges": 0, "hedge_wins": 0, "hedges_denied": 0, "hedges_saturated": 0, "failovers": 0,
+        }
+        self._logged: Set[Tuple[str, str]] = set()  # (event, provider) pairs already printed
+        primary = providers[0].llm
+        super().__init__(model=primary.model, temperature=primary.temperature, stop=list(primary.stop or []))
+
+    # CrewAI sets stop words on the LLM it is given; pass them on to every provider
+    @property
+    def stop(self) -> List[str]:
+        return self._stop
+
+    @stop.setter
+    def stop(self, value: Optional[List[str]]):
+        self._stop = list(value or [])
+        for provider in getattr(self, "providers", ()):
+            provider.llm.stop = list(self._stop)
+
+    def supports_function_calling(self) -> bool:
+        supports = getattr(self.providers[0].llm, "supports_function_calling", None)
+        return bool(supports()) if supports else False
+
+    def supports_stop_words(self) -> bool:
+        return self.providers[0].llm.supports_stop_words()
+
+    def get_context_window_size(self) -> int:
+        return min(provider.llm.get_context_window_size() for provider in self.providers)
+
+    def hedge_delay(self, provider: LLMProvider) -> float:
+        """Seconds to wait for the provider before hedging: its p95 once it has enough samples"""
+        if provider.profile.sample_count() < self.min_samples:
+            return self.initial_delay
+        return min(self.max_delay, max(self.min_delay, provider.profile.percentile(self.hedge_percentile)))
+
+    def ranked(self) -> List[LLMProvider]:
+        return sorted(self.providers, key=lambda provider: provider.score(self.initial_delay))
+
+    def _submit(self, provider: LLMProvider, kwargs: Dict[str, Any]) -> Future:
+        # Copy the caller's context so tracing spans still attach to the request
+        context = contextvars.copy_context()
+        with self._lock:
+            provider.in_flight += 1
+        future = self._executors[provider.name].submit(context.run, self._timed_call, provider, kwargs)
+        future.add_done_callback(lambda _: self._finished(provider))
+        return future
+
+    def _finished(self, provider: LLMProvider):
+        with self._lock:
+            provider.in_flight -= 1
+
+    def saturated(self, provider: LLMProvider) -> bool:
+        """Whether every worker of the provider's pool is taken (hedging it would only queue)"""
+        with self._lock:
+            return provider.in_flight >= self.workers_per_provider
+
+    def _note(self, event: str, provider: LLMProvider, detail: str):
+        """Record a hedge or failure on the request's trace; print only the first one per provider"""
+        with span(f"{event}:{provider.name}", kind="llm_router", detail=detail):
+            pass
+        with self._lock:
+            first = (event, provider.name) not in self._logged
+            self._logged.add((event, provider.name))
+        if first:
+            print(f"[LLM-ROUTER] First {event} for {provider.name}: {detail} (further ones are in /api/llm/stats)")
+
+    @staticmethod
+    def _timed_call(provider: LLMProvider, kwargs: Dict[str, Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            result = provider.llm.call(**kwargs)
+        except Exception:
+            provider.profile.record(time.perf_counter() - started, ok=False)
+            raise
+        provider.profile.record(time.perf_counter() - started, ok=True)
+        return result
+
+    def call(
+        self,
+        messages: Any,
+        tools: Optional[List[dict]] = None,
+        callbacks: Optional[List[Any]] = None,
+        available_functions: Optional[Dict[str, Any]] = None,
+        from_task: Optional[Any] = None,
+        from_agent: Optional[Any] = None,
+    ) -> Any:
+        kwargs = {
+            "messages": messages, "tools": tools, "callbacks": callbacks,
+            "available_functions": available_functions, "from_task": from_task, "from_agent": from_agent,
+        }
+        ranked = self.ranked()
+        primary = ranked[0]
+        untried = ranked[1:]
+        with self._lock:
+            self._stats["calls"] += 1
+        self.budget.record_call()
+
+        in_flight: Dict[Future, LLMProvider] = {self._submit(primary, kwargs): primary}
+        hedge: Optional[Future] = None
+        waiting_on = primary
+        deadline = time.monotonic() + self.hedge_delay(primary) if self.hedging else None
+        last_error: Optional[BaseException] = None
+        while in_flight:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # No answer within the provider's p95: fire one hedge if the budget allows
+                deadline = None
+                target = untried[0] if untried else waiting_on
+                if self.saturated(target):
+                    with self._lock:
+                        self._stats["hedges_saturated"] += 1
+                elif self.budget.try_acquire():
+                    if untried:
+                        untried.pop(0)
+                    hedge = self._submit(target, kwargs)
+                    in_flight[hedge] = target
+                    with self._lock:
+                        self._stats["hedges"] += 1
+                    self._note("hedge", target, f"no answer from {waiting_on.name} within its hedge delay")
+                else:
+                    with self._lock:
+                        self._stats["hedges_denied"] += 1
+                continue
+            for future in done:
+                provider = in_flight.pop(future)
+                if future.exception() is None:
+                    provider.wins += 1
+                    if future is hedge:
+                        with self._lock:
+                            self._stats["hedge_wins"] += 1
+                    return future.result()
+                last_error = future.exception()
+                self._note("failure", provider, str(last_error)[:120])
+            if not in_flight and untried:
+                waiting_on = untried.pop(0)
+                in_flight[self._submit(waiting_on, kwargs)] = waiting_on
+                if self.hedging and hedge is None:
+                    deadline = time.monotonic() + self.hedge_delay(waiting_on)
+                with self._lock:
+                    self._stats["failovers"] += 1
+        raise last_error if last_error else RuntimeError("No LLM provider answered")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["hedging"] = self.hedging
+        stats["max_hedge_ratio"] = self.budget.max_ratio
+        stats["workers_per_provider"] = self.workers_per_provider
+        stats["providers"] = {
+            provider.name: {**provider.profile.snapshot(), "wins": provider.wins, "in_flight": provider.in_flight,
+                            "hedge_delay_s": round(self.hedge_delay(provider), 2)}
+            for provider in self.providers
+        }
+        return stats
+
+
+def hedged_llm_from_env(providers: List[LLMProvider]) -> HedgedLLM:
+    """HedgedLLM tuned by LLM_HEDGING, LLM_HEDGE_MAX_RATIO, LLM_HEDGE_PERCENTILE, LLM_HEDGE_INITIAL_DELAY
+    and LLM_PROVIDER_WORKERS"""
+    return HedgedLLM(
+        providers,
+        hedging=os.getenv("LLM_HEDGING", "true").lower() in ("1", "true", "yes"),
+        max_hedge_ratio=float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1")),
+        hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95")),
+        initial_delay=float(os.getenv("LLM_HEDGE_INITIAL_DELAY", "8.0")),
+        workers_per_provider=int(os.getenv("LLM_PROVIDER_WORKERS", "8")),
+    )
+
+
+# -------------------------------------------------------------------- benchmark
+
+class MockLLM(BaseLLM):
+    """Local stand-in provider: lognormal latency with an occasional slow tail, optional errors"""
+
+    def __init__(self, name: str, median: float, tail_chance: float, tail_factor: float, error_rate: float = 0.0):
+        super().__init__(model=f"mock/{name}")
+        self.median = median
+        self.tail_chance = tail_chance
+        self.tail_factor = tail_factor
+        self.error_rate = error_rate
+        self.calls = 0
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        self.calls += 1
+        delay = random.lognormvariate(0, 0.25) * self.median
+        if random.random() < self.tail_chance:
+            delay *= self.tail_factor
+        time.sleep(delay)
+        if random.random() < self.error_rate:
+            raise RuntimeError(f"{self.model} returned 503")
+        return "Mock answer"
+
+
+def _run(llm: BaseLLM, requests: int, concurrency: int) -> List[float]:
+    def one(_):
+        started = time.perf_counter()
+        llm.call("Plan a push day")
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return sorted(pool.map(one, range(requests)))
+
+
+def _report(label: str, latencies: List[float], provider_calls: int, requests: int):
+    print(
+        f"📊 {label:<22} p50 {statistics.median(latencies) * 1000:7.1f} ms   "
+        f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:7.1f} ms   "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:7.1f} ms   "
+        f"provider calls +{(provider_calls - requests) / requests:.1%}"
+    )
+
+
+def _benchmark(requests: int, concurrency: int, max_ratio: float):
+    random.seed(7)
+    shape = dict(median=0.05, tail_chance=0.03, tail_factor=20)
+    print(f"{requests} calls, {concurrency} concurrent; mock providers: 50 ms median, 3% take 20x longer")
+
+    single = MockLLM("azure-a", **shape)
+    _report("single provider", _run(single, requests, concurrency), single.calls, requests)
+
+    a, b = MockLLM("azure-a", **shape), MockLLM("azure-b", **shape)
+    hedged = HedgedLLM([LLMProvider("azure-a", a), LLMProvider("azure-b", b)], max_hedge_ratio=max_ratio,
+                       initial_delay=0.2, min_delay=0.01, min_samples=20, workers_per_provider=concurrency * 2)
+    _report("hedged, two providers", _run(hedged, requests, concurrency), a.calls + b.calls, requests)
+
+    same = MockLLM("azure-a", **shape)
+    hedged_same = HedgedLLM([LLMProvider("azure-a", same)], max_hedge_ratio=max_ratio,
+                            initial_delay=0.2, min_delay=0.01, min_samples=20, workers_per_provider=concurrency * 2)
+    _report("hedged, same provider", _run(hedged_same, requests, concurrency), same.calls, requests)
+    print(f"   {hedged.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tail latency of hedged LLM routing against mock providers")
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--max-hedge-ratio", type=float, default=0.1)
+    args = parser.parse_args()
+    _benchmark(args.requests, args.concurrency, args.max_hedge_ratio)
@@ -3,8 +3,6 @@ import sys
 import os
 import warnings
 import re
-import json
-from collections import deque
 from datetime import datetime, timedelta
 
 # Ensure src/ is on the path when running this file directly (python src/hack_seneca/main.py)
@@ -16,6 +14,14 @@ if _src_dir not in sys.path:
 try:
     # Import via the package so relative imports inside modules work
     from hack_seneca.crew import FitnessCrew
+    from hack_seneca.router import ROUTE_FITNESS, get_router
+    from hack_seneca.structured_output import render_markdown
+    from hack_seneca.workout_generator import workout_generator
+    from hack_seneca.user_store import SESSION_LIMITS, user_store
+    from hack_seneca.meal_planner import meal_plan_capture, render_crew_output
+    from hack_seneca.context_builder import context_builder
+    from hack_seneca.conversation import get_conversation_store
+    from hack_seneca.retrieval import get_retrieval_index
 except ImportError as e:
     print(f"Error: Could not import required modules: {e}")
     print("Tip: Run with 'python -m hack_seneca.main --interactive' from the project root, or use 'uv run run_crew'.")
@@ -50,7 +56,7 @@ def login():
             print("Examples: user_00001, user_12345, user_99999")
 
 def load_user_data(user_id):
-    """Load comprehensive user data from JSON files"""
+    """Load comprehensive user data from the shared user-data store"""
     print(f"📊 Loading user data for {user_id}...")
     
     user_data = {
@@ -62,67 +68,14 @@ def load_user_data(user_id):
         "summary": {}
     }
     
-    # Get the project root directory (two levels up from current file)
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(os.path.dirname(current_dir))
-    users_data_dir = os.path.join(project_root, "users_data")
-    
-    print(f"🔍 Looking for data files in: {users_data_dir}")
-    
     try:
-        # Load user profile
-        users_file = os.path.join(users_data_dir, "fitness-users.json")
-        print(f"📁 Checking users file: {users_file}")
-        print(f"📁 File exists: {os.path.exists(users_file)}")
-        
-        if os.path.exists(users_file):
-            with open(users_file, 'r') as f:
-                users = json.load(f)
-                print(f"📋 Found {len(users)} users in database")
-                user_data["profile"] = next((user for user in users if user["user_id"] == user_id), None)
-                print(f"👤 User profile found: {user_data['profile'] is not None}")
-        
-        # Load recent activities (last 7 days)
-        activities_file = os.path.join(users_data_dir, "fitness-activities.json")
-        print(f"📁 Checking activities file: {activities_file}")
-        print(f"📁 File exists: {os.path.exists(activities_file)}")
-        
-        if os.path.exists(activities_file):
-            with open(activities_file, 'r') as f:
-                activities = json.load(f)
-                user_activities = [activity for activity in activities if activity["user_id"] == user_id]
-                print(f"🏃 Found {len(user_activities)} activities for user")
-                # Sort by date and get recent ones
-                user_activities.sort(key=lambda x: x["date"], reverse=True)
-                user_data["recent_activities"] = user_activities[:7]  # Last 7 entries
-        
-        # Load recent measurements (last 5)
-        measurements_file = os.path.join(users_data_dir, "fitness-measurements.json")
-        print(f"📁 Checking measurements file: {measurements_file}")
-        print(f"📁 File exists: {os.path.exists(measurements_file)}")
-        
-        if os.path.exists(measurements_file):
-            with open(measurements_file, 'r') as f:
-                measurements = json.load(f)
-                user_measurements = [m for m in measurements if m["user_id"] == user_id]
-                print(f"📏 Found {len(user_measurements)} measurements for user")
-                # Sort by date and get recent ones
-                user_measurements.sort(key=lambda x: x["date"], reverse=True)
-                user_data["recent_measurements"] = user_measurements[:5]  # Last 5 entries
-        
-        # Load recent nutrition (last 7 days)
-        nutrition_file = os.path.join(users_data_dir, "fitness-nutrition.json")
-        print(f"📁 Checking nutrition file: {nutrition_file}")
-        print(f"📁 File exists: {os.path.exists(nutrition_file)}")
-        
-        if os.path.exists(nutrition_file):
-            with open(nutrition_file, 'r') as f:
-                nutrition = json.load(f)
-                user_nutrition = [n for n in nutrition if n["user_id"] == user_id]
-                print(f"🍎 Found {len(user_nutrition)} nutrition entries for user")
-                # Sort by date and get recent ones
-                user_nutrition.sort(key=lambda x: x["date"], reverse=True)
-                user_data["recent_nutrition"] = user_nutrition[:7]  # Last 7 entries
+        # Parsed and indexed once per process; each lookup is a dict hit plus a short slice
+        data = user_store.user_data(user_id, SESSION_LIMITS)
+        user_data["profile"] = data["profile"]
+        print(f"👤 User profile found: {user_data['profile'] is not None}")
+        user_data["recent_activities"] = data["activities"]  # Last 14 entries (this and the prior week)
+        user_data["recent_measurements"] = data["measurements"]  # Last 5 entries
+        user_data["recent_nutrition"] = data["nutrition"]  # Last 14 entries (this and the prior week)
         
         # Create summary
         if user_data["profile"]:
@@ -173,7 +126,7 @@ def chat():
     
     # Initialize fitness crew
     fitness_crew = FitnessCrew()
-    crew_instance = fitness_crew.chat_crew()
+    router = get_router()
     
     print("✅ Fitness assistant ready!")
     print("\n" + "=" * 50)
@@ -181,8 +134,10 @@ def chat():
     print("� Ask about workouts, nutrition, progress, or anything fitness-related")
     print("=" * 50 + "\n")
     
-    # Initialize conversation history for current session
-    conversation_history = deque(maxlen=6)  # Keep last 6 exchanges for context
+    # Conversation history is persisted per user; each CLI run starts a new session
+    conversations = get_conversation_store()
+    session_id = f"cli-{datetime.now():%Y%m%d-%H%M%S}"
+    retrieval = get_retrieval_index()
 
     while True:
         try:
@@ -193,52 +148,58 @@ def chat():
 
         if user_input.lower() in {"exit", "quit", "bye"}:
             print("👋 Goodbye! Stay consistent and take care.")
+            conversations.flush()
             break
 
         if not user_input:
             continue
 
-        # Add user message to session history
-        conversation_history.append(f"User: {user_input}")
-
-        # Prepare context from recent conversation history
-        recent_context = "\n".join(conversation_history)
+        # Prepare context from the conversation so far (summary + recent turns)
+        recent_context = conversations.context(user_id, session_id)
         
-        # Format user data for the crew
-        user_profile = user_data.get("summary", {}).get("profile", "No profile data available")
-        user_activities = user_data.get("summary", {}).get("activities", "No recent activity data")
-        user_measurements = user_data.get("summary", {}).get("measurements", "No recent measurements")
-        user_nutrition = user_data.get("summary", {}).get("nutrition", "No recent nutrition data")
+        # Format user data for the crew (cached until the user's data changes)
+        digest = context_builder.digest(user_id, user_data)
         
         # Debug: Print what data we're sending (you can remove this later)
-        print(f"\n🔍 DEBUG - User Data Being Sent:")
-        print(f"Profile: {user_profile}")
-        print(f"Activities: {user_activities}")
-        print(f"Measurements: {user_measurements}")
-        print(f"Nutrition: {user_nutrition}\n")
+        print(f"\n🔍 DEBUG - User Data Being Sent ({digest.tokens} tokens, {digest.tokens_saved} saved):")
+        print(f"Profile: {digest.profile}")
+        print(f"Activities: {digest.activities}")
+        print(f"Measurements: {digest.measurements}")
+        print(f"Nutrition: {digest.nutrition}\n")
 
         # Inputs for the assistant
         inputs = {
             "user_message": user_input,
             "context": recent_context,
             "user_id": user_id,
-            "user_profile": user_profile,
-            "user_activities": user_activities,
-            "user_measurements": user_measurements,
-            "user_nutrition": user_nutrition,
+            **digest.as_inputs(),
+            # Relevant notes from the knowledge files, earlier sessions and the user's records
+            "knowledge": retrieval.knowledge_for(user_id, user_data, user_input, session_id),
         }
 
+        # Send clear fitness/nutrition requests straight to the specialist
+        decision = router.route(user_input)
+        router.stats.record_decision(decision)
+        crew_instance = fitness_crew.crew_for_route(decision.route)
+        print(f"🧭 Routed to {decision.route} (confidence {decision.confidence:.2f}, via {decision.source})")
+
+        # Standard programs are generated locally; the coach handles everything else
+        generated = workout_generator.generate(user_input, user_data) if decision.route == ROUTE_FITNESS else None
+        if generated is not None:
+            response_text = render_markdown(generated.plan)
+            conversations.record_exchange(user_id, session_id, user_input, response_text)
+            print(f"\nFitness Coach: {response_text}\n")
+            continue
+
         try:
             # Get response from crew
-            response = crew_instance.kickoff(inputs=inputs)
-            response_text = str(response).strip()
-            
-            # Clean up response text (remove any extra formatting)
-            if response_text.startswith("Assistant:"):
-                response_text = response_text[10:].strip()
+            with meal_plan_capture(user_id) as meal_plans:
+                response = crew_instance.kickoff(inputs=inputs)
+            # Routed specialists return a typed plan, rendered like the API does; prose otherwise
+            _, response_text = render_crew_output(response, meal_plans)
             
-            # Add assistant response to session history
-            conversation_history.append(f"Assistant: {response_text}")
+            # Add the exchange to the persisted history
+            conversations.record_exchange(user_id, session_id, user_input, response_text)
             
             print(f"\nFitness Coach: {response_text}\n")
             
@@ -0,0 +1,456 @@
+"""Local meal plans that hit the user's calorie and protein targets.
+
+Nutrition plans used to be written entirely by the nutritionist LLM: slow,
+and the meals rarely added up to the targets it had just stated. Targets now
+come from the profile (Mifflin-St Jeor BMR x an activity factor from recent
+``active_minutes``, adjusted for the goal) kept within 500 kcal of the user's
+14-day intake in ``fitness-nutrition.json``. Meals come from the recipe table
+in ``config/recipes.yaml``, each at 0.75-2 servings.
+
+The solver is a vectorized greedy coordinate descent: start from the recipe
+closest to each slot's share of the calories, then repeatedly re-pick one slot
+at a time against every (recipe, portion) option at once (NumPy when it is
+installed), minimizing weighted macro error plus slot balance and variety
+penalties. A day solves in a few milliseconds, a week in well under 100 ms.
+
+The nutritionist calls it through the ``MealPlanOptimizer`` tool; inside a
+chat request (``meal_plan_capture``, which also fixes whose data is used) the
+solved meals are merged into its ``NutritionPlan`` with exact macros, or
+appended to the answer when the nutritionist was reached by delegation and
+returned prose, so the LLM only writes the text around them.
+
+Run ``python -m hack_seneca.meal_planner`` for solve time, target accuracy and
+the output tokens the LLM no longer writes.
+"""
+
+import argparse
+import contextvars
+import os
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import yaml
+
+from .context_builder import count_tokens
+from .structured_output import Meal, NutritionPlan, SpecialistPlan, plan_from_output, render_markdown
+from .user_store import user_store
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+RECIPES_CONFIG = os.path.join(os.path.dirname(__file__), "config", "recipes.yaml")
+
+PORTIONS = (0.75, 1.0, 1.25, 1.5, 1.75, 2.0)
+SLOT_SHARES = {"breakfast": 0.25, "lunch": 0.32, "dinner": 0.33, "snack": 0.10}
+SLOTS_PER_DAY = {
+    3: ("breakfast", "lunch", "dinner"),
+    4: ("breakfast", "lunch", "snack", "dinner"),
+    5: ("breakfast", "snack", "lunch", "snack", "dinner"),
+}
+DIETS = ("vegetarian", "vegan", "pescatarian", "gluten_free", "dairy_free", "nut_free")
+
+# Goal -> (kcal adjustment, protein g/kg)
+_GOAL_RULES = {
+    "weight_loss": (-450, 2.0), "fat_loss": (-450, 2.0), "lose weight": (-450, 2.0),
+    "muscle_gain": (300, 1.8), "bulk": (300, 1.8), "strength": (200, 1.8),
+    "endurance": (150, 1.5), "maintenance": (0, 1.6),
+}
+_HISTORY_BAND = 500  # targets stay within this many kcal of recent intake
+_FAT_SHARE = 0.27
+
+
+@dataclass
+class MacroTargets:
+    calories: int
+    protein_g: int
+    carbs_g: int
+    fat_g: int
+    basis: str = ""
+
+    @property
+    def vector(self) -> Tuple[float, float, float, float]:
+        return float(self.calories), float(self.protein_g), float(self.carbs_g), float(self.fat_g)
+
+    @property
+    def macro_split(self) -> str:
+        kcal = self.protein_g * 4 + self.carbs_g * 4 + self.fat_g * 9 or 1
+        return (f"{self.protein_g * 4 / kcal:.0%} protein / {self.carbs_g * 4 / kcal:.0%} carbs / "
+                f"{self.fat_g * 9 / kcal:.0%} fat")
+
+
+def _activity_factor(activities: Sequence[Dict[str, Any]]) -> float:
+    minutes = [row.get("active_minutes") for row in activities[:14]]
+    minutes = [value for value in minutes if isinstance(value, (int, float))]
+    if not minutes:
+        return 1.5
+    average = sum(minutes) / len(minutes)
+    return 1.4 if average < 30 else 1.55 if average < 60 else 1.7 if average < 90 else 1.85
+
+
+def derive_targets(
+    profile: Optional[Dict[str, Any]],
+    nutrition: Sequence[Dict[str, Any]] = (),
+    activities: Sequence[Dict[str, Any]] = (),
+    calories: Optional[int] = None,
+    protein_g: Optional[int] = None,
+) -> MacroTargets:
+    """Daily targets from the profile, recent activity and intake history (explicit values win)"""
+    profile = profile or {}
+    weight = float(profile.get("weight") or 75)
+    height = float(profile.get("height") or 172)
+    age = float(profile.get("age") or 35)
+    sex = str(profile.get("gender") or profile.get("sex") or "").lower()
+    offset = 5 if sex.startswith("m") else -161 if sex.startswith("f") else -78
+    bmr = 10 * weight + 6.25 * height - 5 * age + offset
+    goals = profile.get("goals") or profile.get("goal") or ""
+    goals = [str(g).lower() for g in (goals if isinstance(goals, list) else [goals])]
+    goal = next((g for g in goals if g in _GOAL_RULES), "maintenance")
+    adjust, protein_per_kg = _GOAL_RULES[goal]
+    factor = _activity_factor(activities)
+    estimate = bmr * factor + adjust
+    basis = f"BMR {bmr:.0f} kcal x {factor} activity {adjust:+d} kcal for {goal.replace('_', ' ')}"
+
+    recent = [row.get("calories_consumed") for row in nutrition[:14]]
+    recent = [value for value in recent if isinstance(value, (int, float))]
+    if recent:
+        average = sum(recent) / len(recent)
+        bounded = min(max(estimate, average - _HISTORY_BAND), average + _HISTORY_BAND)
+        if bounded != estimate:
+            basis += f", kept within {_HISTORY_BAND} kcal of your {len(recent)}-day average ({average:.0f} kcal)"
+        estimate = bounded
+    kcal = int(round((calories or estimate) / 10) * 10)
+
+    # Protein per kg of a BMI-25 reference weight for BMI >= 30, so targets stay realistic
+    reference = min(weight, 25 * (height / 100) ** 2) if weight / (height / 100) ** 2 >= 30 else weight
+    protein = int(protein_g or round(reference * protein_per_kg))
+    fat = int(round(kcal * _FAT_SHARE / 9))
+    carbs = max(int(round((kcal - protein * 4 - fat * 9) / 4)), 50)
+    return MacroTargets(kcal, protein, carbs, fat, basis)
+
+
+# ---------------------------------------------------------------- user data
+
+def load_user_records(user_id: str) -> Dict[str, Any]:
+    """Profile plus activity and nutrition history of one user, newest first"""
+    return {
+        "profile": user_store.profile(user_id),
+        "activities": user_store.recent(user_id, "activities", 14),
+        "nutrition": user_store.recent(user_id, "nutrition", 14),
+    }
+
+
+# ------------------------------------------------------------------- solver
+
+@dataclass
+class PlannedMeal:
+    slot: str
+    recipe: Dict[str, Any]
+    portion: float
+
+    @property
+    def macros(self) -> Tuple[int, int, int, int]:
+        r, p = self.recipe, self.portion
+        return round(r["kcal"] * p), round(r["protein"] * p), round(r["carbs"] * p), round(r["fat"] * p)
+
+    def to_meal(self, day: Optional[int] = None) -> Meal:
+        kcal, protein, _, _ = self.macros
+        servings = "" if self.portion == 1.0 else f" ({self.portion:g} servings)"
+        meal_type = self.slot.capitalize() if day is None else f"Day {day} {self.slot.capitalize()}"
+        return Meal(
+            name=self.recipe["name"] + servings, meal_type=meal_type, calories=kcal, protein_g=protein,
+            prep_minutes=self.recipe.get("prep"), ingredients=self.recipe.get("ingredients", []),
+            key_nutrients=self.recipe.get("key_nutrients", []),
+        )
+
+
+@dataclass
+class MealPlanResult:
+    targets: MacroTargets
+    days: List[List[PlannedMeal]]
+    diet: List[str] = field(default_factory=list)
+    elapsed_ms: float = 0.0
+
+    def day_totals(self) -> List[Tuple[int, int, int, int]]:
+        return [tuple(sum(m.macros[i] for m in day) for i in range(4)) for day in self.days]
+
+    def to_plan(self) -> NutritionPlan:
+        multi_day = len(self.days) > 1
+        meals = [meal.to_meal(number if multi_day else None) for number, day in enumerate(self.days, 1) for meal in day]
+        return NutritionPlan(
+            daily_calories=self.targets.calories, protein_g=self.targets.protein_g,
+            macro_split=self.targets.macro_split, dietary_considerations=[d.replace("_", "-") for d in self.diet],
+            meals=meals,
+        )
+
+    def summary(self) -> str:
+        """Compact text for the LLM: targets, how they were derived and one line per meal"""
+        lines = [
+            f"Targets: {self.targets.calories} kcal, {self.targets.protein_g} g protein, "
+            f"{self.targets.carbs_g} g carbs, {self.targets.fat_g} g fat ({self.targets.basis})."
+        ]
+        for number, (day, totals) in enumerate(zip(self.days, self.day_totals()), 1):
+            prefix = f"Day {number}: " if len(self.days) > 1 else ""
+            lines.append(f"{prefix}{totals[0]} kcal, {totals[1]} g protein")
+            lines.extend(f"- {m.slot}: {m.recipe['name']} x{m.portion:g} ({m.macros[0]} kcal, {m.macros[1]} g protein)" for m in day)
+        return "\n".join(lines)
+
+
+def _score(totals: Any, target: Tuple[float, float, float, float]) -> Any:
+    """Weighted macro error of (n, 4) totals; protein shortfall costs far more than a small surplus"""
+    kcal, protein, carbs, fat = target
+    if NUMPY_AVAILABLE:
+        t = np.asarray(totals, dtype=float)
+        short = np.maximum(0.0, protein - t[:, 1]) / protein
+        over = np.maximum(0.0, t[:, 1] - protein * 1.15) / protein
+        return (4 * ((t[:, 0] - kcal) / kcal) ** 2 + 6 * short ** 2 + over ** 2
+                + 0.5 * ((t[:, 2] - carbs) / carbs) ** 2 + 0.5 * ((t[:, 3] - fat) / fat) ** 2)
+    return [
+        4 * ((k - kcal) / kcal) ** 2 + 6 * (max(0.0, protein - p) / protein) ** 2
+        + (max(0.0, p - protein * 1.15) / protein) ** 2 + 0.5 * ((c - carbs) / carbs) ** 2 + 0.5 * ((f - fat) / fat) ** 2
+        for k, p, c, f in totals
+    ]
+
+
+class MealPlanner:
+    """Recipe table plus the coordinate-descent solver"""
+
+    def __init__(self, config_path: str = RECIPES_CONFIG, max_passes: int = 8):
+        with open(config_path, "r") as f:
+            self.recipes: List[Dict[str, Any]] = (yaml.safe_load(f) or {}).get("recipes", [])
+        self.max_passes = max_passes
+        self._lock = threading.Lock()
+        self._stats = Counter()
+        self._errors: List[float] = []
+
+    def _options(self, slot: str, diet: Sequence[str], exclude: Sequence[str]) -> List[Tuple[int, float, Tuple[float, ...]]]:
+        """(recipe index, portion, macros) for every allowed recipe and portion of a slot"""
+        options = []
+        for index, recipe in enumerate(self.recipes):
+            tags = set(recipe.get("tags", []))
+            if slot not in recipe["meals"]:
+                continue
+            if any(not (d in tags or (d == "pescatarian" and "vegetarian" in tags)) for d in diet):
+                continue
+            text = " ".join([recipe["name"]] + recipe.get("ingredients", [])).lower()
+            if any(word and word in text for word in exclude):
+                continue
+            base = (recipe["kcal"], recipe["protein"], recipe["carbs"], recipe["fat"])
+            options.extend((index, portion, tuple(v * portion for v in base)) for portion in PORTIONS)
+        return options
+
+    def solve_day(
+        self,
+        targets: MacroTargets,
+        slots: Sequence[str],
+        diet: Sequence[str] = (),
+        exclude: Sequence[str] = (),
+        used: Optional[Counter] = None,
+    ) -> List[PlannedMeal]:
+        target = targets.vector
+        share_total = sum(SLOT_SHARES[s] for s in slots)
+        per_slot = []
+        for slot in slots:
+            options = self._options(slot, diet, exclude) or self._options(slot, (), exclude) or self._options(slot, (), ())
+            macros = [o[2] for o in options]
+            share = target[0] * SLOT_SHARES[slot] / share_total
+            # Keep each meal near its share of the day, prefer whole servings and recipes not used yet this week
+            penalty = [
+                0.15 * ((m[0] - share) / share) ** 2 + 0.01 * abs(o[1] - 1.0) + 0.08 * (used or {}).get(o[0], 0)
+                for o, m in zip(options, macros)
+            ]
+            if NUMPY_AVAILABLE:
+                macros, penalty = np.asarray(macros, dtype=float), np.asarray(penalty)
+            per_slot.append((options, macros, penalty))
+
+        chosen = [min(range(len(penalty)), key=penalty.__getitem__) for _, _, penalty in per_slot]
+        for _ in range(self.max_passes):
+            changed = False
+            for s, (options, macros, penalty) in enumerate(per_slot):
+                others = [per_slot[o][0][chosen[o]] for o in range(len(slots)) if o != s]
+                base = [sum(option[2][i] for option in others) for i in range(4)]
+                taken = {option[0] for option in others}
+                if NUMPY_AVAILABLE:
+                    scores = _score(macros + np.asarray(base), target) + penalty
+                    scores[[i for i, option in enumerate(options) if option[0] in taken]] = np.inf
+                    best = int(np.argmin(scores))
+                else:
+                    scores = _score([tuple(b + m for b, m in zip(base, row)) for row in macros], target)
+                    scores = [float("inf") if option[0] in taken else score + p
+                              for option, score, p in zip(options, scores, penalty)]
+                    best = min(range(len(scores)), key=scores.__getitem__)
+                if best != chosen[s]:
+                    chosen[s], changed = best, True
+            if not changed:
+                break
+        return [
+            PlannedMeal(slot, self.recipes[per_slot[s][0][chosen[s]][0]], per_slot[s][0][chosen[s]][1])
+            for s, slot in enumerate(slots)
+        ]
+
+    def plan(
+        self,
+        targets: MacroTargets,
+        days: int = 1,
+        meals_per_day: int = 4,
+        diet: Sequence[str] = (),
+        exclude: Sequence[str] = (),
+    ) -> MealPlanResult:
+        """A day or week of meals for the targets; later days avoid repeating earlier recipes"""
+        started = time.perf_counter()
+        slots = SLOTS_PER_DAY.get(meals_per_day, SLOTS_PER_DAY[4])
+        diet = [d for d in diet if d in DIETS]
+        exclude = [word.strip().lower() for word in exclude if word.strip()]
+        used: Counter = Counter()
+        planned = []
+        for _ in range(max(1, min(days, 7))):
+            day = self.solve_day(targets, slots, diet, exclude, used)
+            used.update(self.recipes.index(meal.recipe) for meal in day)
+            planned.append(day)
+        result = MealPlanResult(targets, planned, list(diet), (time.perf_counter() - started) * 1000)
+        kcal_error = max(abs(totals[0] - targets.calories) / targets.calories for totals in result.day_totals())
+        with self._lock:
+            self._stats["plans"] += 1
+            self._stats["days"] += len(planned)
+            self._stats["solve_ms"] += result.elapsed_ms
+            self._errors = (self._errors + [kcal_error])[-500:]
+        print(f"[MEALS] {len(planned)}-day plan for {targets.calories} kcal / {targets.protein_g} g protein "
+              f"in {result.elapsed_ms:.1f} ms (max calorie error {kcal_error:.1%})")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats, errors = dict(self._stats), sorted(self._errors)
+        plans = stats.get("plans", 0)
+        return {
+            "plans": plans,
+            "days": stats.get("days", 0),
+            "avg_solve_ms": round(stats.get("solve_ms", 0.0) / plans, 2) if plans else 0.0,
+            "p95_calorie_error": round(errors[int(len(errors) * 0.95)], 3) if errors else None,
+            "recipes": len(self.recipes),
+        }
+
+
+meal_planner = MealPlanner()
+
+
+# ------------------------------------------------------- request integration
+
+_captured_plans: contextvars.ContextVar[Optional[List[MealPlanResult]]] = contextvars.ContextVar("meal_plans", default=None)
+# Signed-in user of the running request; the tool plans for them, never for an ID the LLM supplies
+_plan_user: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("meal_plan_user", default=None)
+
+
+@contextmanager
+def meal_plan_capture(user_id: Optional[str]) -> Iterator[List[MealPlanResult]]:
+    """Plan for ``user_id`` and collect the plans the optimizer tool solves in this block (one chat request)"""
+    plans: List[MealPlanResult] = []
+    token = _captured_plans.set(plans)
+    user_token = _plan_user.set(user_id)
+    try:
+        yield plans
+    finally:
+        _captured_plans.reset(token)
+        _plan_user.reset(user_token)
+
+
+def plan_user() -> Optional[str]:
+    """User the running request plans meals for (None outside ``meal_plan_capture``)"""
+    return _plan_user.get()
+
+
+def record_plan(result: MealPlanResult) -> bool:
+    """Hand a solved plan to the running request; False outside ``meal_plan_capture``"""
+    plans = _captured_plans.get()
+    if plans is None:
+        return False
+    plans.append(result)
+    return True
+
+
+def merge_meal_plan(plan: NutritionPlan, result: MealPlanResult) -> NutritionPlan:
+    """The nutritionist's plan with the solved meals and exact targets in place of whatever it wrote"""
+    solved = result.to_plan()
+    return plan.model_copy(update={
+        "meals": solved.meals,
+        "daily_calories": solved.daily_calories,
+        "protein_g": solved.protein_g,
+        "macro_split": solved.macro_split,
+        "dietary_considerations": plan.dietary_considerations or solved.dietary_considerations,
+    })
+
+
+def render_crew_output(output: Any, meal_plans: Sequence[MealPlanResult] = ()) -> Tuple[Optional[SpecialistPlan], str]:
+    """(typed plan or None, answer text) of a crew run, with the meals solved during it in place"""
+    plan = plan_from_output(output)
+    if isinstance(plan, NutritionPlan) and meal_plans:
+        plan = merge_meal_plan(plan, meal_plans[-1])
+    if plan is not None:
+        return plan, render_markdown(plan)
+    text = (output.raw if hasattr(output, "raw") else str(output)).strip()
+    # Clean up response text (remove any extra formatting)
+    if text.startswith("Assistant:"):
+        text = text[10:].strip()
+    # Delegated nutritionist (hierarchical crew): its prose leaves the solved meals out, as the tool asked
+    if meal_plans:
+        text += "\n\n" + render_markdown(meal_plans[-1].to_plan())
+    return None, text
+
+
+# ---------------------------------------------------------------- benchmark
+
+def _benchmark(users: int, tokens_per_second: float):
+    rng = random.Random(7)
+    planner = MealPlanner()
+    goals = ["weight_loss", "muscle_gain", "endurance", "maintenance"]
+    profiles = [
+        {"age": rng.randint(18, 70), "weight": rng.uniform(50, 115), "height": rng.uniform(150, 200),
+         "gender": rng.choice(["male", "female", ""]), "goals": rng.choice(goals)}
+        for _ in range(users)
+    ]
+    diets = [(), (), ("vegetarian",), ("vegan",), ("gluten_free",), ("pescatarian", "dairy_free")]
+    timings: Dict[int, List[float]] = {1: [], 7: []}
+    kcal_errors, protein_hits, prose_tokens, full_tokens = [], 0, [], []
+    import contextlib
+    import io
+    with contextlib.redirect_stdout(io.StringIO()):
+        for number, profile in enumerate(profiles):
+            history = [{"calories_consumed": rng.randint(1500, 3200)} for _ in range(14)]
+            targets = derive_targets(profile, history)
+            for days in (1, 7):
+                result = planner.plan(targets, days=days, diet=diets[number % len(diets)])
+                timings[days].append(result.elapsed_ms)
+            for kcal, protein, _, _ in result.day_totals():
+                kcal_errors.append(abs(kcal - targets.calories) / targets.calories)
+                protein_hits += protein >= 0.95 * targets.protein_g
+            day_plan = planner.plan(targets, days=1).to_plan()
+            day_plan = day_plan.model_copy(update={"goal": "Lose fat while keeping muscle", "tips": ["Prep lunches on Sunday"] * 3,
+                                                   "tracking": ["Log meals daily"] * 2})
+            full_tokens.append(count_tokens(day_plan.model_dump_json()))
+            prose_tokens.append(count_tokens(day_plan.model_copy(update={"meals": []}).model_dump_json()))
+    kcal_errors.sort()
+    for days, values in timings.items():
+        values.sort()
+        print(f"📊 {days}-day plan: solve p50 {statistics.median(values):.1f} ms   p95 {values[int(len(values) * 0.95)]:.1f} ms "
+              f"({'numpy' if NUMPY_AVAILABLE else 'pure python'})")
+    print(f"📊 accuracy: calories within {kcal_errors[len(kcal_errors) // 2]:.1%} (p50) / {kcal_errors[int(len(kcal_errors) * 0.95)]:.1%} (p95) "
+          f"of target; protein >= 95% of target on {protein_hits / len(kcal_errors):.0%} of {len(kcal_errors)} days")
+    saved = statistics.mean(full_tokens) - statistics.mean(prose_tokens)
+    print(f"📊 LLM output per 1-day plan: {statistics.mean(full_tokens):.0f} -> {statistics.mean(prose_tokens):.0f} tokens "
+          f"(~{saved / tokens_per_second:.1f} s less generation at {tokens_per_second:.0f} tokens/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve time, target accuracy and saved LLM output of the meal planner")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--tokens-per-second", type=float, default=40.0, help="LLM output speed")
+    args = parser.parse_args()
+    _benchmark(args.users, args.tokens_per_second)
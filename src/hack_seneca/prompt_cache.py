@@ -0,0 +1,198 @@
+"""Prompt layout for provider-side prompt-prefix caching.
+
+Azure OpenAI / OpenAI cache the longest previously seen prompt prefix once it
+is at least 1024 tokens long (then in 128-token steps) and bill cached tokens
+at a discount while skipping their prefill. Only a byte-identical prefix
+counts, so a prompt that starts with the user's message and data never hits.
+
+``tasks.yaml`` therefore keeps every task description in two parts: static
+instructions and the output format first, then the ``REQUEST DATA:`` block
+with the per-request placeholders and the user message last. Together with
+the agent's system prompt (role, backstory, goal, tool and format rules, all
+static) that gives each agent a stable prefix shared by every request.
+``check_layout`` warns when a task puts a placeholder above the marker.
+
+Cached-token counts come back in ``usage.prompt_tokens_details.cached_tokens``;
+CrewAI sums them per agent and the tracer exports them as ``cached_tokens``
+(``/debug/traces``, ``/api/metrics``).
+
+Run ``python -m hack_seneca.prompt_cache`` to replay real crew kickoffs with
+a scripted local LLM, capture every prompt, and compare cache hits, input cost
+and estimated prefill time of this layout against the previous one (data
+first, output template in ``expected_output``).
+"""
+
+import argparse
+import os
+import random
+import re
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Tuple
+
+from .context_builder import count_tokens
+
+DYNAMIC_MARKER = "REQUEST DATA:"
+OUTPUT_MARKER = "OUTPUT FORMAT:"
+
+# Azure OpenAI / OpenAI prefix caching rules (the benchmark can model other providers)
+CACHE_MIN_TOKENS = 1024
+CACHE_INCREMENT = 128
+
+_PLACEHOLDER = re.compile(r"\{[A-Za-z_][A-Za-z0-9_\-]*\}")
+
+
+def check_layout(tasks: Iterable[Any]) -> List[str]:
+    """Tasks whose static prefix contains a placeholder (which would make it differ per request)"""
+    problems = []
+    for task in tasks:
+        description = getattr(task, "_original_description", None) or task.description
+        expected = getattr(task, "_original_expected_output", None) or task.expected_output
+        static = description.split(DYNAMIC_MARKER, 1)[0]
+        if DYNAMIC_MARKER not in description:
+            problems.append(f"{task.name or 'task'}: no '{DYNAMIC_MARKER}' block")
+        for text in (static, expected):
+            for placeholder in _PLACEHOLDER.findall(text):
+                problems.append(f"{task.name or 'task'}: {placeholder} above the dynamic block")
+    for problem in problems:
+        print(f"[PROMPT] Uncacheable prompt layout - {problem}")
+    return problems
+
+
+def cacheable_tokens(shared_prefix_tokens: int, min_tokens: int = CACHE_MIN_TOKENS, increment: int = CACHE_INCREMENT) -> int:
+    """Tokens a provider serves from cache for a prompt sharing this many leading tokens with a cached one"""
+    if shared_prefix_tokens < max(min_tokens, 1):
+        return 0
+    return min_tokens + (shared_prefix_tokens - min_tokens) // increment * increment
+
+
+class PrefixCacheSimulator:
+    """Replays prompts against a provider-style prefix cache holding the most recent ``capacity`` prompts"""
+
+    def __init__(self, capacity: int = 256, min_tokens: int = CACHE_MIN_TOKENS, increment: int = CACHE_INCREMENT):
+        self.min_tokens = min_tokens
+        self.increment = increment
+        self._prompts: Deque[str] = deque(maxlen=capacity)
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.shared_tokens = 0
+        self.cached_tokens = 0
+
+    def submit(self, prompt: str) -> Tuple[int, int]:
+        """(prompt tokens, cached tokens) for one call"""
+        shared = max((len(os.path.commonprefix([prompt, seen])) for seen in self._prompts), default=0)
+        tokens = count_tokens(prompt)
+        shared_tokens = count_tokens(prompt[:shared]) if shared else 0
+        cached = min(cacheable_tokens(shared_tokens, self.min_tokens, self.increment), tokens)
+        self._prompts.append(prompt)
+        self.calls += 1
+        self.prompt_tokens += tokens
+        self.shared_tokens += shared_tokens
+        self.cached_tokens += cached
+        return tokens, cached
+
+
+def render_messages(messages: Any) -> str:
+    """Serialize chat messages the way they reach the provider: in order, role by role"""
+    if isinstance(messages, str):
+        return messages
+    return "".join(f"<|{m.get('role', 'user')}|>{m.get('content', '')}\n" for m in messages)
+
+
+# -------------------------------------------------------------------- benchmark
+
+def legacy_layout(description: str, expected_output: str) -> Tuple[str, str]:
+    """The previous task layout: request and data first, static rules after, output template last"""
+    static, dynamic = description.split(DYNAMIC_MARKER, 1)
+    instructions, _, output_format = static.partition(OUTPUT_MARKER)
+    return dynamic.strip() + "\n\n" + instructions.strip() + "\n", output_format.strip() + "\n"
+
+
+def _user_inputs(user: int, message: str) -> Dict[str, str]:
+    rng = random.Random(user)
+    return {
+        "user_id": f"user_{user:05d}",
+        "user_profile": f"Age: {rng.randint(18, 70)}, Gender: {rng.choice(['Male', 'Female'])}, "
+                        f"Height: {rng.randint(150, 200)}cm, Goal: {rng.choice(['lose fat', 'build muscle', 'maintain'])}",
+        "user_activities": f"{rng.randint(1, 6)} workouts/week, avg {rng.randint(20, 90)} min, "
+                           f"{rng.randint(4000, 14000)} steps/day",
+        "user_measurements": f"Weight {rng.uniform(50, 110):.1f}kg, body fat {rng.uniform(10, 35):.1f}%",
+        "user_nutrition": f"{rng.randint(1500, 3200)} kcal/day, protein {rng.randint(50, 200)}g",
+        "context": "This is the start of a new conversation.",
+        "knowledge": "No relevant notes.",
+        "user_message": message,
+    }
+
+
+def _benchmark(requests: int, input_price: float, cached_discount: float, prefill_ms_per_1k: float,
+               min_tokens: int, increment: int):
+    from . import crew as crew_module
+    from .router import ROUTE_FITNESS, ROUTE_MANAGER, ROUTE_NUTRITION
+    from .tiers import TIER_BALANCED, TIER_THOROUGH, TIERS, _scripted_llm
+
+    llm = _scripted_llm(0.0)
+    captured: List[str] = []
+    scripted_call = type(llm).call
+
+    def capturing_call(self, messages, *args, **kwargs):
+        captured.append(render_messages(messages))
+        return scripted_call(self, messages, *args, **kwargs)
+
+    type(llm).call = capturing_call
+    crew_module.get_llm = lambda model=None: llm
+
+    workloads = [
+        (TIERS[TIER_BALANCED], ROUTE_FITNESS, ["Give me a push day workout", "3-day full body plan please"]),
+        (TIERS[TIER_BALANCED], ROUTE_NUTRITION, ["What should I eat after training?", "High-protein vegetarian lunch"]),
+        (TIERS[TIER_THOROUGH], ROUTE_MANAGER, ["I feel off today, any advice?", "Help me get back into shape"]),
+    ]
+    print(
+        f"{requests} requests per workload, distinct users; ${input_price}/1M input tokens, cached tokens "
+        f"{cached_discount:.0%} off, prefill ~{prefill_ms_per_1k:.0f} ms per 1k uncached tokens, "
+        f"cache from {min_tokens} tokens in {increment}-token steps"
+    )
+    for tier, route, messages in workloads:
+        template = crew_module.FitnessCrew(tier).crew_for_route(route)
+        results = {}
+        for layout in ("legacy", "stable"):
+            crew = template.copy()
+            if layout == "legacy":
+                for task in crew.tasks:
+                    task.description, task.expected_output = legacy_layout(task.description, task.expected_output)
+            captured.clear()
+            for i in range(requests):
+                crew.copy().kickoff(inputs=_user_inputs(i, messages[i % len(messages)]))
+            cache = PrefixCacheSimulator(min_tokens=min_tokens, increment=increment)
+            for prompt in captured:
+                cache.submit(prompt)
+            uncached = cache.prompt_tokens - cache.cached_tokens
+            results[layout] = {
+                "calls": cache.calls,
+                "cached_share": cache.cached_tokens / cache.prompt_tokens,
+                "cost": (uncached + cache.cached_tokens * (1 - cached_discount)) * input_price / 1e6 / requests,
+                "prefill_ms": uncached / 1000 * prefill_ms_per_1k / requests,
+                "tokens": cache.prompt_tokens / cache.calls,
+                "shared": cache.shared_tokens / cache.calls,
+            }
+        for layout, r in results.items():
+            print(
+                f"📊 {tier.name}/{route:<9} {layout:<6}  {r['tokens']:5.0f} prompt tokens/call ({r['shared']:4.0f} shared prefix)   "
+                f"cached {r['cached_share']:6.1%}   input ${r['cost'] * 1000:.3f}/1k requests   prefill ~{r['prefill_ms']:5.0f} ms/request"
+            )
+        legacy, stable = results["legacy"], results["stable"]
+        print(
+            f"📊 {tier.name}/{route:<9} saving: input cost {1 - stable['cost'] / legacy['cost']:.1%}, "
+            f"prefill {1 - stable['prefill_ms'] / legacy['prefill_ms']:.1%}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare provider prompt-cache hits of the stable and legacy task layouts")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--input-price", type=float, default=2.5, help="USD per 1M input tokens")
+    parser.add_argument("--cached-discount", type=float, default=0.5, help="Discount on cached input tokens")
+    parser.add_argument("--min-tokens", type=int, default=CACHE_MIN_TOKENS, help="Shortest cacheable prefix")
+    parser.add_argument("--increment", type=int, default=CACHE_INCREMENT, help="Cache granularity in tokens")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=60.0, help="Prefill time per 1k uncached prompt tokens")
+    args = parser.parse_args()
+    os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+    _benchmark(args.requests, args.input_price, args.cached_discount, args.prefill_ms_per_1k, args.min_tokens, args.increment)
@@ -0,0 +1,461 @@
+"""Client-side rate limiting against provider quotas.
+
+Under load Groq and Azure answer with 429s, and the SDKs retried them blindly,
+which only added latency. Each (provider, model) pair now gets a limiter with
+two token buckets, requests/min and tokens/min. Calls wait in a queue that is
+fair across users (start-time fair queueing: a user with many queued calls
+doesn't starve the others) until both buckets have room. Coroutines wait in
+the same queue on an asyncio event, so a queued async call holds no thread.
+
+Limits start from ``RATE_<PROVIDER>_RPM`` / ``RATE_<PROVIDER>_TPM`` (0 means
+unknown/unlimited) and adapt to the ``x-ratelimit-*`` headers of every
+response: the reported remaining budgets replace our estimates, the token limit replaces the
+configured one, and a 429 pauses the model until ``Retry-After``.
+
+Time spent queued is reported separately from time spent at the provider
+(``/api/rate-limits/stats`` and ``queue`` spans on request traces).
+
+Run ``python -m hack_seneca.rate_limiter`` to compare blind retries with the
+fair queue against a simulated provider quota.
+"""
+
+import argparse
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import re
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Mapping, Optional, Set, Tuple
+
+_current_user: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("rate_limit_user", default=None)
+
+# Images count as a fixed-size block of prompt tokens; completions as max_tokens when given
+IMAGE_TOKENS = 1000
+DEFAULT_COMPLETION_TOKENS = 512
+
+# Published free-tier quotas for Groq's vision model; Azure and FLUX learn theirs from headers
+_DEFAULT_LIMITS = {"groq": (30, 30000), "azure": (0, 0), "flux": (0, 0)}
+
+
+class RateLimitTimeout(RuntimeError):
+    """Raised when a call waited longer than the queue allows"""
+
+
+@contextmanager
+def rate_limit_user(user_id: Optional[str]) -> Iterator[None]:
+    """Attribute provider calls made inside the block (and threads spawned from it) to this user"""
+    token = _current_user.set(user_id)
+    try:
+        yield
+    finally:
+        _current_user.reset(token)
+
+
+def current_user() -> str:
+    return _current_user.get() or "anonymous"
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Seconds from rate-limit header values such as "7.66s", "2m59.56s", "120ms" or "30" """
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"([0-9.]+)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    scale = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+class TokenBucket:
+    """Per-minute budget refilled continuously; capacity 0 means unlimited"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (0 = now)"""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)  # an oversized call waits for a full bucket, not forever
+        return 0.0 if self.level >= amount else (amount - self.level) * 60.0 / self.capacity
+
+    def take(self, amount: float, now: float):
+        if self.capacity:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+    def refund(self, amount: float, now: float):
+        if self.capacity:
+            self._refill(now)
+            self.level = min(self.capacity, self.level + amount)
+
+    def set_capacity(self, per_minute: float, now: float):
+        self._refill(now)
+        if not self.capacity:
+            self.level = per_minute
+        self.capacity = float(per_minute)
+        self.level = min(self.level, self.capacity)
+
+    def observe_remaining(self, remaining: float, now: float):
+        """The provider's own count of what's left replaces our estimate (which charges max_tokens in full)"""
+        if self.capacity:
+            self._refill(now)
+            self.level = min(self.capacity, remaining)
+
+    def pause(self, seconds: float, now: float):
+        self.paused_until = max(self.paused_until, now + seconds)
+
+
+class ModelLimiter:
+    """Requests/min and tokens/min buckets for one provider model, with a per-user fair queue"""
+
+    def __init__(self, provider: str, model: str, rpm: float = 0, tpm: float = 0, max_wait: float = 60.0):
+        self.provider = provider
+        self.model = model
+        self.max_wait = max_wait
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._cond = threading.Condition()
+        self._queue: List[Tuple[float, int]] = []  # (virtual finish time, seq) of waiting calls
+        self._async_waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self._seq = itertools.count()
+        self._vclock = 0.0
+        self._user_finish: Dict[str, float] = {}
+        self._queue_wait: Deque[float] = deque(maxlen=500)
+        self._provider_time: Deque[float] = deque(maxlen=500)
+        self._stats = {"calls": 0, "queued": 0, "timeouts": 0, "throttled_429": 0}
+
+    def _ticket(self, user: str) -> Tuple[float, int]:
+        """Start-time fair queueing: each user's calls are spaced one virtual unit apart"""
+        finish = max(self._vclock, self._user_finish.get(user, 0.0)) + 1.0
+        self._user_finish[user] = finish
+        if len(self._user_finish) > 1000:
+            self._user_finish = {u: f for u, f in self._user_finish.items() if f > self._vclock}
+        return (finish, next(self._seq))
+
+    def try_acquire(self, tokens: float) -> bool:
+        """Take budget immediately if nobody is queued and both buckets have room"""
+        with self._cond:
+            now = time.monotonic()
+            if self._queue or self.requests.wait_time(1, now) or self.tokens.wait_time(tokens, now):
+                return False
+            self._grant(tokens, now, 0.0)
+            return True
+
+    def acquire(self, tokens: float, user: Optional[str] = None) -> float:
+        """Wait for this user's turn and budget; returns the seconds spent queued"""
+        started = time.monotonic()
+        deadline = started + self.max_wait
+        with self._cond:
+            ticket = self._enqueue(user)
+            try:
+                while True:
+                    waited, timeout = self._turn(ticket, tokens, started, deadline)
+                    if waited is not None:
+                        return waited
+                    self._cond.wait(timeout)
+            finally:
+                self._dequeue(ticket)
+
+    async def acquire_async(self, tokens: float, user: Optional[str] = None) -> float:
+        """acquire() for coroutines: waits on an asyncio event instead of parking a thread"""
+        started = time.monotonic()
+        deadline = started + self.max_wait
+        wake = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), wake)
+        with self._cond:
+            ticket = self._enqueue(user)
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                with self._cond:
+                    wake.clear()
+                    waited, timeout = self._turn(ticket, tokens, started, deadline)
+                if waited is not None:
+                    return waited
+                try:
+                    await asyncio.wait_for(wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._cond:
+                self._async_waiters.discard(waiter)
+                self._dequeue(ticket)
+
+    def _enqueue(self, user: Optional[str]) -> Tuple[float, int]:
+        ticket = self._ticket(user or current_user())
+        heapq.heappush(self._queue, ticket)
+        self._stats["queued"] += 1
+        return ticket
+
+    def _dequeue(self, ticket: Tuple[float, int]):
+        self._queue.remove(ticket)
+        heapq.heapify(self._queue)
+        self._notify_all()
+
+    def _turn(self, ticket: Tuple[float, int], tokens: float, started: float, deadline: float) -> Tuple[Optional[float], float]:
+        """(seconds queued if the call is granted now, else None; seconds to wait before checking again), holding _cond"""
+        now = time.monotonic()
+        timeout = deadline - now
+        if self._queue[0] == ticket:
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+            if wait <= 0:
+                self._vclock = ticket[0]
+                waited = now - started
+                self._grant(tokens, now, waited)
+                return waited, 0.0
+            timeout = min(timeout, wait)
+        if deadline - now <= 0:
+            self._stats["timeouts"] += 1
+            raise RateLimitTimeout(f"{self.provider}/{self.model}: no quota within {self.max_wait:.0f}s")
+        return None, timeout
+
+    def _notify_all(self):
+        """Wake threads waiting on _cond and coroutines waiting in acquire_async (holding _cond)"""
+        self._cond.notify_all()
+        for loop, wake in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:  # loop closed
+                pass
+
+    def _grant(self, tokens: float, now: float, waited: float):
+        self.requests.take(1, now)
+        self.tokens.take(tokens, now)
+        self._stats["calls"] += 1
+        self._queue_wait.append(waited)
+
+    def refund(self, tokens: float):
+        """Give back budget for a call that never reached the provider"""
+        with self._cond:
+            now = time.monotonic()
+            self.requests.refund(1, now)
+            self.tokens.refund(tokens, now)
+            self._notify_all()
+
+    def observe(self, status_code: int, headers: Mapping[str, str], provider_seconds: float):
+        """Adapt to the provider's rate-limit headers and record time spent at the provider"""
+        now = time.monotonic()
+        with self._cond:
+            self._provider_time.append(provider_seconds)
+            limit_tokens = headers.get("x-ratelimit-limit-tokens")
+            if limit_tokens and limit_tokens.isdigit() and float(limit_tokens) != self.tokens.capacity:
+                # Both Groq and Azure report the token limit per minute; request limits can be per day
+                self.tokens.set_capacity(float(limit_tokens), now)
+            for bucket, name in ((self.requests, "requests"), (self.tokens, "tokens")):
+                remaining = headers.get(f"x-ratelimit-remaining-{name}")
+                if remaining is None or not remaining.isdigit():
+                    continue
+                bucket.observe_remaining(float(remaining), now)
+                if int(remaining) == 0:
+                    reset = parse_duration(headers.get(f"x-ratelimit-reset-{name}", ""))
+                    bucket.pause(min(reset or 1.0, self.max_wait), now)
+            if status_code == 429:
+                self._stats["throttled_429"] += 1
+                retry_after = headers.get("retry-after-ms")
+                seconds = float(retry_after) / 1000 if retry_after else parse_duration(headers.get("retry-after", ""))
+                seconds = min(seconds or 1.0, self.max_wait)
+                self.requests.pause(seconds, now)
+                self.tokens.pause(seconds, now)
+                print(f"[RATE] {self.provider}/{self.model} throttled, pausing {seconds:.1f}s")
+            self._notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            waits = sorted(self._queue_wait)
+            provider = sorted(self._provider_time)
+            stats = dict(self._stats)
+            stats.update({
+                "rpm_limit": self.requests.capacity,
+                "tpm_limit": self.tokens.capacity,
+                "waiting": len(self._queue),
+            })
+
+        def pct(values: List[float], q: float) -> float:
+            return round(values[min(int(len(values) * q), len(values) - 1)] * 1000, 1) if values else 0.0
+
+        stats.update({
+            "queue_wait_p50_ms": pct(waits, 0.5),
+            "queue_wait_p95_ms": pct(waits, 0.95),
+            "provider_p50_ms": pct(provider, 0.5),
+            "provider_p95_ms": pct(provider, 0.95),
+        })
+        return stats
+
+
+_limiters: Dict[Tuple[str, str], ModelLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider: str, model: str = "default") -> ModelLimiter:
+    """Process-wide limiter for the provider model, configured from RATE_<PROVIDER>_* variables"""
+    with _limiters_lock:
+        limiter = _limiters.get((provider, model))
+        if limiter is None:
+            prefix = f"RATE_{provider.upper()}_"
+            rpm, tpm = _DEFAULT_LIMITS.get(provider, (0, 0))
+            limiter = _limiters[(provider, model)] = ModelLimiter(
+                provider,
+                model,
+                rpm=float(os.getenv(prefix + "RPM", rpm)),
+                tpm=float(os.getenv(prefix + "TPM", tpm)),
+                max_wait=float(os.getenv("RATE_LIMIT_MAX_WAIT", "60")),
+            )
+        return limiter
+
+
+def _message_tokens(content: Any) -> int:
+    if isinstance(content, str):
+        return len(content) // 4
+    if isinstance(content, list):
+        return sum(
+            IMAGE_TOKENS if part.get("type") == "image_url" else len(str(part.get("text", ""))) // 4
+            for part in content if isinstance(part, dict)
+        )
+    return 0
+
+
+def describe_request(url_path: str, body: bytes) -> Tuple[str, int]:
+    """(model, estimated prompt + completion tokens) of an OpenAI-style request"""
+    deployment = re.search(r"/deployments/([^/]+)/", url_path)
+    model = deployment.group(1) if deployment else "default"
+    if not body:
+        return model, 0
+    try:
+        payload = json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        return model, 1
+    if not isinstance(payload, dict):
+        return model, 1
+    model = deployment.group(1) if deployment else str(payload.get("model") or model)
+    messages = payload.get("messages") or []
+    prompt = sum(_message_tokens(m.get("content")) for m in messages if isinstance(m, dict))
+    completion = payload.get("max_completion_tokens") or payload.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+    return model, prompt + int(completion)
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {f"{l.provider}/{l.model}": l.snapshot() for l in limiters}
+
+
+# -------------------------------------------------------------------- benchmark
+
+class _SimulatedProvider:
+    """Provider enforcing a requests/min quota with its own token bucket, answering 429 over it"""
+
+    def __init__(self, rpm: int, latency: float):
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._bucket = TokenBucket(rpm)
+
+    def call(self) -> int:
+        time.sleep(self.latency)
+        with self._lock:
+            now = time.monotonic()
+            if self._bucket.wait_time(1, now):
+                return 429
+            self._bucket.take(1, now)
+            return 200
+
+
+def _run_users(label: str, users: int, calls: int, call) -> None:
+    from concurrent.futures import ThreadPoolExecutor
+
+    latencies: Dict[str, List[float]] = {"heavy": [], "light": []}
+    failed = {"n": 0}
+    started = time.monotonic()
+
+    def one(name: str, kind: str):
+        with rate_limit_user(name):
+            t = time.monotonic()
+            if not call():
+                failed["n"] += 1
+            latencies[kind].append(time.monotonic() - t)
+
+    def light(i: int):
+        # Light users arrive after the heavy user has burnt the quota and ask two questions
+        time.sleep(max(0.0, 2.0 + i * 0.5 - (time.monotonic() - started)))
+        for _ in range(2):
+            one(f"user{i}", "light")
+
+    with ThreadPoolExecutor(max_workers=16) as heavy_pool, ThreadPoolExecutor(max_workers=users) as light_pool:
+        for _ in range(calls):
+            heavy_pool.submit(one, "heavy", "heavy")
+        for i in range(users):
+            light_pool.submit(light, i)
+    light_times = sorted(latencies["light"])
+    print(
+        f"📊 {label:<24} light calls p50 {statistics.median(light_times):5.2f}s  max {light_times[-1]:5.2f}s   "
+        f"all done {time.monotonic() - started:5.1f}s   failed {failed['n']}"
+    )
+
+
+def _benchmark(rpm: int, users: int, calls: int, latency: float):
+    provider = _SimulatedProvider(rpm, latency)
+    throttled = {"n": 0}
+
+    def blind_retry() -> bool:
+        # What the SDKs did: retry 429s with exponential backoff, unaware of the quota or other users
+        for attempt in range(5):
+            if provider.call() != 429:
+                return True
+            throttled["n"] += 1
+            time.sleep(min(0.5 * 2 ** attempt, 8.0))
+        return False
+
+    print(
+        f"Simulated quota {rpm} requests/min, {latency * 1000:.0f} ms per call; "
+        f"1 heavy user x {calls} calls (16 threads) + {users} light users x 2"
+    )
+    _run_users("blind retries", users, calls, blind_retry)
+    print(f"   429s: {throttled['n']}")
+
+    provider = _SimulatedProvider(rpm, latency)
+    limiter = ModelLimiter("bench", "model", rpm=rpm, max_wait=120.0)
+    throttled["n"] = 0
+
+    def queued() -> bool:
+        if not limiter.try_acquire(1):
+            limiter.acquire(1)
+        status = provider.call()
+        limiter.observe(status, {}, latency)
+        throttled["n"] += status == 429
+        return status != 429
+
+    _run_users("fair token-bucket queue", users, calls, queued)
+    print(f"   429s: {throttled['n']}   {limiter.snapshot()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark fair queueing against a simulated provider quota")
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--calls", type=int, default=700, help="Calls fired by the heavy user")
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    _benchmark(args.rpm, args.users, args.calls, args.latency)
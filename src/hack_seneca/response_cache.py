@@ -0,0 +1,345 @@
+"""Semantic response cache for the chat endpoint.
+
+Questions such as "3-day PPL split" or "post-workout meal" come up again and
+again, and each one runs a full crew. The cache keys an answer on a shingled
+MinHash signature of the normalized message, partitioned by the routed intent
+and a coarse profile fingerprint (goal, fitness level, fatigue flag). Lookups
+go through an LSH index so only near-duplicate candidates are compared; a
+candidate is reused when its Jaccard similarity clears the threshold and it
+mentions exactly the same numbers.
+
+Entries expire after a TTL, the cache is bounded with LRU eviction, and every
+entry remembers the user whose data produced it so it can be dropped when that
+user's profile changes. Once ``attach``-ed to a shared-state backend, stored
+answers and invalidations are replayed in every other API worker.
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from .router import tokenize
+
+SHARED_NAMESPACE = "responses"
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Words that carry no intent; dropping them lets "give me a PPL split" and
+# "PPL split please" share most of their shingles.
+STOPWORDS = frozenset(
+    "a an the me my i im to for of and or please can could you would like want need "
+    "some any give show tell what whats is are it this that with on in at do should".split()
+)
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, strip punctuation and stopwords"""
+    return " ".join(token for token in tokenize(message) if token not in STOPWORDS)
+
+
+def shingle(message: str, size: int = 3) -> FrozenSet[str]:
+    """Character shingles of the normalized message"""
+    text = normalize_message(message)
+    if len(text) <= size:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i:i + size] for i in range(len(text) - size + 1))
+
+
+def numeric_tokens(message: str) -> FrozenSet[str]:
+    """Numbers in the message; "3-day" and "4-day" splits must never share an answer"""
+    return frozenset(token for token in tokenize(message) if any(ch.isdigit() for ch in token))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def profile_fingerprint(profile: Optional[Dict[str, Any]], fatigued: bool = False) -> str:
+    """Coarse profile key: goal, fitness level and fatigue flag"""
+    profile = profile or {}
+    goal = str(profile.get("goals") or "any").lower()
+    level = str(profile.get("fitness_level") or "any").lower()
+    return f"{goal}|{level}|{'tired' if fatigued else 'rested'}"
+
+
+class MinHasher:
+    """MinHash signatures from universal hash permutations of CRC32 shingle hashes"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 7):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._perms = [
+            (rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, shingles: FrozenSet[str]) -> Tuple[int, ...]:
+        if not shingles:
+            return tuple([_MAX_HASH] * self.num_perm)
+        hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        )
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    partition: str
+    owner: str
+    shingles: FrozenSet[str]
+    numbers: FrozenSet[str]
+    signature: Tuple[int, ...]
+    payload: Dict[str, Any]
+    compute_seconds: float
+    created_at: float
+    hits: int = 0
+    bands: List[Tuple[int, Tuple[int, ...]]] = field(default_factory=list)
+
+
+class ResponseCache:
+    """Near-duplicate chat answer cache with TTL, LRU bound and per-user invalidation"""
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: float = 3600,
+        threshold: float = 0.8,
+        num_perm: int = 64,
+        bands: int = 16,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._rows = num_perm // bands
+        self._bands = bands
+        self._hasher = MinHasher(num_perm=num_perm)
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, Tuple[int, ...]], Set[str]] = defaultdict(set)
+        self._by_owner: Dict[str, Set[str]] = defaultdict(set)
+        self._profile_hashes: Dict[str, str] = {}
+        self._shared = None
+        self._stats = {
+            "lookups": 0,
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+            "seconds_saved": 0.0,
+            "shared_received": 0,
+        }
+
+    def attach(self, backend):
+        """Share stored answers and invalidations with other workers through a shared-state backend"""
+        self._shared = backend
+        backend.subscribe(SHARED_NAMESPACE, self._on_shared_event)
+
+    # ------------------------------------------------------------------ lookup
+
+    def lookup(self, message: str, intent: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Return the cached payload of the closest matching entry, if any"""
+        partition = f"{intent}|{fingerprint}"
+        shingles = shingle(message)
+        numbers = numeric_tokens(message)
+        signature = self._hasher.signature(shingles)
+        now = time.time()
+
+        with self._lock:
+            self._stats["lookups"] += 1
+            best: Optional[CacheEntry] = None
+            best_score = 0.0
+            for key in self._candidates(partition, signature):
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if now - entry.created_at > self.ttl_seconds:
+                    self._remove(key)
+                    self._stats["expirations"] += 1
+                    continue
+                if entry.numbers != numbers:
+                    continue
+                score = jaccard(shingles, entry.shingles)
+                if score > best_score:
+                    best, best_score = entry, score
+
+            if best is None or best_score < self.threshold:
+                self._stats["misses"] += 1
+                return None
+
+            best.hits += 1
+            self._entries.move_to_end(best.key)
+            self._stats["hits"] += 1
+            self._stats["seconds_saved"] += best.compute_seconds
+            return dict(best.payload)
+
+    def _candidates(self, partition: str, signature: Tuple[int, ...]) -> Set[str]:
+        keys: Set[str] = set()
+        for band in self._band_keys(signature):
+            keys |= self._buckets.get((partition,) + band, set())
+        return keys
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+        rows = self._rows
+        return [(i, signature[i * rows:(i + 1) * rows]) for i in range(self._bands)]
+
+    # ------------------------------------------------------------------- store
+
+    def store(
+        self,
+        message: str,
+        intent: str,
+        fingerprint: str,
+        owner: str,
+        payload: Dict[str, Any],
+        compute_seconds: float,
+    ):
+        """Cache a computed answer"""
+        created_at = time.time()
+        key = self._insert(message, intent, fingerprint, owner, payload, compute_seconds, created_at)
+        if key and self._shared is not None:
+            record = {
+                "message": message, "intent": intent, "fingerprint": fingerprint, "owner": owner,
+                "payload": payload, "compute_seconds": compute_seconds, "created_at": created_at,
+            }
+            self._shared.set(SHARED_NAMESPACE, key, record, self.ttl_seconds)
+            self._shared.publish(SHARED_NAMESPACE, key, "set")
+
+    def _insert(
+        self,
+        message: str,
+        intent: str,
+        fingerprint: str,
+        owner: str,
+        payload: Dict[str, Any],
+        compute_seconds: float,
+        created_at: Optional[float] = None,
+    ) -> Optional[str]:
+        # Replayed entries keep the storing worker's timestamp, so the TTL isn't restarted
+        created_at = time.time() if created_at is None else created_at
+        partition = f"{intent}|{fingerprint}"
+        shingles = shingle(message)
+        if not shingles or time.time() - created_at > self.ttl_seconds:
+            return None
+        signature = self._hasher.signature(shingles)
+        key = hashlib.sha1(f"{partition}|{normalize_message(message)}".encode("utf-8")).hexdigest()
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            entry = CacheEntry(
+                key=key,
+                partition=partition,
+                owner=owner,
+                shingles=shingles,
+                numbers=numeric_tokens(message),
+                signature=signature,
+                payload=dict(payload),
+                compute_seconds=compute_seconds,
+                created_at=created_at,
+                bands=self._band_keys(signature),
+            )
+            self._entries[key] = entry
+            for band in entry.bands:
+                self._buckets[(partition,) + band].add(key)
+            self._by_owner[owner].add(key)
+            self._stats["stores"] += 1
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats["evictions"] += 1
+        return key
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band in entry.bands:
+            bucket_key = (entry.partition,) + band
+            bucket = self._buckets.get(bucket_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[bucket_key]
+        owned = self._by_owner.get(entry.owner)
+        if owned is not None:
+            owned.discard(key)
+            if not owned:
+                del self._by_owner[entry.owner]
+
+    # ------------------------------------------------------------ invalidation
+
+    def invalidate_user(self, user_id: str) -> int:
+        """Drop every entry computed from this user's data, in every worker"""
+        if self._shared is not None:
+            self._shared.publish(SHARED_NAMESPACE, user_id, "invalidate_user")
+        return self._invalidate_local(user_id)
+
+    def _invalidate_local(self, user_id: str) -> int:
+        with self._lock:
+            keys = list(self._by_owner.get(user_id, ()))
+            for key in keys:
+                self._remove(key)
+            self._stats["invalidations"] += len(keys)
+            return len(keys)
+
+    def observe_profile(self, user_id: str, user_data: Dict[str, Any]) -> bool:
+        """Invalidate a user's entries when their data differs from what we last saw"""
+        digest = hashlib.sha1(json.dumps(user_data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        with self._lock:
+            previous = self._profile_hashes.get(user_id)
+            self._profile_hashes[user_id] = digest
+        if previous is not None and previous != digest:
+            self.invalidate_user(user_id)
+            return True
+        return False
+
+    def _on_shared_event(self, key: str, op: str):
+        """Apply a store or invalidation published by another worker"""
+        if op == "invalidate_user":
+            self._invalidate_local(key)
+        elif op == "set":
+            record = self._shared.get(SHARED_NAMESPACE, key)
+            if record:
+                self._insert(**record)
+        with self._lock:
+            self._stats["shared_received"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._by_owner.clear()
+
+    # ------------------------------------------------------------------- stats
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        stats["hit_rate"] = round(stats["hits"] / stats["lookups"], 3) if stats["lookups"] else 0.0
+        stats["seconds_saved"] = round(stats["seconds_saved"], 3)
+        return stats
+
+
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000")),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600")),
+    threshold=float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.8")),
+)
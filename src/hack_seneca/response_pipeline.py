@@ -0,0 +1,417 @@
+"""Post-processing of crew responses: classification, extraction and formatting.
+
+After every crew run the response used to be lowercased and rescanned by the
+classifier, each ``extract_*`` helper and each formatter, with regexes
+re-resolved on every call. Here the text is lowercased once and every
+keyword the pipeline cares about (message types, difficulty, focus areas,
+meal types, formatting triggers) goes through one ``KeywordMatcher``: all
+keywords compiled into a single alternation regex (prefixes shared as a
+trie), so the response is scanned once instead of once per keyword. The
+keyword hits are shared by extraction and formatting, regexes are compiled
+once and the number-heavy ones only run when their anchor word is present.
+
+Run ``python -m hack_seneca.response_pipeline`` to time the pipeline on long
+workout plans.
+"""
+
+import argparse
+import itertools
+import random
+import re
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+
+@dataclass(frozen=True)
+class MessageCategory:
+    message_type: str
+    emoji: str
+    priority: str
+    keywords: Tuple[str, ...]
+    suggestions: Tuple[str, ...]
+
+
+# Checked in order; the first category with a keyword in the response wins
+CATEGORIES: Tuple[MessageCategory, ...] = (
+    MessageCategory(
+        "workout", "💪", "normal",
+        ("workout", "exercise", "training", "routine", "fitness plan", "reps", "sets"),
+        ("🔄 Modify this workout", "📝 Save to my plans", "💬 Ask questions about form", "⏱️ Set workout reminders"),
+    ),
+    MessageCategory(
+        "nutrition", "🥗", "normal",
+        ("nutrition", "meal", "food", "diet", "calories", "protein", "eat"),
+        ("🛒 Create shopping list", "📱 Log this meal", "🔄 Get meal variations", "📊 Check nutrition facts"),
+    ),
+    MessageCategory(
+        "progress", "📊", "normal",
+        ("progress", "goal", "track", "achievement", "milestone", "improvement"),
+        ("📈 View detailed progress", "🎯 Update my goals", "🏆 See achievements", "📅 Plan next week"),
+    ),
+    MessageCategory(
+        "motivation", "🔥", "high",
+        ("motivation", "encourage", "inspire", "great job", "keep it up", "you can do", "believe"),
+        ("💪 I need more motivation!", "🎵 Share workout music", "📱 Set daily reminders", "🤝 Find workout buddy"),
+    ),
+    MessageCategory(
+        "tip", "💡", "normal",
+        ("tip", "advice", "suggestion", "recommend", "try", "consider", "help"),
+        ("📚 More tips like this", "💾 Save this tip", "❓ Ask follow-up questions", "🔄 Get related advice"),
+    ),
+    MessageCategory(
+        "achievement", "🏆", "high",
+        ("congratulations", "achievement", "accomplished", "proud", "success", "milestone"),
+        ("🎉 Share my success!", "🎯 Set new goals", "📸 Take progress photo", "💪 What's next?"),
+    ),
+)
+
+DEFAULT_CATEGORY = MessageCategory(
+    "text", "💬", "normal", (),
+    ("💪 Plan a workout", "🥗 Suggest a meal", "📊 Check progress", "💡 Get fitness tips"),
+)
+
+DIFFICULTY_LEVELS = ("beginner", "intermediate", "advanced", "easy", "moderate", "hard")
+
+FOCUS_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "upper body": ("upper body", "arms", "chest", "shoulders", "back"),
+    "lower body": ("lower body", "legs", "glutes", "thighs", "calves"),
+    "core": ("core", "abs", "abdomen", "stomach"),
+    "cardio": ("cardio", "cardiovascular", "running", "cycling"),
+    "full body": ("full body", "whole body", "complete"),
+}
+
+MEAL_TYPES = ("breakfast", "lunch", "dinner", "snack", "post-workout")
+
+NUTRITION_FORMAT_KEYWORDS = ("meal", "nutrition", "diet")
+
+# Words a regex needs before it can match; when absent the regex is skipped
+_ANCHORS = ("workout plan", "min", "cal", "protein")
+
+FITNESS_EXPRESSIONS: Dict[str, Tuple[str, ...]] = {
+    "workout": ("Let's get those gains! 💪", "Time to crush it! 🔥", "Your body will thank you! ✨"),
+    "nutrition": ("Fuel your body right! 🌟", "Healthy choices = happy body! 😊", "You are what you eat! 🥗"),
+    "motivation": ("You've got this! 🔥", "Every step counts! 👟", "Progress over perfection! ⭐"),
+    "progress": ("Look at you go! 📈", "Amazing progress! 🎯", "Keep up the momentum! 🚀"),
+    "tip": ("Pro tip incoming! 💡", "Knowledge is power! 🧠", "Here's the secret! ✨"),
+    "achievement": ("You're a rockstar! 🌟", "Incredible work! 🏆", "So proud of you! 🎉"),
+}
+
+MOTIVATIONAL_SIGNOFFS = (
+    "\n\nRemember: You're stronger than you think! 💪",
+    "\n\nKeep up the amazing work! 🌟",
+    "\n\nI believe in you! 🔥",
+    "\n\nYou've got this! ✨",
+    "\n\nStay consistent, stay strong! 💪",
+    "\n\nEvery effort counts! 🎯",
+)
+SIGNOFF_CHANCE = 0.3
+_ENTHUSIASTIC_MARKS = ("!", "💪", "🔥", "✨", "🌟")
+
+# Patterns start with a character class rather than \d+ so the regex engine can skip ahead to candidates
+_DURATION_RE = re.compile(r"([0-9]\d*)[-\s]*(\d+)?\s*(?:minute|min)")
+_CALORIES_RE = re.compile(r"([0-9]\d*)\s*(?:calorie|cal)")
+_PROTEIN_RE = re.compile(r"([0-9]\d*)(?:\s*(?:gram|g))?\s*(?:of\s+)?protein")
+_NUMBER_RE = re.compile(r"[0-9]\d*")
+_NUMBERED_ITEM_RE = re.compile(r"[0-9]\d*\.\s*[A-Za-z]")
+_NUMBER_MARKER_RE = re.compile(r"([0-9]\d*\.\s*)")
+_BULLET_ITEM_RE = re.compile(r"[-•]\s*[A-Za-z]")
+_BULLET_RE = re.compile(r"[-•]\s*")
+_DAY_HEADER_RE = re.compile(r"(?:Monday|Tuesday|Wednesday|Thursday|Friday|Saturday|Sunday)", re.IGNORECASE)
+_MEAL_HEADER_RE = re.compile(r"\*\*(?:Breakfast|Lunch|Dinner|Snack)[^*]*\*\*")
+_SENTENCE_BREAK_RE = re.compile(r"\.\s+([A-Z])")
+_NUMBERED_LIST_RE = re.compile(r"([0-9]\d*\.\s*[A-Za-z])")
+_EXTRA_BLANK_LINES_RE = re.compile(r"\n\s*\n\s*\n")
+
+
+def _trie_pattern(keywords: Iterable[str]) -> str:
+    """One alternation with shared prefixes factored out, so a position fails on its first character"""
+    root: Dict[str, Any] = {}
+    for keyword in keywords:
+        node = root
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        # Greedy optional: the longest keyword starting at a position wins
+        return f"(?:{body})?" if "" in node else body
+
+    return build(root)
+
+
+class KeywordMatcher:
+    """Finds which of a fixed set of keywords occur (as substrings) in a lowercased text"""
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = frozenset(keywords)
+        # Inside a lookahead every position reports the longest keyword starting there; the keywords
+        # contained in it are added from ``_contained`` so overlapping keywords aren't lost
+        self._pattern = re.compile(f"(?=({_trie_pattern(self.keywords)}))")
+        self._contained: Dict[str, FrozenSet[str]] = {
+            keyword: frozenset(other for other in self.keywords if other in keyword) for keyword in self.keywords
+        }
+
+    def scan(self, text_lower: str) -> Set[str]:
+        """Keywords present in the text, from one pass of the alternation"""
+        hits: Set[str] = set()
+        for keyword in set(self._pattern.findall(text_lower)):
+            hits |= self._contained[keyword]
+        return hits
+
+
+def _pipeline_keywords() -> Set[str]:
+    keywords = set(DIFFICULTY_LEVELS) | set(MEAL_TYPES) | set(NUTRITION_FORMAT_KEYWORDS) | set(_ANCHORS)
+    for category in CATEGORIES:
+        keywords.update(category.keywords)
+    for focus_words in FOCUS_KEYWORDS.values():
+        keywords.update(focus_words)
+    return keywords
+
+
+matcher = KeywordMatcher(_pipeline_keywords())
+
+
+@dataclass
+class ResponseAnalysis:
+    message_type: str
+    emoji: str
+    priority: str
+    data: Dict[str, Any]
+    suggestions: List[str]
+    hits: Any = field(default=None, repr=False)
+    # Rendered from a structured specialist payload, so already laid out for the chat
+    preformatted: bool = False
+
+    def as_tuple(self) -> tuple:
+        return self.message_type, self.emoji, self.priority, self.data, self.suggestions
+
+
+def _first_present(candidates: Iterable[str], hits) -> Optional[str]:
+    return next((candidate for candidate in candidates if candidate in hits), None)
+
+
+def extract_workout_data(text: str, lower: str, hits) -> Dict[str, Any]:
+    """Duration, difficulty, focus area and exercise count of a workout response"""
+    data: Dict[str, Any] = {}
+    if "min" in hits:
+        duration = _DURATION_RE.search(lower)
+        if duration:
+            if duration.group(2):
+                data["duration"] = f"{duration.group(1)}-{duration.group(2)} min"
+            else:
+                data["duration"] = f"{duration.group(1)} min"
+    difficulty = _first_present(DIFFICULTY_LEVELS, hits)
+    if difficulty:
+        data["difficulty"] = difficulty.capitalize()
+    for focus, keywords in FOCUS_KEYWORDS.items():
+        if _first_present(keywords, hits):
+            data["focus"] = focus
+            break
+    exercise_count = sum(1 for _ in _NUMBERED_ITEM_RE.finditer(text))
+    if exercise_count:
+        data["exercise_count"] = exercise_count
+    return data
+
+
+def extract_nutrition_data(text: str, lower: str, hits) -> Dict[str, Any]:
+    """Calories, protein, meal type and ingredient count of a nutrition response"""
+    data: Dict[str, Any] = {}
+    if "cal" in hits:
+        calories = _CALORIES_RE.search(lower)
+        if calories:
+            data["calories"] = int(calories.group(1))
+    if "protein" in hits:
+        protein = _PROTEIN_RE.search(lower)
+        if protein:
+            data["protein"] = f"{protein.group(1)}g"
+    meal_type = _first_present(MEAL_TYPES, hits)
+    if meal_type:
+        data["meal_type"] = meal_type.capitalize()
+    ingredient_count = sum(1 for _ in _BULLET_ITEM_RE.finditer(text))
+    if ingredient_count:
+        data["ingredient_count"] = ingredient_count
+    return data
+
+
+def extract_progress_data(text: str, lower: str, hits) -> Dict[str, Any]:
+    """Numbers that might be progress metrics (workouts, streak, goals)"""
+    numbers = [match.group(0) for match in itertools.islice(_NUMBER_RE.finditer(text), 3)]
+    if len(numbers) < 2:
+        return {}
+    return {"workouts": numbers[0], "streak": numbers[1], "goals": numbers[2] if len(numbers) > 2 else "0"}
+
+
+_EXTRACTORS = {
+    "workout": extract_workout_data,
+    "nutrition": extract_nutrition_data,
+    "progress": extract_progress_data,
+}
+
+
+def analyze_response(response_text: str, keyword_matcher: Optional[KeywordMatcher] = None) -> ResponseAnalysis:
+    """Message type, emoji, priority, structured data and follow-up suggestions of a response"""
+    lower = response_text.lower()
+    hits = (keyword_matcher or matcher).scan(lower)
+    category = next(
+        (category for category in CATEGORIES if _first_present(category.keywords, hits)),
+        DEFAULT_CATEGORY,
+    )
+    extractor = _EXTRACTORS.get(category.message_type)
+    return ResponseAnalysis(
+        message_type=category.message_type,
+        emoji=category.emoji,
+        priority=category.priority,
+        data=extractor(response_text, lower, hits) if extractor else {},
+        suggestions=list(category.suggestions),
+        hits=hits,
+    )
+
+
+def analyze_structured(message_type: str, data: Dict[str, Any]) -> ResponseAnalysis:
+    """Analysis of a response rendered from a structured specialist plan; nothing to scan"""
+    category = next((c for c in CATEGORIES if c.message_type == message_type), DEFAULT_CATEGORY)
+    return ResponseAnalysis(
+        message_type=category.message_type,
+        emoji=category.emoji,
+        priority=category.priority,
+        data=data,
+        suggestions=list(category.suggestions),
+        preformatted=True,
+    )
+
+
+def format_workout_plan(text: str) -> str:
+    """Put day headers and numbered exercises on their own lines"""
+    formatted_parts = []
+    for part in text.split("**"):
+        part = part.strip()
+        if not part:
+            continue
+        if _DAY_HEADER_RE.match(part):
+            formatted_parts.append(f"\n**{part}**")
+        elif _NUMBERED_ITEM_RE.search(part):
+            formatted_parts.append(_NUMBER_MARKER_RE.sub(r"\n\1", part))
+        else:
+            formatted_parts.append(part)
+    return " ".join(formatted_parts)
+
+
+def format_nutrition_advice(text: str) -> str:
+    """Line breaks before meal headers and bullet points"""
+    formatted_text = _MEAL_HEADER_RE.sub(r"\n\g<0>", text)
+    formatted_text = _BULLET_RE.sub("\n• ", formatted_text)
+    return formatted_text.strip()
+
+
+def format_general_text(text: str) -> str:
+    """Paragraph breaks between sentences and before numbered lists"""
+    formatted_text = _SENTENCE_BREAK_RE.sub(r".\n\n\1", text)
+    formatted_text = _NUMBERED_LIST_RE.sub(r"\n\1", formatted_text)
+    formatted_text = _EXTRA_BLANK_LINES_RE.sub("\n\n", formatted_text)
+    return formatted_text.strip()
+
+
+def format_response(response_text: str, analysis: ResponseAnalysis) -> str:
+    """Readable layout for the response, chosen from its type and keywords"""
+    hits = analysis.hits if analysis.hits is not None else matcher.scan(response_text.lower())
+    if analysis.message_type == "workout" or "workout plan" in hits:
+        return format_workout_plan(response_text)
+    if analysis.message_type == "nutrition" or _first_present(NUTRITION_FORMAT_KEYWORDS, hits):
+        return format_nutrition_advice(response_text)
+    return format_general_text(response_text)
+
+
+def add_personality(response_text: str, analysis: ResponseAnalysis) -> str:
+    """Formatted response with an encouraging expression and, sometimes, a sign-off"""
+    formatted_response = response_text if analysis.preformatted else format_response(response_text, analysis)
+    expressions = FITNESS_EXPRESSIONS.get(analysis.message_type)
+    if expressions:
+        expression = random.choice(expressions)
+        if not any(mark in formatted_response for mark in _ENTHUSIASTIC_MARKS):
+            formatted_response += f" {expression}"
+    if random.random() < SIGNOFF_CHANCE:
+        formatted_response += random.choice(MOTIVATIONAL_SIGNOFFS)
+    return formatted_response
+
+
+# -------------------------------------------------------------------- benchmark
+
+_DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+def _sample_plan(weeks: int) -> str:
+    """A long markdown workout plan shaped like the fitness coach's output"""
+    parts = ["Here is your 4-week intermediate workout plan focused on upper body strength and core."]
+    for week in range(1, weeks + 1):
+        for day in _DAYS:
+            parts.append(f"**{day} (Week {week}) - Upper Body Strength**")
+            for i in range(1, 9):
+                parts.append(
+                    f"{i}. Bench press: 3 sets of 10 reps, rest 60 seconds between sets. "
+                    "Keep your core tight and your back flat."
+                )
+            parts.append("Cool down with 10 minutes of light cycling and stretching.")
+    return " ".join(parts)
+
+
+def _rescanning_baseline(text: str) -> str:
+    """The previous flow: every step lowercases and rescans the text with regexes resolved per call"""
+    message_type = next(
+        (c.message_type for c in CATEGORIES if any(k in text.lower() for k in c.keywords)), "text"
+    )
+    if message_type == "workout":
+        re.search(r"(\d+)[-\s]*(\d+)?\s*(?:minute|min)", text.lower())
+        next((level for level in DIFFICULTY_LEVELS if level in text.lower()), None)
+        next((f for f, words in FOCUS_KEYWORDS.items() if any(w in text.lower() for w in words)), None)
+        len(re.findall(r"\d+\.\s*[A-Za-z]", text))
+    if message_type != "workout" and "workout plan" not in text.lower():
+        return text
+    parts = []
+    for part in text.split("**"):
+        part = part.strip()
+        if re.match(r"(Monday|Tuesday|Wednesday|Thursday|Friday|Saturday|Sunday)", part, re.IGNORECASE):
+            parts.append(f"\n**{part}**")
+        elif re.search(r"\d+\.\s*[A-Za-z]", part):
+            pieces = re.split(r"(\d+\.\s*)", part)
+            parts.append("".join(f"\n{p}" if re.match(r"\d+\.\s*", p) else p for p in pieces if p.strip()))
+        elif part:
+            parts.append(part)
+    return " ".join(parts)
+
+
+def _benchmark(weeks: int, runs: int):
+    text = _sample_plan(weeks)
+    print(f"Workout plan of {len(text):,} chars, {runs} runs, {len(matcher.keywords)} keywords")
+    baseline = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        _rescanning_baseline(text)
+        baseline.append(time.perf_counter() - started)
+    print(f"📊 {'rescanning':<13} total {statistics.median(baseline) * 1000:6.3f} ms (previous flow)")
+    timings: Dict[str, List[float]] = {"analyze": [], "format": [], "total": []}
+    for _ in range(runs):
+        started = time.perf_counter()
+        analysis = analyze_response(text)
+        analyzed = time.perf_counter()
+        format_response(text, analysis)
+        done = time.perf_counter()
+        timings["analyze"].append(analyzed - started)
+        timings["format"].append(done - analyzed)
+        timings["total"].append(done - started)
+    summary = "   ".join(f"{stage} {statistics.median(values) * 1000:6.3f} ms" for stage, values in timings.items())
+    print(f"📊 {'pipeline':<13} {summary}")
+    print(f"   data: {analysis.data}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time response classification and formatting on long workout plans")
+    parser.add_argument("--weeks", type=int, default=4, help="Weeks in the generated plan")
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+    _benchmark(args.weeks, args.runs)
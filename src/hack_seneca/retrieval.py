@@ -0,0 +1,539 @@
+"""Local retrieval over the knowledge directory, past conversations and user records.
+
+Nothing read ``knowledge/``, and the manager's CrewAI memory made remote
+embedding calls on every turn. This index keeps everything local: documents
+are chunked, tokenized and added to a BM25 inverted index (or, with
+``RETRIEVAL_INDEX=cosine``, a NumPy matrix of hashed term vectors), and only
+the top-k snippets that fit a small token budget are injected into the task
+prompts through the ``{knowledge}`` placeholder.
+
+Sources, all indexed incrementally:
+- ``knowledge/reference/*`` files (global) and ``knowledge/users/<user_id>/*``
+  (that user only), re-read when their mtime changes. Anything else under
+  ``knowledge/`` (such as the template's single-user ``user_preference.txt``)
+  is not indexed, so one person's profile never reaches everyone's prompts
+- conversation turns from other sessions of the same user (the current
+  session is already in ``{context}``): the newest ``RETRIEVAL_TURNS_PER_USER``
+  turns of each user, pulled from the conversation store by row id when that
+  user asks something. A user's first backfill runs on a background thread,
+  and the users least recently asked about are evicted past
+  ``RETRIEVAL_TURN_USERS``
+- the user's profile and records, re-indexed when their data version changes
+
+``CREW_MEMORY_MODE`` picks the memory: ``local`` (default; this index, no
+embedding calls), ``crewai`` (the previous CrewAI memory on the manager) or
+``off``.
+
+Run ``python -m hack_seneca.retrieval`` to measure indexing and query latency
+on synthetic users.
+"""
+
+import argparse
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from .context_builder import ContextBuilder, count_tokens
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_KNOWLEDGE_DIR = os.getenv("KNOWLEDGE_DIR", os.path.join(_PROJECT_ROOT, "knowledge"))
+
+MEMORY_MODE = os.getenv("CREW_MEMORY_MODE", "local").lower()  # local | crewai | off
+NO_KNOWLEDGE = "No relevant notes."
+# Snippets that tie an answer to one conversation; the user's own records are already in the digest
+CONVERSATION_SOURCES = frozenset({"knowledge", "conversation"})
+
+GLOBAL = "*"  # scope of documents visible to every user
+REFERENCE_DIR = "reference"  # knowledge/<REFERENCE_DIR>/ holds the general material indexed as GLOBAL
+USERS_DIR = "users"  # knowledge/<USERS_DIR>/<user_id>/ holds material only that user sees
+HASH_DIM = 1 << 12
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do for from how i in is it me my of on or so that the this to was what "
+    "when which with you your am any should would could".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords; trailing plural 's' folded"""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+@dataclass
+class Document:
+    doc_id: str
+    scope: str
+    source: str  # knowledge, conversation, record
+    text: str
+    tokens: int
+    session_id: Optional[str] = None
+
+
+@dataclass
+class Hit:
+    doc: Document
+    score: float
+
+
+class BM25Index:
+    """Inverted index with Okapi BM25 scoring; postings are kept per scope so a user's query never touches other users' documents"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, Dict[str, int]]] = defaultdict(lambda: defaultdict(dict))
+        self._lengths: Dict[str, int] = {}
+        self._terms: Dict[str, Counter] = {}
+        self._scopes: Dict[str, str] = {}
+        self._df: Counter = Counter()
+        self._total_length = 0
+
+    def add(self, doc_id: str, scope: str, terms: List[str]):
+        counts = Counter(terms)
+        postings = self._postings[scope]
+        for term, tf in counts.items():
+            postings[term][doc_id] = tf
+            self._df[term] += 1
+        self._terms[doc_id] = counts
+        self._scopes[doc_id] = scope
+        self._lengths[doc_id] = len(terms)
+        self._total_length += len(terms)
+
+    def remove(self, doc_id: str):
+        counts = self._terms.pop(doc_id, None)
+        if counts is None:
+            return
+        scope = self._scopes.pop(doc_id)
+        postings = self._postings[scope]
+        for term in counts:
+            postings[term].pop(doc_id, None)
+            if not postings[term]:
+                del postings[term]
+            self._df[term] -= 1
+            if not self._df[term]:
+                del self._df[term]
+        self._total_length -= self._lengths.pop(doc_id)
+
+    def search(self, terms: List[str], scopes: Iterable[str], k: int, min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """Top-k documents scoring at least min_score of the best score the query could reach"""
+        n = len(self._lengths)
+        if not n:
+            return []
+        avgdl = self._total_length / n
+        scores: Dict[str, float] = defaultdict(float)
+        ceiling = 0.0
+        for term in set(terms):
+            df = self._df.get(term, 0)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            # Terms nobody wrote still count towards the ceiling, so matching one word of four scores low
+            ceiling += idf * (self.k1 + 1)
+            if not df:
+                continue
+            for scope in scopes:
+                for doc_id, tf in self._postings.get(scope, {}).get(term, {}).items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avgdl)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        floor = min_score * ceiling
+        ranked = [item for item in scores.items() if item[1] >= floor]
+        return sorted(ranked, key=lambda item: item[1], reverse=True)[:k]
+
+
+class CosineIndex:
+    """Hashed, sublinear-tf term vectors in one NumPy matrix per scope; queries are idf-weighted"""
+
+    def __init__(self, dim: int = HASH_DIM):
+        self.dim = dim
+        self._rows: Dict[str, Dict[str, "np.ndarray"]] = defaultdict(dict)
+        self._matrices: Dict[str, Tuple[List[str], "np.ndarray"]] = {}
+        self._df: Counter = Counter()
+        self._terms: Dict[str, Tuple[str, Set[str]]] = {}
+
+    def _vector(self, weights: Dict[str, float]) -> "np.ndarray":
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for term, weight in weights.items():
+            h = zlib.crc32(term.encode("utf-8"))
+            vector[h % self.dim] += weight if h & 0x80000000 else -weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def add(self, doc_id: str, scope: str, terms: List[str]):
+        counts = Counter(terms)
+        self._rows[scope][doc_id] = self._vector({t: 1 + math.log(tf) for t, tf in counts.items()})
+        self._matrices.pop(scope, None)
+        self._df.update(counts.keys())
+        self._terms[doc_id] = (scope, set(counts))
+
+    def remove(self, doc_id: str):
+        entry = self._terms.pop(doc_id, None)
+        if entry is None:
+            return
+        scope, terms = entry
+        self._rows[scope].pop(doc_id, None)
+        self._matrices.pop(scope, None)
+        self._df.subtract(terms)
+
+    def _matrix(self, scope: str) -> Tuple[List[str], "np.ndarray"]:
+        cached = self._matrices.get(scope)
+        if cached is None:
+            rows = self._rows.get(scope) or {}
+            ids = list(rows)
+            matrix = np.vstack([rows[i] for i in ids]) if ids else np.zeros((0, self.dim), dtype=np.float32)
+            cached = self._matrices[scope] = (ids, matrix)
+        return cached
+
+    def search(self, terms: List[str], scopes: Iterable[str], k: int, min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """Top-k documents with a cosine similarity of at least min_score"""
+        n = max(len(self._terms), 1)
+        weights = {t: math.log(1 + n / (1 + self._df.get(t, 0))) for t in set(terms) if self._df.get(t, 0) > 0}
+        if not weights:
+            return []
+        query = self._vector(weights)
+        results: List[Tuple[str, float]] = []
+        for scope in scopes:
+            ids, matrix = self._matrix(scope)
+            if not ids:
+                continue
+            scores = matrix @ query
+            top = np.argsort(-scores)[:k]
+            results.extend((ids[i], float(scores[i])) for i in top if scores[i] > max(min_score, 0.05))
+        return sorted(results, key=lambda item: item[1], reverse=True)[:k]
+
+
+def chunk_text(text: str, max_tokens: int = 120) -> List[str]:
+    """Paragraph chunks; long paragraphs are split on sentence boundaries"""
+    chunks = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if count_tokens(paragraph) <= max_tokens:
+            chunks.append(paragraph)
+            continue
+        current = ""
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            if current and count_tokens(current + " " + sentence) > max_tokens:
+                chunks.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}".strip()
+        if current:
+            chunks.append(current)
+    return chunks
+
+
+def _record_text(kind: str, row: Dict[str, Any]) -> str:
+    fields = ", ".join(
+        f"{key.replace('_', ' ')} {value}" for key, value in row.items()
+        if key not in ("user_id", "date", "measurement_id") and value not in (None, "")
+    )
+    return f"{kind} on {row.get('date', 'unknown date')}: {fields}"
+
+
+@dataclass
+class _TurnWindow:
+    cursor: int  # highest turn row id seen for the user
+    doc_ids: Deque[str]  # indexed turns, oldest first
+
+
+class RetrievalIndex:
+    """Incrementally maintained local index of knowledge files, conversation turns and user records"""
+
+    def __init__(
+        self,
+        knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR,
+        conversations: Any = None,
+        backend: Optional[str] = None,
+        top_k: int = int(os.getenv("RETRIEVAL_TOP_K", "4")),
+        token_budget: int = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "250")),
+        min_score: float = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.15")),
+        rescan_seconds: float = float(os.getenv("RETRIEVAL_RESCAN_SECONDS", "5")),
+        turns_per_user: int = int(os.getenv("RETRIEVAL_TURNS_PER_USER", "200")),
+        turn_users: int = int(os.getenv("RETRIEVAL_TURN_USERS", "1000")),
+    ):
+        backend = (backend or os.getenv("RETRIEVAL_INDEX", "bm25")).lower()
+        if backend == "cosine" and not NUMPY_AVAILABLE:
+            print("[RETRIEVAL] numpy not installed, using BM25")
+            backend = "bm25"
+        self.backend = backend
+        self.knowledge_dir = knowledge_dir
+        self.conversations = conversations
+        self.top_k = top_k
+        self.token_budget = token_budget
+        self.min_score = min_score
+        self.rescan_seconds = rescan_seconds
+        self.turns_per_user = turns_per_user
+        self.turn_users = turn_users
+        self._index = CosineIndex() if backend == "cosine" else BM25Index()
+        self._docs: Dict[str, Document] = {}
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()  # serializes the incremental sync bookkeeping below
+        self._file_versions: Dict[str, Tuple[float, List[str]]] = {}  # path -> (mtime, doc ids)
+        self._last_scan = 0.0
+        self._user_versions: Dict[str, Tuple[str, List[str]]] = {}  # user -> (data version, doc ids)
+        self._turn_windows: "OrderedDict[str, _TurnWindow]" = OrderedDict()  # least recently asked first
+        self._backfilling: Set[str] = set()
+        self._backfill = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retrieval-backfill")
+        self._stats = {"queries": 0, "hits": 0, "tokens_injected": 0, "indexed": 0}
+
+    # ---------------------------------------------------------------- indexing
+
+    def add(self, doc_id: str, scope: str, source: str, text: str, session_id: Optional[str] = None):
+        terms = tokenize(text)
+        if not terms:
+            return
+        with self._lock:
+            if doc_id in self._docs:
+                self._index.remove(doc_id)
+            self._docs[doc_id] = Document(doc_id, scope, source, text, count_tokens(text), session_id)
+            self._index.add(doc_id, scope, terms)
+            self._stats["indexed"] += 1
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            if self._docs.pop(doc_id, None) is not None:
+                self._index.remove(doc_id)
+
+    def sync_knowledge(self, force: bool = False):
+        """Re-index knowledge files whose mtime changed (checked at most every rescan_seconds)"""
+        now = time.monotonic()
+        if not force and now - self._last_scan < self.rescan_seconds:
+            return
+        self._last_scan = now
+        seen = set()
+        for root, _, files in os.walk(self.knowledge_dir):
+            relative = os.path.relpath(root, self.knowledge_dir).split(os.sep)
+            if relative[0] == REFERENCE_DIR:
+                scope = GLOBAL
+            elif len(relative) >= 2 and relative[0] == USERS_DIR:
+                scope = relative[1]
+            else:
+                continue  # top-level and unknown folders: no owner, so not shared
+            for name in files:
+                if name.startswith("."):
+                    continue
+                path = os.path.join(root, name)
+                seen.add(path)
+                try:
+                    mtime = os.path.getmtime(path)
+                    if self._file_versions.get(path, (None,))[0] == mtime:
+                        continue
+                    with open(path, "r", encoding="utf-8", errors="replace") as f:
+                        chunks = chunk_text(f.read())
+                except OSError:
+                    continue
+                for doc_id in self._file_versions.get(path, (0, []))[1]:
+                    self.remove(doc_id)
+                ids = []
+                for i, chunk in enumerate(chunks):
+                    doc_id = f"file:{path}#{i}"
+                    self.add(doc_id, scope, "knowledge", chunk)
+                    ids.append(doc_id)
+                self._file_versions[path] = (mtime, ids)
+        for path in set(self._file_versions) - seen:
+            for doc_id in self._file_versions.pop(path)[1]:
+                self.remove(doc_id)
+
+    def sync_user(self, user_id: str, user_data: Dict[str, Any]):
+        """Index the user's profile and records, only when their data version changed"""
+        version = ContextBuilder.data_version(user_data)
+        previous = self._user_versions.get(user_id)
+        if previous and previous[0] == version:
+            return
+        for doc_id in previous[1] if previous else []:
+            self.remove(doc_id)
+        ids = []
+        profile = user_data.get("profile") or {}
+        if profile:
+            ids.append(f"record:{user_id}:profile")
+            self.add(ids[-1], user_id, "record", _record_text("profile", {"date": "file", **profile}))
+        for kind in ("activities", "measurements", "nutrition"):
+            rows = user_data.get(kind) or user_data.get(f"recent_{kind}") or []
+            for i, row in enumerate(rows):
+                ids.append(f"record:{user_id}:{kind}:{i}")
+                self.add(ids[-1], user_id, "record", _record_text(kind, row))
+        self._user_versions[user_id] = (version, ids)
+
+    def sync_conversations(self, user_id: str):
+        """Index the user's turns written since the last sync (by any API worker or the CLI)"""
+        if self.conversations is None:
+            return
+        with self._sync_lock:
+            window = self._turn_windows.get(user_id)
+            if window is None:
+                # First question from this user: backfill their recent turns without blocking the request
+                if user_id not in self._backfilling:
+                    self._backfilling.add(user_id)
+                    self._backfill.submit(self._backfill_turns, user_id)
+                return
+            self._turn_windows.move_to_end(user_id)
+            self._index_turns(user_id, window)
+
+    def _backfill_turns(self, user_id: str):
+        try:
+            with self._sync_lock:
+                window = self._turn_windows[user_id] = _TurnWindow(0, deque())
+                self._index_turns(user_id, window)
+                while len(self._turn_windows) > self.turn_users:
+                    _, evicted = self._turn_windows.popitem(last=False)
+                    for doc_id in evicted.doc_ids:
+                        self.remove(doc_id)
+        except Exception as e:
+            print(f"[RETRIEVAL] Conversation backfill for {user_id} failed: {e}")
+        finally:
+            with self._sync_lock:
+                self._backfilling.discard(user_id)
+
+    def _index_turns(self, user_id: str, window: _TurnWindow):
+        """Add turns after the window's cursor and drop the oldest beyond turns_per_user (holding _sync_lock)"""
+        for row_id, session_id, role, content in self.conversations.recent_turns(user_id, window.cursor, self.turns_per_user):
+            speaker = "User" if role == "user" else "Coach"
+            doc_id = f"turn:{row_id}"
+            self.add(doc_id, user_id, "conversation", f"{speaker}: {content}", session_id)
+            window.doc_ids.append(doc_id)
+            window.cursor = max(window.cursor, row_id)
+        while len(window.doc_ids) > self.turns_per_user:
+            self.remove(window.doc_ids.popleft())
+
+    # ------------------------------------------------------------------- reads
+
+    def search(self, query: str, user_id: Optional[str] = None, k: Optional[int] = None,
+               exclude_session: Optional[str] = None) -> List[Hit]:
+        scopes = [GLOBAL] + ([user_id] if user_id else [])
+        k = k or self.top_k
+        with self._lock:
+            ranked = self._index.search(tokenize(query), scopes, k * 3, self.min_score)
+            hits = [
+                Hit(self._docs[doc_id], score) for doc_id, score in ranked
+                if doc_id in self._docs and not (exclude_session and self._docs[doc_id].session_id == exclude_session)
+            ]
+        return hits[:k]
+
+    def knowledge_for(self, user_id: str, user_data: Dict[str, Any], query: str,
+                      session_id: Optional[str] = None) -> str:
+        """Prompt-ready top-k snippets relevant to the query, within the token budget"""
+        return self.notes_for(user_id, user_data, query, session_id)[0]
+
+    def notes_for(self, user_id: str, user_data: Dict[str, Any], query: str,
+                  session_id: Optional[str] = None) -> Tuple[str, Set[str]]:
+        """knowledge_for() plus the sources ("knowledge", "conversation", "record") of the injected snippets"""
+        if MEMORY_MODE == "off":
+            return NO_KNOWLEDGE, set()
+        with self._sync_lock:
+            self.sync_knowledge()
+            self.sync_user(user_id, user_data)
+        self.sync_conversations(user_id)
+        hits = self.search(query, user_id, exclude_session=session_id)
+        lines, tokens, sources = [], 0, set()
+        for hit in hits:
+            line = f"- ({hit.doc.source}) {hit.doc.text}"
+            line_tokens = count_tokens(line)
+            if tokens + line_tokens > self.token_budget:
+                continue
+            lines.append(line)
+            sources.add(hit.doc.source)
+            tokens += line_tokens
+        with self._lock:
+            self._stats["queries"] += 1
+            self._stats["hits"] += len(lines)
+            self._stats["tokens_injected"] += tokens
+        return ("\n".join(lines) if lines else NO_KNOWLEDGE), sources
+
+    def invalidate(self, user_id: str):
+        """Drop the user's indexed records; they are re-indexed on next use"""
+        with self._sync_lock:
+            previous = self._user_versions.pop(user_id, None)
+        for doc_id in previous[1] if previous else []:
+            self.remove(doc_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["documents"] = len(self._docs)
+        stats["conversation_users"] = len(self._turn_windows)
+        stats.update({"backend": self.backend, "memory_mode": MEMORY_MODE})
+        return stats
+
+
+@lru_cache(maxsize=1)
+def get_retrieval_index() -> RetrievalIndex:
+    """Shared index over the knowledge directory and the conversation store"""
+    from .conversation import get_conversation_store
+    return RetrievalIndex(conversations=get_conversation_store())
+
+
+# -------------------------------------------------------------------- benchmark
+
+_TOPICS = [
+    "knee pain when squatting, switched to box squats", "vegetarian, no eggs, loves lentils",
+    "training for a half marathon in spring", "lactose intolerant, uses oat milk",
+    "shoulder injury last year, avoid overhead press", "prefers morning workouts before work",
+    "wants to gain muscle on a budget", "night shifts, trouble sleeping",
+]
+
+
+def _benchmark(users: int, turns: int, queries: int):
+    import random
+    import statistics
+
+    rng = random.Random(7)
+    for backend in ("bm25", "cosine") if NUMPY_AVAILABLE else ("bm25",):
+        index = RetrievalIndex(knowledge_dir=DEFAULT_KNOWLEDGE_DIR, backend=backend, rescan_seconds=3600)
+        started = time.perf_counter()
+        index.sync_knowledge(force=True)
+        for u in range(users):
+            user_id = f"user_{u:05d}"
+            data = {
+                "profile": {"age": 20 + u % 40, "fitness_level": "intermediate", "goals": "endurance"},
+                "activities": [{"date": f"2025-09-{d:02d}", "steps": 8000 + d * 100, "active_minutes": 40} for d in range(1, 15)],
+                "nutrition": [{"date": f"2025-09-{d:02d}", "calories_consumed": 2000 + d, "protein_g": 90} for d in range(1, 15)],
+            }
+            index.sync_user(user_id, data)
+            for t in range(turns):
+                topic = _TOPICS[(u + t) % len(_TOPICS)]
+                index.add(f"turn:{u}:{t}", user_id, "conversation", f"User: remember that I have {topic}", "old")
+        build = time.perf_counter() - started
+        latencies = []
+        for _ in range(queries):
+            user_id = f"user_{rng.randrange(users):05d}"
+            t = time.perf_counter()
+            index.search("what should I eat after my morning run, I'm vegetarian", user_id)
+            latencies.append(time.perf_counter() - t)
+        latencies.sort()
+        print(
+            f"📊 {backend:<7} {index.stats()['documents']:,} docs indexed in {build:5.1f}s   "
+            f"query p50 {statistics.median(latencies) * 1000:5.2f} ms   p95 {latencies[int(len(latencies) * 0.95)] * 1000:5.2f} ms"
+        )
+        t = time.perf_counter()
+        index.add("turn:new", "user_00000", "conversation", "User: I started intermittent fasting")
+        print(f"   incremental add {(time.perf_counter() - t) * 1000:.2f} ms; hit: {index.search('fasting', 'user_00000', k=1)[0].doc.text}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the local retrieval index on synthetic users")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=20, help="Past conversation turns per user")
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+    _benchmark(args.users, args.turns, args.queries)
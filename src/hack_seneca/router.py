@@ -0,0 +1,258 @@
+"""Local intent router for chat messages.
+
+The hierarchical crew spends one or two LLM round-trips on the manager just to
+decide between the fitness coach and the nutritionist. This router makes that
+decision locally with keyword rules plus a small naive Bayes classifier trained
+on the labeled examples in ``config/routing.yaml``. Only low-confidence messages
+are left for the manager.
+
+Run ``python -m hack_seneca.router`` to print routing accuracy and the
+estimated latency saved on the labeled set.
+"""
+
+import argparse
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import yaml
+
+ROUTE_FITNESS = "fitness"
+ROUTE_NUTRITION = "nutrition"
+ROUTE_MANAGER = "manager"
+
+SPECIALIST_ROUTES = (ROUTE_FITNESS, ROUTE_NUTRITION)
+
+ROUTING_CONFIG = os.path.join(os.path.dirname(__file__), "config", "routing.yaml")
+
+# Confidence assigned when the keyword rules point at exactly one specialist and aren't contradicted
+RULE_CONFIDENCE = 0.95
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into alphanumeric tokens"""
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def _features(tokens: List[str]) -> List[str]:
+    """Unigrams plus bigrams"""
+    return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+
+@dataclass
+class RouteDecision:
+    route: str
+    confidence: float
+    source: str  # "rules", "classifier", "best_guess" or "fallback"
+    elapsed_ms: float = 0.0
+
+    @property
+    def bypasses_manager(self) -> bool:
+        return self.route in SPECIALIST_ROUTES
+
+
+class NaiveBayesClassifier:
+    """Multinomial naive Bayes over unigram/bigram counts with Laplace smoothing"""
+
+    def __init__(self, alpha: float = 1.0):
+        self.alpha = alpha
+        self.labels: List[str] = []
+        self._log_priors: Dict[str, float] = {}
+        self._log_likelihoods: Dict[str, Dict[str, float]] = {}
+        self._log_unseen: Dict[str, float] = {}
+
+    def fit(self, samples: List[Tuple[str, str]]) -> "NaiveBayesClassifier":
+        label_counts = Counter(label for _, label in samples)
+        feature_counts: Dict[str, Counter] = defaultdict(Counter)
+        vocabulary = set()
+        for text, label in samples:
+            features = _features(tokenize(text))
+            feature_counts[label].update(features)
+            vocabulary.update(features)
+
+        total = sum(label_counts.values())
+        self.labels = sorted(label_counts)
+        vocab_size = len(vocabulary) or 1
+        for label in self.labels:
+            counts = feature_counts[label]
+            denominator = sum(counts.values()) + self.alpha * vocab_size
+            self._log_priors[label] = math.log(label_counts[label] / total)
+            self._log_likelihoods[label] = {
+                feature: math.log((count + self.alpha) / denominator)
+                for feature, count in counts.items()
+            }
+            self._log_unseen[label] = math.log(self.alpha / denominator)
+        return self
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        features = _features(tokenize(text))
+        scores = {}
+        for label in self.labels:
+            likelihoods = self._log_likelihoods[label]
+            unseen = self._log_unseen[label]
+            scores[label] = self._log_priors[label] + sum(likelihoods.get(f, unseen) for f in features)
+        # Softmax in log space
+        top = max(scores.values())
+        exp_scores = {label: math.exp(score - top) for label, score in scores.items()}
+        norm = sum(exp_scores.values())
+        return {label: value / norm for label, value in exp_scores.items()}
+
+
+class RouterStats:
+    """Thread-safe counters for routing decisions and crew latency per path"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.decisions = Counter()
+        self.routes = Counter()
+        self._crew_seconds: Dict[str, List[float]] = defaultdict(list)
+
+    def record_decision(self, decision: RouteDecision):
+        with self._lock:
+            self.decisions[decision.source] += 1
+            self.routes[decision.route] += 1
+
+    def record_crew_time(self, route: str, seconds: float):
+        with self._lock:
+            samples = self._crew_seconds[route]
+            samples.append(seconds)
+            if len(samples) > 500:
+                del samples[: len(samples) - 500]
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            means = {
+                route: sum(samples) / len(samples)
+                for route, samples in self._crew_seconds.items()
+                if samples
+            }
+            direct = sum(self.routes[r] for r in SPECIALIST_ROUTES)
+            saved = None
+            specialist_means = [means[r] for r in SPECIALIST_ROUTES if r in means]
+            if ROUTE_MANAGER in means and specialist_means:
+                per_request = means[ROUTE_MANAGER] - sum(specialist_means) / len(specialist_means)
+                saved = round(max(per_request, 0.0) * direct, 3)
+            return {
+                "decisions_by_source": dict(self.decisions),
+                "decisions_by_route": dict(self.routes),
+                "mean_crew_seconds": {route: round(value, 3) for route, value in means.items()},
+                "estimated_seconds_saved": saved,
+            }
+
+
+class IntentRouter:
+    """Routes a chat message to the fitness coach, the nutritionist or the manager"""
+
+    def __init__(self, config_path: str = ROUTING_CONFIG, threshold: Optional[float] = None):
+        with open(config_path, "r") as f:
+            config = yaml.safe_load(f) or {}
+
+        self.threshold = threshold if threshold is not None else float(config.get("threshold", 0.8))
+        self.rule_min_hits = int(config.get("rule_min_hits", 2))
+        self.keywords = {
+            route: [" ".join(tokenize(phrase)) for phrase in phrases]
+            for route, phrases in (config.get("keywords") or {}).items()
+        }
+        self.examples: List[Tuple[str, str]] = [
+            (text, label)
+            for label, texts in (config.get("examples") or {}).items()
+            for text in texts
+        ]
+        self.classifier = NaiveBayesClassifier().fit(self.examples)
+        self.stats = RouterStats()
+
+    def keyword_hits(self, message: str) -> Dict[str, int]:
+        """Number of keyword phrases each route matches in the message"""
+        padded = f" {' '.join(tokenize(message))} "
+        hits = {}
+        for route, phrases in self.keywords.items():
+            count = sum(1 for phrase in phrases if f" {phrase} " in padded)
+            if count:
+                hits[route] = count
+        return hits
+
+    def route(self, message: str, classifier: Optional[NaiveBayesClassifier] = None,
+              specialist_only: bool = False) -> RouteDecision:
+        """Decide which crew should handle the message (specialist_only: best-guess specialist instead of the manager)"""
+        started = time.perf_counter()
+        classifier = classifier or self.classifier
+
+        hits = self.keyword_hits(message)
+        probabilities = classifier.predict_proba(message)
+        route, confidence = max(probabilities.items(), key=lambda item: item[1])
+        rule_route = next(iter(hits)) if len(hits) == 1 else None
+        # The classifier agrees when it ranks the keyword's specialist above the other one
+        specialist = max(SPECIALIST_ROUTES, key=lambda r: probabilities.get(r, 0.0))
+        if rule_route and (rule_route == specialist or hits[rule_route] >= self.rule_min_hits):
+            decision = RouteDecision(route=rule_route, confidence=RULE_CONFIDENCE, source="rules")
+        elif rule_route is None and route in SPECIALIST_ROUTES and confidence >= self.threshold:
+            # A lone keyword the classifier disagrees with ("protein shake after gym") never bypasses the manager
+            decision = RouteDecision(route=route, confidence=confidence, source="classifier")
+        elif specialist_only:
+            decision = RouteDecision(route=specialist, confidence=probabilities.get(specialist, 0.0), source="best_guess")
+        else:
+            decision = RouteDecision(route=ROUTE_MANAGER, confidence=confidence, source="fallback")
+
+        decision.elapsed_ms = (time.perf_counter() - started) * 1000
+        return decision
+
+    def evaluate(self, manager_overhead_seconds: float) -> Dict[str, object]:
+        """Leave-one-out evaluation over the labeled examples"""
+        correct = 0
+        direct = 0
+        wrong_specialist = 0
+        routing_ms = 0.0
+        for index, (text, label) in enumerate(self.examples):
+            held_out = self.examples[:index] + self.examples[index + 1:]
+            classifier = NaiveBayesClassifier().fit(held_out)
+            decision = self.route(text, classifier=classifier)
+            routing_ms += decision.elapsed_ms
+            if decision.route == label:
+                correct += 1
+            if decision.bypasses_manager:
+                direct += 1
+                if decision.route != label:
+                    wrong_specialist += 1
+
+        total = len(self.examples) or 1
+        return {
+            "examples": len(self.examples),
+            "accuracy": round(correct / total, 3),
+            "bypass_rate": round(direct / total, 3),
+            "misrouted_to_specialist": wrong_specialist,
+            "mean_routing_ms": round(routing_ms / total, 3),
+            "estimated_seconds_saved": round((direct - wrong_specialist) * manager_overhead_seconds, 1),
+            "estimated_seconds_saved_per_request": round(
+                (direct - wrong_specialist) * manager_overhead_seconds / total, 2
+            ),
+        }
+
+
+@lru_cache(maxsize=1)
+def get_router() -> IntentRouter:
+    """Shared router instance, trained once per process"""
+    return IntentRouter()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the local intent router on the labeled set")
+    parser.add_argument(
+        "--manager-overhead",
+        type=float,
+        default=float(os.getenv("MANAGER_OVERHEAD_SECONDS", "4.0")),
+        help="Seconds the manager's reasoning and delegation add to a request",
+    )
+    args = parser.parse_args()
+
+    report = get_router().evaluate(args.manager_overhead)
+    print("📊 Routing evaluation (leave-one-out)")
+    for key, value in report.items():
+        print(f"   {key}: {value}")
@@ -0,0 +1,296 @@
+"""Concurrent multi-user session store for the API server.
+
+Sessions are keyed by an opaque token handed out at login. Each session loads
+its user's data lazily on first access. The store is safe to use from many
+threads, expires idle sessions after a TTL and evicts the least recently used
+sessions when either the session count or the approximate memory used by the
+loaded user data goes over its cap.
+
+When given a shared-state backend, the token registry is shared between API
+worker processes: a token issued by one worker resolves on every other, and
+logouts and user-data invalidations are broadcast to all of them.
+
+Run ``python -m hack_seneca.sessions`` to benchmark thousands of concurrent
+sessions.
+"""
+
+import argparse
+import json
+import os
+import secrets
+import statistics
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+from .shared_state import SharedCache, SharedStateBackend
+
+SHARED_NAMESPACE = "sessions"
+USER_DATA_NAMESPACE = "user_data"
+
+
+@dataclass
+class Session:
+    token: str
+    user_id: str
+    created_at: float
+    last_access: float
+    user_data: Optional[Dict[str, Any]] = None
+    size_bytes: int = 0
+    shared_touched: float = 0.0
+    load_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+def _estimate_size(user_data: Dict[str, Any]) -> int:
+    """Rough in-memory footprint of the loaded data (JSON size is a stable proxy)"""
+    return len(json.dumps(user_data, default=str))
+
+
+class SessionStore:
+    """Token-keyed sessions with TTL, LRU eviction and a memory cap"""
+
+    def __init__(
+        self,
+        loader: Callable[[str], Dict[str, Any]],
+        ttl_seconds: float = 3600,
+        max_sessions: int = 10000,
+        max_bytes: int = 256 * 1024 * 1024,
+        shared: Optional[SharedStateBackend] = None,
+    ):
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._latest_by_user: Dict[str, str] = {}
+        self._bytes = 0
+        self._stats = {
+            "created": 0, "loads": 0, "expired": 0, "evicted": 0, "lookups": 0, "misses": 0, "shared_hits": 0,
+        }
+        self._registry: Optional[SharedCache] = None
+        if shared is not None:
+            self._registry = SharedCache(shared, SHARED_NAMESPACE, l1_ttl_seconds=5)
+            shared.subscribe(SHARED_NAMESPACE, self._on_shared_event)
+            shared.subscribe(USER_DATA_NAMESPACE, self._on_user_data_event)
+
+    # --------------------------------------------------------------- lifecycle
+
+    def create(self, user_id: str) -> Session:
+        """Start a new session for the user and return it"""
+        now = time.time()
+        session = Session(token=secrets.token_urlsafe(24), user_id=user_id, created_at=now, last_access=now)
+        with self._lock:
+            self._sessions[session.token] = session
+            self._latest_by_user[user_id] = session.token
+            self._stats["created"] += 1
+            self._evict_locked()
+        self._share(session, now)
+        return session
+
+    def get(self, token: str) -> Optional[Session]:
+        """Live session for the token, refreshed as most recently used"""
+        now = time.time()
+        with self._lock:
+            self._stats["lookups"] += 1
+            session = self._sessions.get(token)
+            if session is not None and now - session.last_access > self.ttl_seconds:
+                self._remove_locked(token)
+                self._stats["expired"] += 1
+                session = None
+            if session is not None:
+                session.last_access = now
+                self._sessions.move_to_end(token)
+        if session is None:
+            # Another worker may have issued (or kept using) the token
+            session = self._from_shared(token, now)
+            if session is None:
+                with self._lock:
+                    self._stats["misses"] += 1
+                return None
+        elif self._registry is not None and now - session.shared_touched > self.ttl_seconds / 4:
+            self._share(session, now)
+        return session
+
+    def resolve(self, token: Optional[str], user_id: Optional[str]) -> Optional[Session]:
+        """Session for a request: by token when given, else a new session for the user
+
+        Without a token the user_id is all the caller proved, so it never
+        attaches to a session someone else may be holding.
+        """
+        if not token:
+            return self.create(user_id) if user_id else None
+        session = self.get(token)
+        if session is None or (user_id and session.user_id != user_id):
+            return None
+        return session
+
+    def end(self, token: str):
+        with self._lock:
+            self._remove_locked(token)
+        if self._registry is not None:
+            self._registry.delete(token)
+
+    # ------------------------------------------------------------ shared state
+
+    def _share(self, session: Session, now: float):
+        """Publish the token with a fresh TTL"""
+        if self._registry is None:
+            return
+        session.shared_touched = now
+        record = {"user_id": session.user_id, "created_at": session.created_at}
+        self._registry.set(session.token, record, self.ttl_seconds)
+
+    def _from_shared(self, token: str, now: float) -> Optional[Session]:
+        if self._registry is None:
+            return None
+        record = self._registry.get(token)
+        if not record:
+            return None
+        session = Session(
+            token=token, user_id=record["user_id"], created_at=record["created_at"],
+            last_access=now, shared_touched=now,
+        )
+        with self._lock:
+            session = self._sessions.setdefault(token, session)
+            self._latest_by_user.setdefault(session.user_id, token)
+            self._stats["shared_hits"] += 1
+            self._evict_locked(keep=token)
+        return session
+
+    def _on_shared_event(self, key: str, op: str):
+        if op == "delete":
+            with self._lock:
+                self._remove_locked(key)
+
+    def _on_user_data_event(self, user_id: str, op: str):
+        self._drop_user_data(user_id)
+
+    def invalidate_user_data(self, user_id: str):
+        """Make every session of the user reload its data, in every worker"""
+        self._drop_user_data(user_id)
+        if self._registry is not None:
+            self._registry.backend.publish(USER_DATA_NAMESPACE, user_id)
+
+    def _drop_user_data(self, user_id: str):
+        with self._lock:
+            for session in self._sessions.values():
+                if session.user_id == user_id and session.user_data is not None:
+                    self._bytes -= session.size_bytes
+                    session.user_data = None
+                    session.size_bytes = 0
+
+    # -------------------------------------------------------------- user data
+
+    def user_data(self, session: Session) -> Dict[str, Any]:
+        """The session's user data, loaded on first access"""
+        if session.user_data is not None:
+            return session.user_data
+        with session.load_lock:
+            if session.user_data is None:
+                data = self.loader(session.user_id)
+                size = _estimate_size(data)
+                with self._lock:
+                    session.user_data = data
+                    session.size_bytes = size
+                    if session.token in self._sessions:
+                        self._bytes += size
+                    self._stats["loads"] += 1
+                    self._evict_locked(keep=session.token)
+        return session.user_data
+
+    def refresh(self, session: Session) -> Dict[str, Any]:
+        """Drop the loaded data so the next access reloads it"""
+        with session.load_lock, self._lock:
+            if session.token in self._sessions:
+                self._bytes -= session.size_bytes
+            session.user_data = None
+            session.size_bytes = 0
+        return self.user_data(session)
+
+    # ---------------------------------------------------------------- eviction
+
+    def _remove_locked(self, token: str):
+        session = self._sessions.pop(token, None)
+        if session is None:
+            return
+        self._bytes -= session.size_bytes
+        if self._latest_by_user.get(session.user_id) == token:
+            del self._latest_by_user[session.user_id]
+
+    def _evict_locked(self, keep: Optional[str] = None):
+        while self._sessions and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                if len(self._sessions) == 1:
+                    break
+                self._sessions.move_to_end(oldest)
+                continue
+            self._remove_locked(oldest)
+            self._stats["evicted"] += 1
+
+    def purge_expired(self) -> int:
+        """Remove every session idle for longer than the TTL"""
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [token for token, s in self._sessions.items() if s.last_access < cutoff]
+            for token in expired:
+                self._remove_locked(token)
+            self._stats["expired"] += len(expired)
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["active_sessions"] = len(self._sessions)
+            stats["active_users"] = len(self._latest_by_user)
+            stats["bytes"] = self._bytes
+        if self._registry is not None:
+            stats["shared_backend"] = type(self._registry.backend).__name__
+            stats["registry"] = dict(self._registry.stats)
+        return stats
+
+
+def _benchmark(sessions: int, threads: int, operations: int, max_bytes: int):
+    """Many users logging in and chatting concurrently against one store"""
+    payload = {"activities": [{"date": "2025-09-01", "steps": 1000}] * 30}
+    store = SessionStore(loader=lambda user_id: {"user_id": user_id, **payload}, max_bytes=max_bytes)
+    tokens = [store.create(f"user_{i:05d}").token for i in range(sessions)]
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    def worker(worker_id: int):
+        local = []
+        for op in range(operations // threads):
+            token = tokens[(worker_id * 7919 + op * 104729) % len(tokens)]
+            started = time.perf_counter()
+            session = store.resolve(token, None)
+            if session is not None:
+                store.user_data(session)
+            local.append(time.perf_counter() - started)
+        with latencies_lock:
+            latencies.extend(local)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"📊 {sessions} sessions, {threads} threads, {len(latencies)} lookups in {elapsed:.2f}s")
+    print(f"   throughput: {len(latencies) / elapsed:,.0f} ops/s")
+    print(f"   p50: {statistics.median(latencies) * 1e6:.1f} µs, p99: {latencies[int(len(latencies) * 0.99)] * 1e6:.1f} µs")
+    print(f"   store: {store.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the session store under concurrent access")
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--operations", type=int, default=200000)
+    parser.add_argument("--max-mb", type=float, default=float(os.getenv("SESSION_MAX_MB", "256")))
+    args = parser.parse_args()
+    _benchmark(args.sessions, args.threads, args.operations, int(args.max_mb * 1024 * 1024))
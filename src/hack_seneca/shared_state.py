@@ -0,0 +1,345 @@
+"""Shared state for running the API server with several uvicorn workers.
+
+Each worker process keeps its own in-memory L1 (sessions, caches, loaded user
+data), so a request landing on a different worker would know nothing about
+the user. This module adds a pluggable shared backend behind those L1s:
+
+* ``SQLiteSharedState`` — a WAL-mode SQLite file all workers on the host open;
+  no external services needed.
+* ``LocalSharedState`` — in-process only, for single-worker runs and tests.
+
+Both expose a key/value store with TTLs plus an append-only event log.
+Workers publish ``set``/``delete``/``invalidate`` events and a background
+listener in every other worker applies them to its L1, so invalidations flow
+across processes.
+
+Run ``python -m hack_seneca.shared_state --workers 1 2 4 8`` to benchmark
+throughput against the number of worker processes.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_PATH = os.getenv("SHARED_STATE_PATH", os.path.join(_PROJECT_ROOT, "users_data", "shared_state.db"))
+
+# (event id, namespace, key, op)
+Event = Tuple[int, str, str, str]
+Listener = Callable[[str, str], None]
+
+
+class SharedStateBackend:
+    """Interface shared by the backends"""
+
+    def __init__(self):
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._listeners: Dict[str, List[Listener]] = defaultdict(list)
+        self._listener_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, namespace: str, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: str):
+        raise NotImplementedError
+
+    def publish(self, namespace: str, key: str, op: str = "invalidate"):
+        raise NotImplementedError
+
+    def events_since(self, last_id: int, upto: int) -> List[Event]:
+        """Events published by other workers with last_id < id <= upto"""
+        raise NotImplementedError
+
+    def subscribe(self, namespace: str, listener: Listener):
+        """Call listener(key, op) for events from other workers in this namespace"""
+        self._listeners[namespace].append(listener)
+        self._start_listener()
+
+    def _start_listener(self):
+        pass
+
+    def _dispatch(self, events: List[Event]):
+        for _, namespace, key, op in events:
+            for listener in self._listeners.get(namespace, ()):
+                try:
+                    listener(key, op)
+                except Exception as e:
+                    print(f"[SHARED] Listener for {namespace} failed: {e}")
+
+    def close(self):
+        self._stop.set()
+
+
+class LocalSharedState(SharedStateBackend):
+    """Single-process backend; events never leave the process so listeners never fire"""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._data: Dict[Tuple[str, str], Tuple[Any, Optional[float]]] = {}
+
+    def get(self, namespace, key):
+        with self._lock:
+            item = self._data.get((namespace, key))
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.time():
+                del self._data[(namespace, key)]
+                return None
+            return value
+
+    def set(self, namespace, key, value, ttl_seconds=None):
+        expires_at = time.time() + ttl_seconds if ttl_seconds else None
+        with self._lock:
+            self._data[(namespace, key)] = (value, expires_at)
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+    def publish(self, namespace, key, op="invalidate"):
+        pass
+
+    def events_since(self, last_id, upto):
+        return []
+
+
+class SQLiteSharedState(SharedStateBackend):
+    """Host-local shared backend on a WAL-mode SQLite file"""
+
+    def __init__(self, path: str = DEFAULT_PATH, poll_interval: float = 0.25, event_retention: float = 300):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self.event_retention = event_retention
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS kv (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                PRIMARY KEY (namespace, key)
+            );
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                op TEXT NOT NULL,
+                origin TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            """
+        )
+        conn.commit()
+        row = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()
+        self._last_event_id = row[0]
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite connections aren't shareable across threads"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace, key):
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            self.delete(namespace, key)
+            return None
+        return json.loads(value)
+
+    def set(self, namespace, key, value, ttl_seconds=None):
+        expires_at = time.time() + ttl_seconds if ttl_seconds else None
+        self._conn().execute(
+            "INSERT INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(namespace, key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (namespace, key, json.dumps(value, default=str), expires_at),
+        )
+
+    def delete(self, namespace, key):
+        self._conn().execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def publish(self, namespace, key, op="invalidate"):
+        self._conn().execute(
+            "INSERT INTO events (namespace, key, op, origin, created_at) VALUES (?, ?, ?, ?, ?)",
+            (namespace, key, op, self.origin, time.time()),
+        )
+
+    def events_since(self, last_id, upto):
+        return self._conn().execute(
+            "SELECT id, namespace, key, op FROM events WHERE id > ? AND id <= ? AND origin != ? ORDER BY id",
+            (last_id, upto, self.origin),
+        ).fetchall()
+
+    def _start_listener(self):
+        if self._listener_thread is not None:
+            return
+        self._listener_thread = threading.Thread(target=self._listen, name="shared-state-listener", daemon=True)
+        self._listener_thread.start()
+
+    def _listen(self):
+        last_prune = time.time()
+        while not self._stop.wait(self.poll_interval):
+            try:
+                conn = self._conn()
+                # Our own events are filtered out, so track the global max separately
+                newest = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+                if newest > self._last_event_id:
+                    self._dispatch(self.events_since(self._last_event_id, newest))
+                    self._last_event_id = newest
+                if time.time() - last_prune > self.event_retention:
+                    cutoff = time.time() - self.event_retention
+                    conn.execute("DELETE FROM events WHERE created_at < ?", (cutoff,))
+                    conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+                    last_prune = time.time()
+            except sqlite3.Error as e:
+                print(f"[SHARED] Event poll failed: {e}")
+
+
+class SharedCache:
+    """In-process L1 (TTL + LRU) in front of a shared backend namespace"""
+
+    def __init__(
+        self,
+        backend: SharedStateBackend,
+        namespace: str,
+        l1_ttl_seconds: float = 30,
+        l1_max_entries: int = 10000,
+    ):
+        self.backend = backend
+        self.namespace = namespace
+        self.l1_ttl_seconds = l1_ttl_seconds
+        self.l1_max_entries = l1_max_entries
+        self._lock = threading.Lock()
+        self._l1: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self.stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "invalidations_received": 0}
+        backend.subscribe(namespace, self._on_event)
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            item = self._l1.get(key)
+            if item is not None and item[1] > now:
+                self._l1.move_to_end(key)
+                self.stats["l1_hits"] += 1
+                return item[0]
+        value = self.backend.get(self.namespace, key)
+        with self._lock:
+            if value is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["l2_hits"] += 1
+            self._put_l1(key, value)
+        return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        self.backend.set(self.namespace, key, value, ttl_seconds)
+        self.backend.publish(self.namespace, key, "set")
+        with self._lock:
+            self._put_l1(key, value)
+
+    def delete(self, key: str):
+        self.backend.delete(self.namespace, key)
+        self.backend.publish(self.namespace, key, "delete")
+        self.drop_local(key)
+
+    def drop_local(self, key: str):
+        with self._lock:
+            self._l1.pop(key, None)
+
+    def _put_l1(self, key: str, value: Any):
+        self._l1[key] = (value, time.time() + self.l1_ttl_seconds)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.l1_max_entries:
+            self._l1.popitem(last=False)
+
+    def _on_event(self, key: str, op: str):
+        self.stats["invalidations_received"] += 1
+        self.drop_local(key)
+
+
+@lru_cache(maxsize=1)
+def get_shared_state() -> SharedStateBackend:
+    """Backend selected by SHARED_STATE_BACKEND (sqlite by default, or local)"""
+    if os.getenv("SHARED_STATE_BACKEND", "sqlite").lower() == "local":
+        return LocalSharedState()
+    return SQLiteSharedState()
+
+
+def _bench_worker(path: str, duration: float, keys: int, write_ratio: float, results):
+    backend = SQLiteSharedState(path)
+    cache = SharedCache(backend, "bench", l1_ttl_seconds=5)
+    rng = random.Random(os.getpid())
+    operations = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        key = f"k{rng.randrange(keys)}"
+        if rng.random() < write_ratio:
+            cache.set(key, {"value": operations})
+        else:
+            cache.get(key)
+        operations += 1
+    backend.close()
+    results.put((operations, dict(cache.stats)))
+
+
+def _benchmark(workers_list: List[int], duration: float, keys: int, write_ratio: float):
+    import tempfile
+
+    for workers in workers_list:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            SQLiteSharedState(path).close()
+            results = multiprocessing.Queue()
+            processes = [
+                multiprocessing.Process(target=_bench_worker, args=(path, duration, keys, write_ratio, results))
+                for _ in range(workers)
+            ]
+            for process in processes:
+                process.start()
+            outcomes = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+        total = sum(ops for ops, _ in outcomes)
+        l1_hits = sum(stats["l1_hits"] for _, stats in outcomes)
+        received = sum(stats["invalidations_received"] for _, stats in outcomes)
+        print(
+            f"📊 {workers} worker(s): {total / duration:,.0f} ops/s "
+            f"(L1 hit share {l1_hits / max(total, 1):.0%}, {received} cross-worker invalidations applied)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark shared state throughput across worker processes")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--write-ratio", type=float, default=0.05)
+    args = parser.parse_args()
+    _benchmark(args.workers, args.duration, args.keys, args.write_ratio)
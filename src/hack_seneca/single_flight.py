@@ -0,0 +1,114 @@
+"""Single-flight coalescing for expensive API requests.
+
+Double taps, client retries and the frontend re-submitting on re-render send
+identical ``/api/chat``, ``/api/analyze-food`` and ``/api/predict-fatigue``
+requests at the same time. Each group keys requests by a normalized hash; the
+first arrival runs the work in a worker thread and later identical arrivals
+await its result instead of starting their own crew run, Groq call or model
+inference.
+
+Enabled endpoints come from ``SINGLE_FLIGHT_ENDPOINTS`` (comma-separated,
+default ``chat,analyze-food,predict-fatigue``).
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from .instrumentation import span
+
+DEFAULT_ENDPOINTS = "chat,analyze-food,predict-fatigue"
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """Case- and whitespace-insensitive form of a message"""
+    return " ".join((text or "").lower().split())
+
+
+def request_key(*parts: Any) -> str:
+    """Stable hash of the parts that decide a request's answer"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, bytes):
+            digest.update(part)
+        else:
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """Runs at most one computation per key at a time; duplicates share its result"""
+
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self._inflight: Dict[str, "asyncio.Future[Any]"] = {}
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "executed": 0, "coalesced": 0, "errors": 0, "max_waiters": 0}
+        self._waiters: Dict[str, int] = {}
+
+    async def do(self, key: str, fn: Callable[..., Any], *args: Any) -> Any:
+        """Result of fn(*args), computed once for all concurrent callers with this key"""
+        with self._lock:
+            self._stats["requests"] += 1
+        if not self.enabled:
+            with self._lock:
+                self._stats["executed"] += 1
+            return await asyncio.to_thread(fn, *args)
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = loop.create_future()
+                self._inflight[key] = future
+                self._waiters[key] = 0
+                self._stats["executed"] += 1
+            else:
+                self._waiters[key] += 1
+                self._stats["coalesced"] += 1
+                self._stats["max_waiters"] = max(self._stats["max_waiters"], self._waiters[key])
+
+        if leader:
+            # The work runs as its own task, so a disconnecting leader doesn't cancel it for the others
+            task = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+            task.add_done_callback(lambda done: self._finish(key, future, done))
+            return await asyncio.shield(future)
+
+        print(f"[SINGLE-FLIGHT] {self.name}: joined in-flight request {key[:12]}")
+        with span("single_flight_wait", endpoint=self.name):
+            return await asyncio.shield(future)
+
+    def _finish(self, key: str, future: "asyncio.Future[Any]", task: "asyncio.Future[Any]"):
+        with self._lock:
+            self._inflight.pop(key, None)
+            self._waiters.pop(key, None)
+            if not task.cancelled() and task.exception() is not None:
+                self._stats["errors"] += 1
+        if future.done():
+            return
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._inflight)
+        stats["enabled"] = self.enabled
+        return stats
+
+
+_enabled = {name.strip() for name in os.getenv("SINGLE_FLIGHT_ENDPOINTS", DEFAULT_ENDPOINTS).split(",") if name.strip()}
+
+flights: Dict[str, SingleFlight] = {
+    name: SingleFlight(name, enabled=name in _enabled) for name in ("chat", "analyze-food", "predict-fatigue")
+}
@@ -0,0 +1,375 @@
+"""Typed output of the fitness and nutrition specialists.
+
+The specialists used to answer in free-form markdown, and the API guessed
+duration, difficulty, calories and protein from the prose with regexes. The
+routed specialist tasks now return a ``WorkoutPlan`` or ``NutritionPlan``
+(CrewAI ``output_pydantic``); the chat text is rendered from it locally and
+``ChatResponse.data`` is filled straight from its fields.
+
+Model output that isn't valid JSON (code fences, trailing commas, smart
+quotes, Python literals, a truncated tail) is repaired locally by
+``LocalRepairConverter`` instead of CrewAI's default converter, which would
+spend another LLM call re-asking for JSON. If repair fails the prose answer
+is used as before.
+"""
+
+import json
+import re
+from typing import Any, ClassVar, Dict, List, Optional, Tuple, Union
+
+from crewai.utilities.converter import Converter, ConverterError
+from pydantic import BaseModel, ValidationError, field_validator, model_validator
+
+_FIRST_INT_RE = re.compile(r"\d+")
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_PYTHON_LITERAL_RE = re.compile(r"\b(True|False|None)\b")
+_FENCE_RE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+
+def _first_int(value: Any) -> Optional[int]:
+    """450, "~450 kcal" and "45-60 minutes" all become their first integer"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = _FIRST_INT_RE.search(str(value))
+    return int(match.group(0)) if match else None
+
+
+def _as_list(value: Any) -> List[Any]:
+    """A single string or a newline/bullet list becomes a list of items"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [line.strip(" -•*\t") for line in value.splitlines() if line.strip(" -•*\t")]
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+def _as_text(value: Any) -> Any:
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(item) for item in value)
+    return str(value) if isinstance(value, (int, float)) else value
+
+
+class _Lenient(BaseModel):
+    """Coerces the usual LLM near-misses instead of failing validation"""
+
+    int_fields: ClassVar[Tuple[str, ...]] = ()
+    list_fields: ClassVar[Tuple[str, ...]] = ()
+    # Field a bare string is taken as, e.g. "Push-ups" for an exercise
+    text_field: ClassVar[Optional[str]] = None
+
+    @model_validator(mode="before")
+    @classmethod
+    def _from_text(cls, value: Any):
+        if isinstance(value, str) and cls.text_field:
+            return {cls.text_field: value}
+        return value
+
+    @field_validator("*", mode="before")
+    @classmethod
+    def _coerce(cls, value: Any, info):
+        if info.field_name in cls.int_fields:
+            return _first_int(value)
+        if info.field_name in cls.list_fields:
+            return _as_list(value)
+        annotation = cls.model_fields[info.field_name].annotation
+        if annotation in (str, Optional[str]):
+            return _as_text(value)
+        return value
+
+
+class Exercise(_Lenient):
+    name: str
+    sets: Optional[int] = None
+    reps: Optional[str] = None
+    rest_seconds: Optional[int] = None
+    notes: str = ""
+    day: Optional[str] = None  # "Day 1: Push" in multi-day programs
+
+    int_fields = ("sets", "rest_seconds")
+    text_field = "name"
+
+
+class WorkoutPlan(_Lenient):
+    goal: str = ""
+    duration_minutes: Optional[int] = None
+    intensity: Optional[str] = None
+    focus: Optional[str] = None
+    equipment: List[str] = []
+    warm_up: List[str] = []
+    exercises: List[Exercise] = []
+    cool_down: List[str] = []
+    progression: List[str] = []
+    safety_notes: List[str] = []
+
+    int_fields = ("duration_minutes",)
+    list_fields = ("equipment", "warm_up", "exercises", "cool_down", "progression", "safety_notes")
+
+
+class Meal(_Lenient):
+    name: str
+    meal_type: str = "Meal"
+    calories: Optional[int] = None
+    protein_g: Optional[int] = None
+    prep_minutes: Optional[int] = None
+    ingredients: List[str] = []
+    key_nutrients: List[str] = []
+
+    int_fields = ("calories", "protein_g", "prep_minutes")
+    list_fields = ("ingredients", "key_nutrients")
+    text_field = "name"
+
+
+class NutritionPlan(_Lenient):
+    goal: str = ""
+    daily_calories: Optional[int] = None
+    protein_g: Optional[int] = None
+    macro_split: Optional[str] = None
+    dietary_considerations: List[str] = []
+    meals: List[Meal] = []
+    snacks: List[str] = []
+    tips: List[str] = []
+    tracking: List[str] = []
+    images: List[str] = []
+
+    int_fields = ("daily_calories", "protein_g")
+    list_fields = ("dietary_considerations", "meals", "snacks", "tips", "tracking", "images")
+
+
+SpecialistPlan = Union[WorkoutPlan, NutritionPlan]
+
+
+# ----------------------------------------------------------------- repair
+
+def _close_truncated(text: str) -> str:
+    """Close an unterminated string and any brackets left open by a cut-off answer"""
+    stack: List[str] = []
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    text = text.rstrip().rstrip(",")
+    if text.endswith(":"):
+        text += " null"
+    return text + "".join(reversed(stack))
+
+
+def repair_json(text: str) -> Optional[Any]:
+    """Parse model output as JSON, fixing the common ways it comes back malformed"""
+    if not text:
+        return None
+    candidate = _FENCE_RE.sub("", text.strip())
+    start = candidate.find("{")
+    if start < 0:
+        return None
+    tail = candidate[start:]
+    end = tail.rfind("}")
+    complete = tail[:end + 1] if end >= 0 else tail
+
+    def fix(raw: str) -> str:
+        raw = _TRAILING_COMMA_RE.sub(r"\1", raw.translate(_SMART_QUOTES))
+        raw = _PYTHON_LITERAL_RE.sub(lambda m: {"True": "true", "False": "false", "None": "null"}[m.group(1)], raw)
+        return raw if '"' in raw else raw.replace("'", '"')
+
+    def close(raw: str) -> str:
+        return _TRAILING_COMMA_RE.sub(r"\1", _close_truncated(raw))
+
+    attempts = [complete, fix(complete)]
+    if tail != complete:
+        # Either prose after the JSON (handled above) or an answer cut off mid-value
+        attempts.append(close(fix(tail)))
+    attempts.append(close(fix(complete)))
+    for attempt in attempts:
+        try:
+            return json.loads(attempt, strict=False)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_plan(text: str, model: type) -> Optional[BaseModel]:
+    """The model parsed from (possibly malformed) JSON text, or None"""
+    data = repair_json(text)
+    if isinstance(data, dict) and len(data) == 1:
+        # {"workout_plan": {...}} wrappers
+        inner = next(iter(data.values()))
+        if isinstance(inner, dict):
+            data = inner
+    if not isinstance(data, dict):
+        return None
+    try:
+        return model.model_validate(data)
+    except ValidationError as e:
+        print(f"[STRUCTURED] {model.__name__} did not validate: {e.error_count()} errors")
+        return None
+
+
+class LocalRepairConverter(Converter):
+    """CrewAI converter that repairs JSON locally instead of asking the LLM again"""
+
+    def to_pydantic(self, current_attempt: int = 1) -> Union[BaseModel, ConverterError]:
+        plan = parse_plan(self.text, self.model)
+        if plan is None:
+            return ConverterError(f"Could not repair {self.model.__name__} output locally")
+        print(f"[STRUCTURED] Repaired {self.model.__name__} output locally")
+        return plan
+
+    def to_json(self, current_attempt: int = 1) -> Union[str, ConverterError]:
+        plan = self.to_pydantic(current_attempt)
+        return plan if isinstance(plan, ConverterError) else plan.model_dump_json()
+
+
+# ---------------------------------------------------------------- rendering
+
+def _bullets(lines: List[str], items: List[str]):
+    lines.extend(f"- {item}" for item in items)
+
+
+def render_workout(plan: WorkoutPlan) -> str:
+    lines = ["# 💪 Workout Plan", "", "## 🎯 Workout Overview"]
+    if plan.goal:
+        lines.append(f"- **Goal**: {plan.goal}")
+    if plan.duration_minutes:
+        lines.append(f"- **Duration**: {plan.duration_minutes} minutes")
+    if plan.intensity:
+        lines.append(f"- **Intensity**: {plan.intensity}")
+    if plan.focus:
+        lines.append(f"- **Focus**: {plan.focus}")
+    if plan.equipment:
+        lines.append(f"- **Equipment**: {', '.join(plan.equipment)}")
+    if plan.warm_up or plan.exercises or plan.cool_down:
+        lines += ["", "## 🏃‍♂️ Exercise Routine"]
+    if plan.warm_up:
+        lines.append("### Warm-up")
+        _bullets(lines, plan.warm_up)
+    if plan.exercises:
+        day, number = None, 0
+        if not plan.exercises[0].day:
+            lines += ["", "### Main Workout"]
+        for exercise in plan.exercises:
+            if exercise.day and exercise.day != day:
+                day, number = exercise.day, 0
+                lines += ["", f"### {day}"]
+            number += 1
+            lines.append(f"#### Exercise {number}: {exercise.name}")
+            if exercise.sets:
+                lines.append(f"- **Sets**: {exercise.sets}")
+            if exercise.reps:
+                lines.append(f"- **Reps**: {exercise.reps}")
+            if exercise.rest_seconds:
+                lines.append(f"- **Rest**: {exercise.rest_seconds} seconds")
+            if exercise.notes:
+                lines.append(f"- **Notes**: {exercise.notes}")
+    if plan.cool_down:
+        lines += ["", "### Cool-down"]
+        _bullets(lines, plan.cool_down)
+    if plan.progression:
+        lines += ["", "## 📈 Progression Plan"]
+        _bullets(lines, plan.progression)
+    if plan.safety_notes:
+        lines += ["", "## ⚠️ Safety Notes"]
+        _bullets(lines, plan.safety_notes)
+    return "\n".join(lines)
+
+
+def render_nutrition(plan: NutritionPlan) -> str:
+    lines = ["# 🍎 Nutrition Guidance", "", "## 🎯 Nutrition Overview"]
+    if plan.goal:
+        lines.append(f"- **Goal**: {plan.goal}")
+    if plan.daily_calories:
+        lines.append(f"- **Calorie Target**: {plan.daily_calories} kcal/day")
+    if plan.protein_g:
+        lines.append(f"- **Protein Target**: {plan.protein_g} g/day")
+    if plan.macro_split:
+        lines.append(f"- **Macronutrient Split**: {plan.macro_split}")
+    if plan.dietary_considerations:
+        lines.append(f"- **Dietary Considerations**: {', '.join(plan.dietary_considerations)}")
+    if plan.meals:
+        lines += ["", "## 🍽️ Meal Plan"]
+        for meal in plan.meals:
+            lines += [f"### {meal.meal_type}", f"- **Meal**: {meal.name}"]
+            if meal.calories:
+                lines.append(f"- **Calories**: ~{meal.calories} kcal")
+            if meal.protein_g:
+                lines.append(f"- **Protein**: {meal.protein_g} g")
+            if meal.prep_minutes:
+                lines.append(f"- **Prep Time**: {meal.prep_minutes} minutes")
+            if meal.ingredients:
+                lines.append(f"- **Ingredients**: {', '.join(meal.ingredients)}")
+            if meal.key_nutrients:
+                lines.append(f"- **Key Nutrients**: {', '.join(meal.key_nutrients)}")
+    if plan.snacks:
+        lines += ["", "### Snacks (Optional)"]
+        _bullets(lines, plan.snacks)
+    if plan.tips:
+        lines += ["", "## 💡 Nutrition Tips"]
+        _bullets(lines, plan.tips)
+    if plan.tracking:
+        lines += ["", "## 📊 Progress Tracking"]
+        _bullets(lines, plan.tracking)
+    if plan.images:
+        lines += ["", "## 🖼️ Meal Visualization"]
+        _bullets(lines, plan.images)
+    return "\n".join(lines)
+
+
+def render_markdown(plan: SpecialistPlan) -> str:
+    """Chat markdown for a specialist plan"""
+    return render_workout(plan) if isinstance(plan, WorkoutPlan) else render_nutrition(plan)
+
+
+def plan_message_type(plan: SpecialistPlan) -> str:
+    return "workout" if isinstance(plan, WorkoutPlan) else "nutrition"
+
+
+def plan_data(plan: SpecialistPlan) -> Dict[str, Any]:
+    """ChatResponse.data for a plan: the summary fields the UI shows plus the full plan"""
+    data: Dict[str, Any] = {}
+    if isinstance(plan, WorkoutPlan):
+        if plan.duration_minutes:
+            data["duration"] = f"{plan.duration_minutes} min"
+        if plan.intensity:
+            data["difficulty"] = plan.intensity.capitalize()
+        if plan.focus:
+            data["focus"] = plan.focus.lower()
+        if plan.exercises:
+            data["exercise_count"] = len(plan.exercises)
+    else:
+        calories = plan.daily_calories or sum(meal.calories or 0 for meal in plan.meals)
+        protein = plan.protein_g or sum(meal.protein_g or 0 for meal in plan.meals)
+        if calories:
+            data["calories"] = calories
+        if protein:
+            data["protein"] = f"{protein}g"
+        if len(plan.meals) == 1:
+            data["meal_type"] = plan.meals[0].meal_type.capitalize()
+        ingredient_count = sum(len(meal.ingredients) for meal in plan.meals)
+        if ingredient_count:
+            data["ingredient_count"] = ingredient_count
+    data["plan"] = plan.model_dump(exclude_none=True)
+    return data
+
+
+def plan_from_output(output: Any) -> Optional[SpecialistPlan]:
+    """The specialist plan carried by a CrewOutput, if its last task produced one"""
+    plan = getattr(output, "pydantic", None)
+    return plan if isinstance(plan, (WorkoutPlan, NutritionPlan)) else None
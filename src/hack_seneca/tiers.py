@@ -0,0 +1,193 @@
+"""Latency tiers for chat requests.
+
+Every chat used to run the manager with ``reasoning=True``, three iterations
+per agent, verbose logging and hierarchical delegation, whether the user
+asked a one-line question or wanted a six-day program. ``ChatRequest.tier``
+now picks one of three crew configurations:
+
+- ``fast``: no reasoning, one iteration, always straight to the most likely
+  specialist, no tools, optionally a smaller model (``CREW_MODEL_FAST``)
+- ``balanced`` (default, ``CHAT_DEFAULT_TIER``): no reasoning, two iterations,
+  specialists for confidently routed messages and the manager otherwise
+- ``thorough``: the previous behaviour - reasoning manager, three iterations,
+  always hierarchical, optionally a larger model (``CREW_MODEL_THOROUGH``)
+
+The crew for each (tier, route) is built once per process
+(``crew.tier_crew``) and copied per request.
+
+Run ``python -m hack_seneca.tiers`` to run real crew kickoffs per tier against
+a scripted local LLM and print p50/p95.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
+
+from .router import ROUTE_MANAGER, RouteDecision
+
+TIER_FAST = "fast"
+TIER_BALANCED = "balanced"
+TIER_THOROUGH = "thorough"
+
+PROCESS_ROUTED = "routed"  # always a specialist, best guess when unsure
+PROCESS_ADAPTIVE = "adaptive"  # specialist when confidently routed, else the manager
+PROCESS_HIERARCHICAL = "hierarchical"  # always through the manager
+
+
+@dataclass(frozen=True)
+class CrewTier:
+    name: str
+    reasoning: bool
+    max_iter: int
+    process: str
+    tools: bool
+    model: Optional[str] = None  # LiteLLM model for the tier; None = the default deployment
+    verbose: bool = False
+
+    def route_for(self, decision: RouteDecision) -> str:
+        return ROUTE_MANAGER if self.process == PROCESS_HIERARCHICAL else decision.route
+
+
+TIERS: Dict[str, CrewTier] = {
+    TIER_FAST: CrewTier(TIER_FAST, reasoning=False, max_iter=1, process=PROCESS_ROUTED, tools=False,
+                        model=os.getenv("CREW_MODEL_FAST") or None),
+    TIER_BALANCED: CrewTier(TIER_BALANCED, reasoning=False, max_iter=2, process=PROCESS_ADAPTIVE, tools=True),
+    TIER_THOROUGH: CrewTier(TIER_THOROUGH, reasoning=True, max_iter=3, process=PROCESS_HIERARCHICAL, tools=True,
+                            model=os.getenv("CREW_MODEL_THOROUGH") or None, verbose=True),
+}
+
+DEFAULT_TIER = os.getenv("CHAT_DEFAULT_TIER", TIER_BALANCED)
+
+
+def resolve_tier(name: Optional[str]) -> CrewTier:
+    """The named tier; unknown or missing names get the default"""
+    return TIERS.get((name or DEFAULT_TIER).lower()) or TIERS[TIER_BALANCED]
+
+
+class TierStats:
+    """Rolling crew latency per tier"""
+
+    def __init__(self, window: int = 500):
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {name: deque(maxlen=window) for name in TIERS}
+        self._counts: Dict[str, int] = {name: 0 for name in TIERS}
+
+    def record(self, tier: str, seconds: float):
+        with self._lock:
+            self._latencies[tier].append(seconds)
+            self._counts[tier] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            items = {name: (sorted(values), self._counts[name]) for name, values in self._latencies.items()}
+        return {
+            name: {
+                "requests": count,
+                "p50_s": round(statistics.median(values), 2) if values else None,
+                "p95_s": round(values[int(len(values) * 0.95)], 2) if values else None,
+                "config": {k: v for k, v in TIERS[name].__dict__.items() if k != "name"},
+            }
+            for name, (values, count) in items.items()
+        }
+
+
+tier_stats = TierStats()
+
+
+# -------------------------------------------------------------------- benchmark
+
+_WORKOUT = {
+    "goal": "strength", "duration_minutes": 45, "intensity": "Intermediate", "focus": "Push",
+    "equipment": ["barbell", "bench"], "warm_up": ["5 min rowing"],
+    "exercises": [{"name": "Bench Press", "sets": 4, "reps": "6-8", "rest_seconds": 120, "notes": ""}],
+    "cool_down": ["Chest and shoulder stretches"], "safety_notes": ["Control the eccentric"],
+}
+_NUTRITION = {
+    "goal": "High-protein day", "daily_calories": 2200, "protein_g": 160, "macro_split": "40% carbs, 30% protein, 30% fat",
+    "meals": [{"meal_type": "Lunch", "name": "Chicken bowl", "calories": 650, "protein_g": 50,
+               "prep_minutes": 20, "ingredients": ["chicken", "rice"], "key_nutrients": ["protein"]}],
+    "tips": ["Hydrate"],
+}
+
+
+def _scripted_llm(median: float):
+    """CrewAI LLM that answers like a well-behaved model after a lognormal delay"""
+    from crewai.llms.base_llm import BaseLLM
+
+    class ScriptedLLM(BaseLLM):
+        def __init__(self):
+            super().__init__(model="mock/scripted")
+            self.counter = [0]  # shared by the shallow copies crews make of their LLM
+
+        @property
+        def calls(self) -> int:
+            return self.counter[0]
+
+        def supports_function_calling(self) -> bool:
+            return False
+
+        def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+            self.counter[0] += 1
+            time.sleep(random.lognormvariate(0, 0.3) * median)
+            text = messages if isinstance(messages, str) else "\n".join(str(m.get("content", "")) for m in messages)
+            if "READY: I am ready to execute the task." in text and "Reasoning Plan:" not in text:
+                return "1. Check the user's data\n2. Delegate\n\nREADY: I am ready to execute the task."
+            first_turn = isinstance(messages, str) or not any(m.get("role") == "assistant" for m in messages)
+            # Crew Manager -> Fitness & Nutrition Manager -> specialist, one delegation each
+            for manager, coworker in (("Crew Manager", "Fitness & Nutrition Manager"),
+                                      ("Fitness & Nutrition Manager", "Expert Fitness Coach")):
+                if f"You are {manager}." in text and first_turn:
+                    return (
+                        f"Thought: This is for the {coworker}.\nAction: Delegate work to coworker\n"
+                        f'Action Input: {{"task": "Plan a push day", "context": "intermediate lifter", '
+                        f'"coworker": "{coworker}"}}'
+                    )
+            answer = _NUTRITION if "You are Certified Nutritionist" in text else _WORKOUT
+            return f"Thought: I now can give a great answer\nFinal Answer: {json.dumps(answer)}"
+
+    return ScriptedLLM()
+
+
+def _benchmark(requests: int, median: float):
+    from . import crew as crew_module
+    from .router import get_router
+
+    llm = _scripted_llm(median)
+    crew_module.get_llm = lambda model=None: llm  # every tier talks to the scripted model
+    router = get_router()
+    inputs = {
+        "user_id": "user_00001", "user_profile": "Age: 30", "user_activities": "n/a", "user_measurements": "n/a",
+        "user_nutrition": "n/a", "context": "This is the start of a new conversation.", "knowledge": "No relevant notes.",
+    }
+    messages = ["Give me a push day workout", "What should I eat after training?", "I feel off today, any advice?"]
+    print(f"Scripted LLM: ~{median * 1000:.0f} ms per call; {requests} requests per tier over {len(messages)} message types")
+    for name, tier in TIERS.items():
+        latencies: List[float] = []
+        calls_before = llm.calls
+        for i in range(requests):
+            message = messages[i % len(messages)]
+            decision = router.route(message, specialist_only=tier.process == PROCESS_ROUTED)
+            started = time.perf_counter()
+            crew_module.tier_crew(tier, tier.route_for(decision)).kickoff(inputs={**inputs, "user_message": message})
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        print(
+            f"📊 {name:<9} p50 {statistics.median(latencies) * 1000:7.0f} ms   p95 {latencies[int(len(latencies) * 0.95)] * 1000:7.0f} ms   "
+            f"LLM calls/request {(llm.calls - calls_before) / requests:4.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark crew latency per chat tier with a scripted local LLM")
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--median", type=float, default=0.3, help="Median seconds per LLM call")
+    args = parser.parse_args()
+    os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+    _benchmark(args.requests, args.median)
@@ -2,11 +2,12 @@ from crewai.tools import BaseTool
 from typing import Type, Union, Any
 from pydantic import BaseModel, Field
 import base64
-from groq import Groq
 import os
 import json
 import tempfile
 
+from ..http_clients import get_groq_client
+
 class FoodAnalyzerInput(BaseModel):
     """Input schema for FoodAnalyzer."""
     image_data: str = Field(..., description="Base64 encoded image data or file path to analyze")
@@ -30,7 +31,7 @@ class FoodAnalyzer(BaseTool):
             if not groq_api_key:
                 return "Error: GROQ_API_KEY not found in environment variables."
             
-            client = Groq(api_key=groq_api_key)
+            client = get_groq_client(groq_api_key)
             
             # Handle different input formats
             if image_data.startswith('data:image'):
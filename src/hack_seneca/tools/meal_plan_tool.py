@@ -0,0 +1,42 @@
+from crewai.tools import BaseTool
+from typing import Any, List, Optional, Type
+from pydantic import BaseModel, Field
+
+from ..meal_planner import DIETS, derive_targets, load_user_records, meal_planner, plan_user, record_plan
+
+class MealPlanOptimizerInput(BaseModel):
+    """Input schema for MealPlanOptimizer."""
+    days: int = Field(1, ge=1, le=7, description="Number of days to plan (1 for a day plan, 7 for a week)")
+    meals_per_day: int = Field(4, ge=3, le=5, description="Meals per day including snacks (3-5)")
+    diet: List[str] = Field(default_factory=list, description=f"Dietary restrictions, any of: {', '.join(DIETS)}")
+    exclude: List[str] = Field(default_factory=list, description="Ingredients to avoid (allergies, dislikes)")
+    calories: Optional[int] = Field(None, description="Daily calorie target, only if the user asked for a specific one")
+    protein_g: Optional[int] = Field(None, description="Daily protein target in grams, only if the user asked for a specific one")
+
+class MealPlanOptimizer(BaseTool):
+    name: str = "MealPlanOptimizer"
+    description: str = (
+        "Build a day or week of meals from the recipe table that hits the user's calorie and macro targets. "
+        "Targets are derived from the user's profile, activity and recent intake. Use this tool whenever the "
+        "user asks for a meal plan, a diet plan or what to eat over a day or week."
+    )
+    args_schema: Type[BaseModel] = MealPlanOptimizerInput
+
+    def _run(self, days: int = 1, meals_per_day: int = 4, diet: Optional[List[str]] = None,
+             exclude: Optional[List[str]] = None, calories: Optional[int] = None, protein_g: Optional[int] = None,
+             **ignored: Any) -> str:
+        """Solve the plan locally and return it with instructions for the answer."""
+        # Always the signed-in user of this request; a user_id the LLM passes anyway is ignored
+        user_id = plan_user()
+        if user_id is None:
+            return "Meal plans are unavailable here. Answer with general guidance and do not list specific meals."
+        records = load_user_records(user_id)
+        targets = derive_targets(records["profile"], records["nutrition"], records["activities"], calories, protein_g)
+        diet = [d.strip().lower().replace("-", "_").replace(" ", "_") for d in diet or []]
+        result = meal_planner.plan(targets, days, meals_per_day, diet, exclude or [])
+        record_plan(result)
+        instructions = (
+            "These meals, targets and macro split are inserted into the answer automatically: do not list the meals "
+            "(leave `meals` empty) and write only goal, dietary_considerations, snacks, tips and tracking around them."
+        )
+        return f"{result.summary()}\n\n{instructions}"
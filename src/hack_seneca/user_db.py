@@ -0,0 +1,282 @@
+"""SQLite storage backend for the fitness data in ``users_data/``.
+
+The JSON files are read and written whole and the indexed ``UserDataStore``
+keeps all of them in memory, which stops scaling well before the user base
+does. ``SQLiteUserRepository`` stores the same data in a WAL-mode SQLite file
+(``users``, ``activities``, ``measurements`` and ``nutrition`` tables, indexed
+on ``(user_id, date)``), so a lookup reads only the rows it returns and new
+records are appended without rewriting anything.
+
+It offers the same read API as ``UserDataStore`` (``profile``, ``recent``,
+``user_data``, ``between``, ``aggregate``, ``stats``) plus writes. Select it
+with ``USER_DATA_BACKEND=sqlite`` (``USER_DATA_DB`` sets the path); an empty
+database is filled from the JSON files on first open. To convert explicitly:
+
+    python -m hack_seneca.user_db import [--data-dir users_data] [--db users_data/fitness.db]
+
+``python -m hack_seneca.user_db bench`` compares query latency with the JSON
+paths on synthetic data.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .user_store import PROFILES_FILE, RECENT_LIMITS, RECORD_FILES, USERS_DATA_DIR, UserDataStore
+
+DEFAULT_DB_PATH = os.getenv("USER_DATA_DB", os.path.join(USERS_DATA_DIR, "fitness.db"))
+
+# Typed columns per table; any other field of a row is kept in the ``extra`` JSON column
+COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "users": ("user_id", "age", "weight", "height", "bmi", "fitness_level", "goals", "join_date"),
+    "activities": ("user_id", "date", "steps", "calories_burned", "active_minutes", "distance_km",
+                   "heart_rate_avg", "workout_duration"),
+    "measurements": ("measurement_id", "user_id", "date", "weight", "body_fat", "muscle_mass", "bmi", "waist",
+                     "chest", "bicep", "thigh", "body_water", "bone_mass", "notes"),
+    "nutrition": ("user_id", "date", "calories_consumed", "protein_g", "carbs_g", "fat_g", "fiber_g", "sugar_g",
+                  "sodium_mg"),
+}
+_KEYS = {"users": "PRIMARY KEY (user_id)", "activities": "PRIMARY KEY (user_id, date)",
+         "measurements": "PRIMARY KEY (measurement_id)", "nutrition": "PRIMARY KEY (user_id, date)"}
+_TEXT = {"user_id", "fitness_level", "goals", "join_date", "date", "measurement_id", "notes"}
+_INTEGER = {"age", "steps", "calories_burned", "active_minutes", "heart_rate_avg", "workout_duration",
+            "calories_consumed", "protein_g", "carbs_g", "fat_g", "fiber_g", "sugar_g", "sodium_mg"}
+
+
+def _column_type(column: str) -> str:
+    return "TEXT" if column in _TEXT else "INTEGER" if column in _INTEGER else "REAL"
+
+
+def _schema() -> str:
+    statements = []
+    for table, columns in COLUMNS.items():
+        defs = ", ".join(f"{c} {_column_type(c)}{' NOT NULL' if c in ('user_id', 'date') else ''}"
+                         for c in columns)
+        statements.append(f"CREATE TABLE IF NOT EXISTS {table} ({defs}, extra TEXT, {_KEYS[table]})")
+        if table != "users":
+            statements.append(f"CREATE INDEX IF NOT EXISTS idx_{table}_user_date ON {table} (user_id, date DESC)")
+    return ";\n".join(statements) + ";"
+
+
+def _to_row(table: str, record: Dict[str, Any]) -> Tuple[Any, ...]:
+    columns = COLUMNS[table]
+    values = [record.get(c) for c in columns]
+    extra = {k: v for k, v in record.items() if k not in columns}
+    # Lists and dicts (e.g. several goals) don't fit a column; keep them verbatim in extra
+    for i, value in enumerate(values):
+        if isinstance(value, (list, dict)):
+            extra[columns[i]], values[i] = value, None
+    return (*values, json.dumps(extra) if extra else None)
+
+
+def _to_record(table: str, row: Sequence[Any]) -> Dict[str, Any]:
+    columns = COLUMNS[table]
+    record = {c: v for c, v in zip(columns, row) if v is not None}
+    if row[len(columns)]:
+        record.update(json.loads(row[len(columns)]))
+    return record
+
+
+class SQLiteUserRepository:
+    """Users and their records in a WAL-mode SQLite file"""
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, import_from: Optional[str] = None):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_schema())
+        if import_from and conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+            import_json(import_from, self)
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite connections aren't shareable across threads"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------------ writes
+
+    def upsert_profiles(self, profiles: Iterable[Dict[str, Any]]) -> int:
+        return self._upsert("users", profiles)
+
+    def add_records(self, kind: str, records: Iterable[Dict[str, Any]]) -> int:
+        """Insert or replace records of one kind (same user and date, or measurement id, replaces)"""
+        if kind == "measurements":
+            records = ({**r, "measurement_id": r.get("measurement_id") or f"measurement_{r['user_id']}_{r['date']}"}
+                       for r in records)
+        return self._upsert(kind, records)
+
+    def _upsert(self, table: str, records: Iterable[Dict[str, Any]]) -> int:
+        rows = [_to_row(table, record) for record in records]
+        marks = ", ".join("?" * (len(COLUMNS[table]) + 1))
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(f"INSERT OR REPLACE INTO {table} VALUES ({marks})", rows)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(rows)
+
+    # ----------------------------------------------------------------- lookups
+
+    def _select(self, kind: str, where: str, params: Tuple[Any, ...], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        if kind not in RECORD_FILES:
+            raise KeyError(kind)
+        sql = f"SELECT * FROM {kind} WHERE user_id = ?{where} ORDER BY date DESC, rowid"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [_to_record(kind, row) for row in self._conn().execute(sql, params)]
+
+    def profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return _to_record("users", row) if row else None
+
+    def recent(self, user_id: str, kind: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """The user's newest ``limit`` rows of one kind (all rows when None), newest first"""
+        return self._select(kind, "", (user_id,), limit)
+
+    def between(self, user_id: str, kind: str, start: str, end: str) -> List[Dict[str, Any]]:
+        """Rows dated ``start``..``end`` (ISO dates, inclusive), newest first"""
+        return self._select(kind, " AND date BETWEEN ? AND ?", (user_id, start, end))
+
+    def aggregate(self, user_id: str, kind: str, fields: Sequence[str],
+                  start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Any]:
+        """Row count and avg/min/max of ``fields`` over an optional date range"""
+        unknown = [f for f in fields if f not in COLUMNS[kind]]
+        if unknown:
+            raise KeyError(f"{kind} has no column {unknown[0]}")
+        select = ", ".join(f"AVG({f}), MIN({f}), MAX({f})" for f in fields)
+        row = self._conn().execute(
+            f"SELECT COUNT(*), {select} FROM {kind} WHERE user_id = ? AND date BETWEEN ? AND ?",
+            (user_id, start or "", end or "9999-12-31"),
+        ).fetchone()
+        result: Dict[str, Any] = {"count": row[0]}
+        for i, f in enumerate(fields):
+            result[f] = dict(zip(("avg", "min", "max"), row[1 + 3 * i: 4 + 3 * i]))
+        return result
+
+    def user_data(self, user_id: str, limits: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """Profile plus the recent rows of every kind, keyed by kind"""
+        limits = limits or RECENT_LIMITS
+        data: Dict[str, Any] = {"user_id": user_id, "profile": self.profile(user_id)}
+        for kind in RECORD_FILES:
+            data[kind] = self.recent(user_id, kind, limits.get(kind))
+        return data
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        return {
+            "backend": "sqlite",
+            "users": conn.execute("SELECT COUNT(*) FROM users").fetchone()[0],
+            "records": {kind: conn.execute(f"SELECT COUNT(*) FROM {kind}").fetchone()[0] for kind in RECORD_FILES},
+            "db_bytes": sum(os.path.getsize(p) for p in (self.path, self.path + "-wal") if os.path.exists(p)),
+        }
+
+
+def import_json(data_dir: str, repository: SQLiteUserRepository) -> Dict[str, int]:
+    """Copy the users_data JSON files into the repository (re-running replaces the same rows)"""
+    started = time.perf_counter()
+
+    def read(name: str) -> List[Dict[str, Any]]:
+        path = os.path.join(data_dir, name)
+        if not os.path.exists(path):
+            return []
+        with open(path, "r") as f:
+            return json.load(f)
+
+    counts = {"users": repository.upsert_profiles(read(PROFILES_FILE))}
+    for kind, name in RECORD_FILES.items():
+        counts[kind] = repository.add_records(kind, read(name))
+    print(f"[USERDATA] Imported {counts} from {data_dir} into {repository.path} "
+          f"in {time.perf_counter() - started:.1f} s")
+    return counts
+
+
+# ---------------------------------------------------------------- benchmark
+
+def _timed(fn: Callable[[], Any], samples: int) -> Tuple[float, float]:
+    timings = []
+    for _ in range(samples):
+        t0 = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - t0) * 1e6)
+    timings.sort()
+    return statistics.median(timings), timings[min(int(samples * 0.95), samples - 1)]
+
+
+def _benchmark(users: int, records_per_user: int, samples: int, legacy_samples: int):
+    from .user_store import _legacy_login, write_synthetic_data
+
+    work_dir = tempfile.mkdtemp(prefix="users_data_")
+    try:
+        ids = write_synthetic_data(work_dir, users, records_per_user)
+        json_bytes = sum(os.path.getsize(os.path.join(work_dir, n)) for n in os.listdir(work_dir))
+        repository = SQLiteUserRepository(os.path.join(work_dir, "fitness.db"))
+        t0 = time.perf_counter()
+        import_json(work_dir, repository)
+        import_s = time.perf_counter() - t0
+        store = UserDataStore(work_dir, reload_seconds=3600)
+        t0 = time.perf_counter()
+        store.profile(ids[0])
+        build_s = time.perf_counter() - t0
+        print(f"{users} users x {records_per_user} records per kind: JSON {json_bytes / 1e6:.0f} MB "
+              f"(index build {build_s:.1f} s per process), SQLite {repository.stats()['db_bytes'] / 1e6:.0f} MB "
+              f"(one-off import {import_s:.1f} s, nothing to load per process)")
+
+        rng = random.Random(3)
+        pick = lambda: rng.choice(ids)
+        end = "2025-09-30"
+        start = "2025-09-17"  # two weeks
+        uid = ids[-1]
+        assert repository.user_data(uid) == store.user_data(uid)
+        assert repository.between(uid, "activities", start, end) == store.between(uid, "activities", start, end)
+        assert repository.aggregate(uid, "nutrition", ["protein_g"]) == store.aggregate(uid, "nutrition", ["protein_g"])
+
+        legacy = _timed(lambda: _legacy_login(work_dir, pick()), legacy_samples)
+        queries = [
+            ("login (profile + recent N)", lambda: store.user_data(pick()), lambda: repository.user_data(pick())),
+            ("date range (14 days)", lambda: store.between(pick(), "activities", start, end),
+             lambda: repository.between(pick(), "activities", start, end)),
+            ("aggregate (kcal, 14 days)", lambda: store.aggregate(pick(), "nutrition", ["calories_consumed"], start, end),
+             lambda: repository.aggregate(pick(), "nutrition", ["calories_consumed"], start, end)),
+        ]
+        print(f"📊 {'login, legacy JSON scan':<36} p50 {legacy[0] / 1000:9.1f} ms   p95 {legacy[1] / 1000:9.1f} ms")
+        for name, json_query, sqlite_query in queries:
+            for backend, query in (("JSON index", json_query), ("SQLite", sqlite_query)):
+                p50, p95 = _timed(query, samples)
+                print(f"📊 {name + ', ' + backend:<36} p50 {p50:9.1f} µs   p95 {p95:9.1f} µs")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite backend for users_data: import the JSON files or benchmark")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="Convert the users_data JSON files into SQLite")
+    importer.add_argument("--data-dir", default=USERS_DATA_DIR)
+    importer.add_argument("--db", default=DEFAULT_DB_PATH)
+    bench = commands.add_parser("bench", help="Query latency of SQLite vs the JSON paths on synthetic data")
+    bench.add_argument("--users", type=int, default=20000)
+    bench.add_argument("--records", type=int, default=30, help="Rows per user in each of the record files")
+    bench.add_argument("--samples", type=int, default=5000)
+    bench.add_argument("--legacy-samples", type=int, default=5)
+    args = parser.parse_args()
+    if args.command == "import":
+        import_json(args.data_dir, SQLiteUserRepository(args.db))
+    else:
+        _benchmark(args.users, args.records, args.samples, args.legacy_samples)
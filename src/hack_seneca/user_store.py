@@ -0,0 +1,265 @@
+"""Shared, indexed access to the fitness data in ``users_data/``.
+
+Every login used to ``json.load`` all four files, scan every record for the
+user and sort the matches (the API skipped the data entirely and returned a
+mock profile). ``UserDataStore`` parses the files once per process, groups the
+records by ``user_id`` with each user's rows pre-sorted newest first, and then
+answers a profile lookup in O(1) and "the last k rows" as an O(k) slice.
+
+The files are re-checked at most every ``USER_DATA_RELOAD_SECONDS`` (default
+5 s); when one has changed on disk the next lookup rebuilds the indexes and
+swaps them in atomically. The CLI (``main.load_user_data``),
+the API sessions (``api_server.load_session_user_data``) and the meal planner
+all read through the ``user_store`` singleton; ``USER_DATA_BACKEND=sqlite``
+swaps it for the SQLite repository in ``user_db.py`` with the same API.
+
+Run ``python -m hack_seneca.user_store`` to compare login latency against the
+previous load-filter-sort path on synthetic data (100k users by default).
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+USERS_DATA_DIR = os.getenv("USERS_DATA_DIR", os.path.join(_PROJECT_ROOT, "users_data"))
+RELOAD_SECONDS = float(os.getenv("USER_DATA_RELOAD_SECONDS", "5"))
+
+PROFILES_FILE = "fitness-users.json"
+RECORD_FILES = {
+    "activities": "fitness-activities.json",
+    "measurements": "fitness-measurements.json",
+    "nutrition": "fitness-nutrition.json",
+}
+# Rows attached to a login, per kind (the CLI has always kept these windows)
+RECENT_LIMITS = {"activities": 7, "measurements": 5, "nutrition": 7}
+# Rows attached to a chat session: two weeks, so the prompt digest can compare against the prior week
+SESSION_LIMITS = {"activities": 14, "measurements": 5, "nutrition": 14}
+
+
+class UserDataStore:
+    """Per-user indexes over the users_data JSON files"""
+
+    def __init__(self, data_dir: str = USERS_DATA_DIR, reload_seconds: float = RELOAD_SECONDS):
+        self.data_dir = data_dir
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        self._mtimes: Dict[str, Optional[float]] = {}
+        self._checked = float("-inf")
+        self._profiles: Dict[str, Dict[str, Any]] = {}
+        self._records: Dict[str, Dict[str, List[Dict[str, Any]]]] = {kind: {} for kind in RECORD_FILES}
+        self.loads = 0
+
+    # ---------------------------------------------------------------- loading
+
+    def _file_mtimes(self) -> Dict[str, Optional[float]]:
+        mtimes = {}
+        for name in [PROFILES_FILE, *RECORD_FILES.values()]:
+            try:
+                mtimes[name] = os.path.getmtime(os.path.join(self.data_dir, name))
+            except OSError:
+                mtimes[name] = None
+        return mtimes
+
+    def _read(self, name: str) -> List[Dict[str, Any]]:
+        path = os.path.join(self.data_dir, name)
+        if not os.path.exists(path):
+            return []
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if now - self._checked < self.reload_seconds:
+            return
+        with self._lock:
+            if now - self._checked < self.reload_seconds:
+                return
+            mtimes = self._file_mtimes()
+            if mtimes != self._mtimes:
+                self._build(mtimes)
+            self._checked = time.monotonic()
+
+    def _build(self, mtimes: Dict[str, Optional[float]]):
+        started = time.perf_counter()
+        profiles = {user["user_id"]: user for user in self._read(PROFILES_FILE)}
+        records = {kind: index_records(self._read(name)) for kind, name in RECORD_FILES.items()}
+        # Swap in complete indexes; readers never see a half-built one
+        self._profiles, self._records, self._mtimes = profiles, records, mtimes
+        self.loads += 1
+        rows = sum(len(group) for index in records.values() for group in index.values())
+        print(f"[USERDATA] Indexed {len(profiles)} profiles and {rows} records "
+              f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    # ---------------------------------------------------------------- lookups
+
+    def profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+        self._ensure_fresh()
+        return self._profiles.get(user_id)
+
+    def recent(self, user_id: str, kind: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """The user's newest ``limit`` rows of one kind (all rows when None), newest first"""
+        self._ensure_fresh()
+        rows = self._records[kind].get(user_id, [])
+        return rows[:limit] if limit is not None else list(rows)
+
+    def between(self, user_id: str, kind: str, start: str, end: str) -> List[Dict[str, Any]]:
+        """Rows dated ``start``..``end`` (ISO dates, inclusive), newest first"""
+        return [row for row in self.recent(user_id, kind) if start <= row.get("date", "") <= end]
+
+    def aggregate(self, user_id: str, kind: str, fields: Sequence[str],
+                  start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Any]:
+        """Row count and avg/min/max of ``fields`` over an optional date range"""
+        rows = self.between(user_id, kind, start or "", end or "9999-12-31")
+        result: Dict[str, Any] = {"count": len(rows)}
+        for field in fields:
+            values = [row[field] for row in rows if isinstance(row.get(field), (int, float))]
+            result[field] = {"avg": sum(values) / len(values), "min": min(values), "max": max(values)} if values \
+                else {"avg": None, "min": None, "max": None}
+        return result
+
+    def user_data(self, user_id: str, limits: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """Profile plus the recent rows of every kind, keyed by kind"""
+        limits = limits or RECENT_LIMITS
+        data: Dict[str, Any] = {"user_id": user_id, "profile": self.profile(user_id)}
+        for kind in RECORD_FILES:
+            data[kind] = self.recent(user_id, kind, limits.get(kind))
+        return data
+
+    def stats(self) -> Dict[str, Any]:
+        self._ensure_fresh()
+        return {
+            "backend": "json",
+            "users": len(self._profiles),
+            "records": {kind: sum(len(rows) for rows in index.values()) for kind, index in self._records.items()},
+            "loads": self.loads,
+        }
+
+
+def index_records(rows: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Rows grouped by user_id, each group sorted newest first"""
+    index: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for row in rows:
+        index[row["user_id"]].append(row)
+    for group in index.values():
+        group.sort(key=lambda row: row.get("date", ""), reverse=True)
+    return dict(index)
+
+
+def _select_backend():
+    """Store selected by USER_DATA_BACKEND (json by default, or sqlite)"""
+    if os.getenv("USER_DATA_BACKEND", "json").lower() == "sqlite":
+        from .user_db import SQLiteUserRepository
+        return SQLiteUserRepository(import_from=USERS_DATA_DIR)
+    return UserDataStore()
+
+
+user_store = _select_backend()
+
+
+# ---------------------------------------------------------------- benchmark
+
+def write_synthetic_data(data_dir: str, users: int, records_per_user: int, seed: int = 7):
+    """users_data-shaped JSON files for ``users`` users (records in shuffled order, like appended logs)"""
+    rng = random.Random(seed)
+    today = date(2025, 9, 30)
+    ids = [f"user_{i:05d}" if i < 100000 else f"user_{i}" for i in range(1, users + 1)]
+    profiles = [
+        {"user_id": uid, "age": rng.randint(18, 70), "weight": round(rng.uniform(50, 115), 1),
+         "height": round(rng.uniform(150, 200), 1), "bmi": round(rng.uniform(18, 35), 1),
+         "fitness_level": rng.choice(["beginner", "intermediate", "advanced"]),
+         "goals": rng.choice(["weight_loss", "muscle_gain", "endurance", "flexibility"]), "join_date": "2024-10-19"}
+        for uid in ids
+    ]
+    days = [(today - timedelta(days=d)).isoformat() for d in range(records_per_user)]
+    rows: Dict[str, List[Dict[str, Any]]] = {
+        "activities": [{"user_id": uid, "date": day, "steps": rng.randint(2000, 16000), "calories_burned": rng.randint(1500, 3000),
+                        "active_minutes": rng.randint(5, 120)} for uid in ids for day in days],
+        "measurements": [{"measurement_id": f"measurement_{uid}_{day}", "user_id": uid, "date": day, "weight": round(rng.uniform(50, 115), 1),
+                          "body_fat": round(rng.uniform(8, 40), 1)} for uid in ids for day in days],
+        "nutrition": [{"user_id": uid, "date": day, "calories_consumed": rng.randint(1400, 3300),
+                       "protein_g": rng.randint(40, 220)} for uid in ids for day in days],
+    }
+    with open(os.path.join(data_dir, PROFILES_FILE), "w") as f:
+        json.dump(profiles, f)
+    for kind, name in RECORD_FILES.items():
+        rng.shuffle(rows[kind])
+        with open(os.path.join(data_dir, name), "w") as f:
+            json.dump(rows[kind], f)
+    return ids
+
+
+def _legacy_login(data_dir: str, user_id: str) -> Dict[str, Any]:
+    """The previous per-login path: load every file, filter by user, sort"""
+    with open(os.path.join(data_dir, PROFILES_FILE)) as f:
+        data: Dict[str, Any] = {"profile": next((u for u in json.load(f) if u["user_id"] == user_id), None)}
+    for kind, name in RECORD_FILES.items():
+        with open(os.path.join(data_dir, name)) as f:
+            rows = [row for row in json.load(f) if row["user_id"] == user_id]
+        rows.sort(key=lambda row: row["date"], reverse=True)
+        data[kind] = rows[:RECENT_LIMITS[kind]]
+    return data
+
+
+def _percentiles(values: List[float]) -> Tuple[float, float]:
+    values = sorted(values)
+    return statistics.median(values), values[min(int(len(values) * 0.95), len(values) - 1)]
+
+
+def _benchmark(users: int, records_per_user: int, lookups: int, legacy_lookups: int):
+    data_dir = tempfile.mkdtemp(prefix="users_data_")
+    try:
+        started = time.perf_counter()
+        ids = write_synthetic_data(data_dir, users, records_per_user)
+        size = sum(os.path.getsize(os.path.join(data_dir, n)) for n in os.listdir(data_dir))
+        print(f"{users} users x {records_per_user} records per kind, {size / 1e6:.0f} MB of JSON "
+              f"(written in {time.perf_counter() - started:.1f} s)")
+        rng = random.Random(1)
+
+        legacy = []
+        for _ in range(legacy_lookups):
+            t0 = time.perf_counter()
+            _legacy_login(data_dir, rng.choice(ids))
+            legacy.append((time.perf_counter() - t0) * 1000)
+
+        store = UserDataStore(data_dir, reload_seconds=3600)
+        t0 = time.perf_counter()
+        store.profile(ids[0])
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        indexed = []
+        for _ in range(lookups):
+            t0 = time.perf_counter()
+            store.user_data(rng.choice(ids))
+            indexed.append((time.perf_counter() - t0) * 1000)
+        uid = ids[-1]
+        assert store.user_data(uid)["nutrition"] == _legacy_login(data_dir, uid)["nutrition"]
+
+        p50, p95 = _percentiles(legacy)
+        print(f"📊 legacy load+filter+sort: p50 {p50:.0f} ms   p95 {p95:.0f} ms per login ({legacy_lookups} logins)")
+        p50, p95 = _percentiles(indexed)
+        print(f"📊 indexed store:           p50 {p50 * 1000:.1f} µs   p95 {p95 * 1000:.1f} µs per login "
+              f"({lookups} logins, one-off index build {build_ms:.0f} ms)")
+        print(f"📊 break-even after {build_ms / statistics.median(legacy):.1f} logins; "
+              f"speed-up per login ~{statistics.median(legacy) / statistics.median(indexed):,.0f}x")
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Login latency of the indexed user-data store vs per-login file scans")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--records", type=int, default=3, help="Rows per user in each of the record files")
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument("--legacy-lookups", type=int, default=5)
+    args = parser.parse_args()
+    _benchmark(args.users, args.records, args.lookups, args.legacy_lookups)
@@ -0,0 +1,399 @@
+"""Deterministic workout plans for common programs.
+
+Push/pull/legs, upper/lower, full-body and body-part splits, single training
+days and HIIT circuits used to be written from scratch by the fitness coach on
+every request. ``config/workout_programs.yaml`` holds an exercise catalogue
+and the program templates; the generator fills each session's slots from the
+catalogue (by equipment and fitness level) and sets sets, reps and rest from
+the goal, level, age, recent activity and the fatigue flag. The result is a
+``WorkoutPlan``, so it renders and post-processes exactly like the crew's
+structured output - in about a millisecond.
+
+Anything the templates can't answer well (questions, injuries, sport-specific
+or follow-up requests, mixed workout + meal requests) returns None and goes
+to the crew as before.
+
+Run ``python -m hack_seneca.workout_generator`` for coverage of the labeled
+fitness examples in ``config/routing.yaml`` and generation latency.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import re
+import statistics
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+from .chat_templates import normalize
+from .context_builder import user_records
+from .structured_output import Exercise, WorkoutPlan
+
+PROGRAMS_CONFIG = os.path.join(os.path.dirname(__file__), "config", "workout_programs.yaml")
+
+LEVELS = {1: "Beginner", 2: "Intermediate", 3: "Advanced"}
+_PROFILE_LEVELS = {"beginner": 1, "novice": 1, "intermediate": 2, "advanced": 3, "expert": 3}
+_LEVEL_RE = re.compile(r"\b(beginner|novice|new to|intermediate|advanced|experienced|expert)\b")
+_NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7}
+_DAYS_RE = re.compile(r"\b(\d{1,2}|one|two|three|four|five|six|seven)(?:\s*-\s*|\s+)?(?:days?|x)\b")
+_MINUTES_RE = re.compile(r"\b(\d{2,3})\s*-?\s*(?:min|mins|minute|minutes)\b")
+_QUICK_RE = re.compile(r"\b(?:quick|short|fast|express)\b")
+_FATIGUE_RE = re.compile(r"\b(?:tired|exhausted|fatigued|drained|low energy|sleepy)\b")
+_PLAN_RE = re.compile(r"\b(?:plan|program|programme|split|routine|schedule|week)\b")
+
+_EQUIPMENT_NAMES = {
+    "barbell": "Barbell and rack", "dumbbell": "Dumbbells", "cable": "Cable station",
+    "machine": "Gym machines", "bodyweight": "Bodyweight / mat",
+}
+_WORK_SECONDS = 45  # average time under load per set, for session length estimates
+_WARM_COOL_MINUTES = 12
+_CIRCUIT_INTERVALS = {1: (30, 30), 2: (40, 20), 3: (45, 15)}  # (work, rest) seconds per level
+_CIRCUIT_WARM_COOL_MINUTES = 6
+_ROUND_REST_SECONDS = 75
+_OLDER_AGE = 50
+
+
+@dataclass
+class WorkoutRequest:
+    schedule: List[str]  # session keys, one per training day
+    title: str  # program or session title
+    goal: str
+    level: int
+    equipment: str
+    minutes: Optional[int]
+    fatigued: bool
+    older: bool
+    activity_note: Optional[str] = None
+    time_limit: bool = False  # minutes were stated explicitly, not implied by "quick"
+
+
+@dataclass
+class GeneratedWorkout:
+    plan: WorkoutPlan
+    program: str
+    days: int
+    elapsed_ms: float
+
+
+def _contains(text: str, phrase: str) -> bool:
+    return re.search(rf"\b{re.escape(phrase)}\b", text) is not None
+
+
+class WorkoutGenerator:
+    """Turns plan requests into personalized ``WorkoutPlan``s from the YAML templates"""
+
+    def __init__(self, config_path: str = PROGRAMS_CONFIG):
+        with open(config_path, "r") as f:
+            config = yaml.safe_load(f) or {}
+        request = config.get("request", {})
+        self.cues = set(request.get("cues", []))
+        self.blockers = [re.compile(pattern) for pattern in request.get("blockers", [])]
+        self.targets = re.compile(request["targets"]) if request.get("targets") else None
+        self.goals = config["goals"]
+        self.schemes = config["schemes"]
+        self.equipment = config["equipment"]
+        self.sessions = config["sessions"]
+        self.programs = config["programs"]
+        self.days_to_program = {int(k): v for k, v in config.get("days_to_program", {}).items()}
+        self.warm_up = config["warm_up"]
+        self.cool_down = config["cool_down"]
+        self.progression = config["progression"]
+        self.safety_notes = config["safety_notes"]
+        self.catalogue: Dict[str, List[Dict[str, Any]]] = {}
+        for exercise in config.get("exercises", []):
+            self.catalogue.setdefault(exercise["pattern"], []).append(exercise)
+
+        self._lock = threading.Lock()
+        self.messages_seen = 0
+        self.generated = Counter()
+        self.misses = Counter()
+
+    # ------------------------------------------------------------------ parsing
+
+    def _keyword_match(self, text: str, specs: Dict[str, Dict[str, Any]]) -> Optional[str]:
+        for key, spec in specs.items():
+            if any(_contains(text, normalize(keyword)) for keyword in spec.get("keywords", [])):
+                return key
+        return None
+
+    def _goal(self, text: str, profile: Dict[str, Any]) -> str:
+        goal = self._keyword_match(text, self.goals)
+        if goal:
+            return goal
+        profile_goals = profile.get("goals") or profile.get("goal") or []
+        profile_goals = [str(value).lower() for value in (profile_goals if isinstance(profile_goals, list) else [profile_goals])]
+        for key, spec in self.goals.items():
+            if any(value.lower() in profile_goals for value in spec.get("profile", [])):
+                return key
+        return "general"
+
+    def _level(self, text: str, user_data: Dict[str, Any]) -> Tuple[int, Optional[str]]:
+        """Fitness level 1-3 from the message, else the profile adjusted by recent activity"""
+        found = _LEVEL_RE.search(text)
+        if found:
+            word = found.group(1)
+            return (1 if word in ("beginner", "novice", "new to") else 2 if word == "intermediate" else 3), None
+        profile = user_data.get("profile") or {}
+        level = _PROFILE_LEVELS.get(str(profile.get("fitness_level", "")).lower())
+        recent = [row.get("active_minutes") for row in user_records(user_data, "activities")[:14]]
+        recent = [value for value in recent if isinstance(value, (int, float))]
+        if not recent:
+            return level or 2, None
+        average = sum(recent) / len(recent)
+        from_activity = 1 if average < 30 else 2 if average < 75 else 3
+        if level is None:
+            return from_activity, f"Level set from your recent activity ({average:.0f} active min/day)"
+        if average < 20 and level > 1:
+            return level - 1, f"Volume starts one level lower: your recent activity averages {average:.0f} active min/day"
+        return level, None
+
+    def parse(self, message: str, user_data: Dict[str, Any], fatigued: bool = False) -> Tuple[Optional[WorkoutRequest], str]:
+        """The plan request in a message, or (None, reason) when the crew should answer it"""
+        text = normalize(message)
+        if not any(word in self.cues or word.rstrip("s") in self.cues for word in text.replace("-", " ").split()):
+            return None, "no_plan_request"
+        if any(blocker.search(text) for blocker in self.blockers):
+            return None, "needs_coach"
+
+        days_match = _DAYS_RE.search(text)
+        days = None
+        if days_match:
+            value = days_match.group(1)
+            days = int(value) if value.isdigit() else _NUMBER_WORDS[value]
+
+        program = self._keyword_match(text, self.programs)
+        session = None if program else self._keyword_match(text, self.sessions)
+        # A muscle no session template matches ("workout for my chest") is the coach's, not full body
+        if program is None and session is None and self.targets is not None and self.targets.search(text):
+            return None, "unsupported_target"
+        if program is None:
+            if session is None and days:
+                program = self.days_to_program.get(days)
+                if program is None:
+                    return None, "unsupported_days"
+            elif session in (None, "full_body") and not days and _PLAN_RE.search(text):
+                program = "full_body"  # "a beginner gym plan", "a full body routine"
+            elif session is None:
+                session = "full_body"
+        if program is not None:
+            spec = self.programs[program]
+            schedules = {int(k): v for k, v in spec["schedules"].items()}
+            if days and days not in schedules:
+                return None, "unsupported_days"  # e.g. a 7-day or 4-day PPL request
+            schedule = schedules[days or spec.get("default_days", min(schedules))]
+            title = spec["title"]
+        else:
+            schedule = [session] * (days or 1)
+            title = self.sessions[session]["title"]
+
+        minutes_match = _MINUTES_RE.search(text)
+        minutes = int(minutes_match.group(1)) if minutes_match else (30 if _QUICK_RE.search(text) else None)
+        equipment = "gym"
+        for key in ("bodyweight", "dumbbell", "gym"):
+            if any(_contains(text, normalize(keyword)) for keyword in self.equipment[key].get("keywords", [])):
+                equipment = key
+                break
+        profile = user_data.get("profile") or {}
+        level, activity_note = self._level(text, user_data)
+        age = profile.get("age")
+        return WorkoutRequest(
+            schedule=schedule,
+            title=title,
+            goal=self._goal(text, profile),
+            level=level,
+            equipment=equipment,
+            minutes=minutes,
+            fatigued=fatigued or bool(_FATIGUE_RE.search(text)),
+            older=isinstance(age, (int, float)) and age >= _OLDER_AGE,
+            activity_note=activity_note,
+            time_limit=minutes_match is not None,
+        ), "ok"
+
+    # ----------------------------------------------------------------- building
+
+    def _pick(self, pattern: str, request: WorkoutRequest, offset: int, used: set) -> Optional[Dict[str, Any]]:
+        """Catalogue exercise for a slot; repeated sessions rotate through the candidates"""
+        has = self.equipment[request.equipment]["has"]
+        options = [e for e in self.catalogue.get(pattern, []) if e["equipment"] in has]
+        fitting = [e for e in options if e.get("level", 1) <= request.level] or options
+        for i in range(len(fitting)):
+            candidate = fitting[(offset + i) % len(fitting)]
+            if candidate["name"] not in used:
+                return candidate
+        return None
+
+    def _prescribe(self, exercise: Dict[str, Any], request: WorkoutRequest, day: Optional[str]) -> Exercise:
+        scheme = self.schemes[request.goal]["compound" if exercise.get("compound") else "accessory"]
+        sets, rest = scheme["sets"], scheme["rest_seconds"]
+        if request.level == 1:
+            sets -= 1
+        elif request.level == 3 and exercise.get("compound"):
+            sets += 1
+        if request.fatigued:
+            sets -= 1
+            rest += 30
+        if request.older:
+            rest += 30
+        return Exercise(
+            name=exercise["name"], sets=max(sets, 2), reps=exercise.get("reps", scheme["reps"]),
+            rest_seconds=rest, notes=exercise.get("notes", ""), day=day,
+        )
+
+    def _circuit(self, picks: List[Dict[str, Any]], request: WorkoutRequest, day: Optional[str]) -> Tuple[List[Exercise], int]:
+        """Timed rounds filling the requested minutes (20 by default), and the session length"""
+        work, rest = _CIRCUIT_INTERVALS[1 if request.fatigued else request.level]
+        minutes = request.minutes or 20
+        round_seconds = len(picks) * (work + rest) + _ROUND_REST_SECONDS
+        rounds = max(2, int((minutes - _CIRCUIT_WARM_COOL_MINUTES) * 60 // round_seconds) - (1 if request.fatigued else 0))
+        total = _CIRCUIT_WARM_COOL_MINUTES + (rounds * round_seconds - _ROUND_REST_SECONDS) / 60
+        exercises = [
+            Exercise(
+                name=exercise["name"], sets=rounds, reps=f"{work} s work", rest_seconds=rest,
+                notes=f"{exercise.get('notes', '')}. Move straight to the next exercise; rest 60-90 s between rounds".lstrip(". "),
+                day=day,
+            )
+            for exercise in picks
+        ]
+        return exercises, int(-(-total // 5) * 5)
+
+    @staticmethod
+    def _minutes(exercises: List[Exercise]) -> int:
+        seconds = sum((e.sets or 0) * (_WORK_SECONDS + (e.rest_seconds or 0)) for e in exercises)
+        return int(-(-(_WARM_COOL_MINUTES + seconds / 60) // 5) * 5)
+
+    def build(self, request: WorkoutRequest) -> WorkoutPlan:
+        exercises: List[Exercise] = []
+        session_minutes: List[int] = []
+        seen = Counter()
+        used_equipment = set()
+        multi_day = len(request.schedule) > 1
+        max_exercises = 4 if request.fatigued else 5 if request.level == 1 else 6
+        for number, key in enumerate(request.schedule, 1):
+            session = self.sessions[key]
+            day = f"Day {number}: {session['title']}" if multi_day else None
+            used: set = set()
+            picks = []
+            for slot, pattern in enumerate(session["slots"]):
+                exercise = self._pick(pattern, request, seen[key] + slot, used)
+                if exercise is not None:
+                    used.add(exercise["name"])
+                    picks.append(exercise)
+            seen[key] += 1
+            if session.get("circuit"):
+                day_exercises, minutes = self._circuit(picks, request, day)
+            else:
+                day_exercises = [self._prescribe(e, request, day) for e in picks[:max_exercises]]
+                # Respect an explicit time limit by dropping accessories from the end
+                while request.minutes and len(day_exercises) > 3 and self._minutes(day_exercises) > request.minutes:
+                    day_exercises.pop()
+                minutes = self._minutes(day_exercises)
+            used_equipment.update(exercise["equipment"] for exercise in picks[:len(day_exercises)])
+            session_minutes.append(minutes)
+            exercises.extend(day_exercises)
+
+        sessions = [self.sessions[key] for key in request.schedule]
+        focuses = {session["focus"] for session in sessions}
+        cardio = focuses == {"cardio"}
+        level = max(request.level - 1, 1) if request.fatigued else request.level
+        length = f"{len(request.schedule)}-day {request.title} program" if multi_day else f"{request.title} session"
+        safety = list(self.safety_notes["default"])
+        for flag, enabled in (("fatigued", request.fatigued), ("older", request.older), ("beginner", request.level == 1)):
+            if enabled:
+                safety.extend(self.safety_notes[flag])
+        if request.activity_note:
+            safety.append(request.activity_note)
+        return WorkoutPlan(
+            goal=f"{self.goals[request.goal]['label']} - {length}",
+            duration_minutes=max(session_minutes),
+            intensity=LEVELS[level],
+            focus=focuses.pop() if len(focuses) == 1 else "full body",
+            equipment=[name for tag, name in _EQUIPMENT_NAMES.items() if tag in used_equipment],
+            warm_up=self.warm_up["cardio" if cardio else "default"],
+            exercises=exercises,
+            cool_down=self.cool_down["cardio" if cardio else "default"],
+            progression=self.progression["endurance" if cardio else request.goal],
+            safety_notes=safety,
+        )
+
+    # ------------------------------------------------------------------- public
+
+    def generate(self, message: str, user_data: Dict[str, Any], fatigued: bool = False) -> Optional[GeneratedWorkout]:
+        """A personalized plan for a common-program request, or None when the crew should answer"""
+        started = time.perf_counter()
+        request, reason = self.parse(message, user_data or {}, fatigued)
+        result = None
+        if request is not None:
+            plan = self.build(request)
+            # Even the shortest template session overruns the time limit: let the coach fit it
+            if request.time_limit and plan.duration_minutes > -(-request.minutes // 5) * 5:
+                request, reason = None, "unsupported_time"
+        if request is not None:
+            program = "+".join(dict.fromkeys(request.schedule))
+            result = GeneratedWorkout(plan, program, len(request.schedule), (time.perf_counter() - started) * 1000)
+        with self._lock:
+            self.messages_seen += 1
+            if result:
+                self.generated[result.program] += 1
+            else:
+                self.misses[reason] += 1
+        if result:
+            print(f"[GENERATOR] {result.days}-day {result.program} plan generated locally in {result.elapsed_ms:.2f} ms")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            generated = sum(self.generated.values())
+            return {
+                "messages_seen": self.messages_seen,
+                "generated": generated,
+                "coverage": round(generated / self.messages_seen, 3) if self.messages_seen else 0.0,
+                "by_program": dict(self.generated),
+                "sent_to_crew": dict(self.misses),
+            }
+
+
+workout_generator = WorkoutGenerator()
+
+
+# -------------------------------------------------------------------- benchmark
+
+def _benchmark(repeats: int):
+    from .router import ROUTING_CONFIG
+    from .structured_output import render_markdown
+
+    with open(ROUTING_CONFIG, "r") as f:
+        examples = (yaml.safe_load(f) or {}).get("examples", {})
+    user_data = {
+        "profile": {"age": 34, "fitness_level": "intermediate", "goals": "muscle_gain"},
+        "activities": [{"date": f"2025-09-{day:02d}", "active_minutes": 55} for day in range(1, 15)],
+    }
+    generator = WorkoutGenerator()
+    covered = [m for m in examples.get("fitness", []) if generator.generate(m, user_data)]
+    wrong = [m for label in ("nutrition", "manager") for m in examples.get(label, []) if generator.generate(m, user_data)]
+    print(f"Generated locally: {covered}")
+    print(f"📊 coverage: {len(covered)}/{len(examples.get('fitness', []))} labeled fitness requests; "
+          f"{len(wrong)} nutrition/manager requests wrongly answered {wrong or ''}")
+
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):  # keep the per-plan log lines out of the timings
+        for _ in range(repeats):
+            for message in covered:
+                started = time.perf_counter()
+                render_markdown(generator.generate(message, user_data, fatigued=len(timings) % 5 == 0).plan)
+                timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    print(f"📊 generate + render: p50 {statistics.median(timings):.2f} ms   p95 {timings[int(len(timings) * 0.95)]:.2f} ms "
+          f"over {len(timings)} plans")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Coverage and latency of the local workout-plan generator")
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+    _benchmark(args.repeats)
@@ -0,0 +1,49 @@
+"""Template answers for the questions offered when the crew is unavailable."""
+
+from datetime import datetime
+
+from hack_seneca.chat_templates import LOCAL_SUGGESTIONS, TemplateEngine
+
+NOW = datetime(2025, 9, 12, 9, 0)
+USER_DATA = {
+    "profile": {"name": "Sam"},
+    "activities": [{"date": "2025-09-11", "steps": 9000, "distance_km": 6.1, "active_minutes": 50}],
+    "nutrition": [{"date": "2025-09-11", "calories_consumed": 2100, "protein_g": 120}],
+    "measurements": [
+        {"date": "2025-09-10", "weight": 71.5, "body_fat": 18.0},
+        {"date": "2025-09-01", "weight": 72.4, "body_fat": 18.6},
+    ],
+}
+
+
+def test_local_suggestions_are_answered_by_templates():
+    engine = TemplateEngine()
+    for message in LOCAL_SUGGESTIONS:
+        assert engine.answer(message, USER_DATA, now=NOW) is not None, message
+
+
+def _weight_answer(measurements):
+    return TemplateEngine().answer("Show my weight trend", {"measurements": measurements}, now=NOW)
+
+
+def test_weight_trend_skips_rows_without_a_weight():
+    answer = _weight_answer([
+        {"date": "2025-09-11", "weight": None, "body_fat": 17.5},
+        {"date": "2025-09-10", "body_fat": 17.9},
+        {"date": "2025-09-05", "weight": 71.5, "body_fat": 18.0},
+        {"date": "2025-09-01", "weight": 72.4, "body_fat": 18.6},
+    ])
+    assert answer.data["variant"] == "found"
+    assert "72.4 kg to **71.5 kg** (-0.9 kg, trending down)" in answer.response
+    assert "-0.6 points to 18.0%" in answer.response
+
+
+def test_weight_trend_without_body_fat_or_a_second_weight():
+    answer = _weight_answer([
+        {"date": "2025-09-10", "weight": 71.5, "body_fat": None},
+        {"date": "2025-09-01", "weight": 72.4, "body_fat": 18.6},
+    ])
+    assert answer.data["variant"] == "weight_only"
+    assert "None" not in answer.response
+    assert _weight_answer([{"date": "2025-09-10", "weight": 71.5}, {"date": "2025-09-01", "weight": None}]).data["variant"] == "single_weight_only"
+    assert _weight_answer([{"date": "2025-09-10", "weight": None, "body_fat": 18.0}]).data["variant"] == "empty"
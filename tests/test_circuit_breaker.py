@@ -0,0 +1,76 @@
+"""Opening, fail-fast rejection and half-open recovery of provider circuit breakers."""
+
+import pytest
+
+from hack_seneca import circuit_breaker as module
+from hack_seneca.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, caused_by_open_circuit
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(module.time, "monotonic", clock)
+    return clock
+
+
+def _calls(breaker, *outcomes):
+    for ok, seconds in outcomes:
+        breaker.before_call()
+        breaker.record(ok, seconds)
+
+
+def test_opens_on_failures_and_slow_calls_then_fails_fast(clock):
+    breaker = CircuitBreaker("groq", min_calls=4, slow_seconds=10, open_seconds=30)
+    _calls(breaker, (True, 1), (False, 1), (True, 1))
+    assert breaker.state == CLOSED  # under min_calls
+    _calls(breaker, (True, 11))
+    assert breaker.state == OPEN and breaker.is_open()
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.before_call()
+    assert raised.value.retry_in == 30
+    assert breaker.snapshot()["rejected"] == 1
+
+
+def test_old_failures_leave_the_window(clock):
+    breaker = CircuitBreaker("azure", min_calls=2, window_seconds=60)
+    _calls(breaker, (False, 1))
+    clock.now += 61
+    _calls(breaker, (True, 1), (True, 1))
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probe_closes_or_reopens(clock):
+    breaker = CircuitBreaker("flux", min_calls=1, open_seconds=30)
+    _calls(breaker, (False, 1))
+    clock.now += 30
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # one probe at a time
+    breaker.record(False, 1)
+    assert breaker.state == OPEN
+
+    clock.now += 30
+    breaker.before_call()
+    breaker.release()  # never reached the provider: the slot is free again
+    _calls(breaker, (True, 1))
+    assert breaker.state == CLOSED and breaker.snapshot()["recent_calls"] == 0
+
+
+def test_wrapped_open_circuit_errors_are_recognised():
+    try:
+        try:
+            raise CircuitOpenError("groq", 5)
+        except CircuitOpenError as e:
+            raise RuntimeError("Connection error") from e
+    except RuntimeError as wrapped:
+        assert caused_by_open_circuit(wrapped)
+    assert not caused_by_open_circuit(RuntimeError("timeout"))
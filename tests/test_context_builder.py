@@ -0,0 +1,50 @@
+"""Week-over-week deltas in the prompt digest."""
+
+import json
+
+from hack_seneca.context_builder import ContextBuilder
+from hack_seneca.user_store import PROFILES_FILE, RECORD_FILES, SESSION_LIMITS, UserDataStore
+
+
+def _store(tmp_path, days=20):
+    (tmp_path / PROFILES_FILE).write_text(json.dumps([{"user_id": "u1", "age": 30, "weight": 70}]))
+    rows = {
+        "activities": [{"user_id": "u1", "date": f"2025-09-{d:02d}", "steps": 1000 * d, "calories_burned": 2000} for d in range(1, days + 1)],
+        "measurements": [],
+        "nutrition": [{"user_id": "u1", "date": f"2025-09-{d:02d}", "calories_consumed": 2000 + d, "protein_g": 100} for d in range(1, days + 1)],
+    }
+    for kind, name in RECORD_FILES.items():
+        (tmp_path / name).write_text(json.dumps(rows[kind]))
+    return UserDataStore(data_dir=str(tmp_path))
+
+
+def test_session_data_carries_the_prior_week(tmp_path):
+    data = _store(tmp_path).user_data("u1", SESSION_LIMITS)
+    digest = ContextBuilder().build("u1", data)
+    # Days 14-20 average 17000 steps, days 7-13 average 10000
+    assert "17000 steps/day (+7000 vs prior week)" in digest.activities
+    assert "(+7 vs prior week)" in digest.nutrition
+
+
+def test_no_delta_without_a_prior_week(tmp_path):
+    data = _store(tmp_path, days=7).user_data("u1", SESSION_LIMITS)
+    assert "vs prior week" not in ContextBuilder().build("u1", data).activities
+
+
+def test_measurement_deltas_skip_missing_values():
+    rows = [
+        {"date": "2025-09-12", "weight": None, "body_fat": 17.5},
+        {"date": "2025-09-10", "body_fat": 17.9, "waist": 80},
+        {"date": "2025-09-05", "weight": 71.5, "body_fat": None},
+        {"date": "2025-09-01", "weight": 72.4},
+    ]
+    text = ContextBuilder._measurement_digest(rows, 3)
+    assert text.startswith("Latest (2025-09-12): 17.5% body fat")
+    assert "-0.9kg weight since 2025-09-01" in text
+    assert "-0.4 pts body fat since 2025-09-10" in text
+    assert "None" not in text
+
+
+def test_measurement_delta_dropped_without_an_earlier_value():
+    text = ContextBuilder._measurement_digest([{"date": "2025-09-10", "weight": 71.5}, {"date": "2025-09-01", "body_fat": 18}], 3)
+    assert text == "Latest (2025-09-10): 71.5kg"
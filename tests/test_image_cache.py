@@ -0,0 +1,59 @@
+"""Prompt lookup, blob dedupe and eviction in the image cache, across workers."""
+
+import json
+import os
+
+from hack_seneca.image_cache import ImageCache
+
+
+def _cache(tmp_path, **kwargs):
+    return ImageCache(root=str(tmp_path), fuzzy_threshold=kwargs.pop("fuzzy_threshold", 0.8), **kwargs)
+
+
+def test_rephrased_prompts_hit_and_identical_bytes_are_stored_once(tmp_path):
+    cache = _cache(tmp_path)
+    path = cache.put("Grilled chicken with quinoa and broccoli", b"png-1")
+    assert cache.get("a plate of broccoli, quinoa and grilled chicken") == path
+    assert cache.get("salmon with rice") is None
+
+    assert cache.put("chicken quinoa bowl", b"png-1") == path
+    stats = cache.stats()
+    assert (stats["prompts"], stats["blobs"], stats["hits"], stats["misses"]) == (2, 1, 1, 1)
+
+
+def test_fuzzy_lookup_respects_the_threshold(tmp_path):
+    cache = _cache(tmp_path)
+    path = cache.put("grilled chicken quinoa broccoli spinach", b"png-1")
+    assert cache.get("grilled chicken quinoa broccoli spinach lemon") == path
+    assert cache.get("grilled chicken rice") is None
+    assert _cache(tmp_path, fuzzy_threshold=None).get("grilled chicken quinoa broccoli spinach lemon") is None
+
+
+def test_least_recently_used_prompts_are_evicted_and_shared_blobs_kept(tmp_path):
+    cache = _cache(tmp_path, max_bytes=10, fuzzy_threshold=None)
+    shared = cache.put("oatmeal with berries", b"aaaa")
+    cache.put("porridge with berries", b"aaaa")
+    old = cache.put("avocado toast", b"bbbb")
+    cache.get("oatmeal with berries")
+    cache.put("green smoothie", b"cccc")
+    assert cache.get("avocado toast") is None and not os.path.exists(old)
+    assert cache.get("oatmeal with berries") == shared and os.path.exists(shared)
+    assert cache.stats()["bytes"] <= 10
+
+
+def test_workers_merge_the_manifest_instead_of_overwriting_it(tmp_path):
+    one = _cache(tmp_path, fuzzy_threshold=None)
+    other = _cache(tmp_path, fuzzy_threshold=None)
+    first = one.put("oatmeal with berries", b"aaaa")
+    second = other.put("avocado toast", b"bbbb")
+    assert _cache(tmp_path).stats()["prompts"] == 2
+
+    # A third worker over the size cap evicts everyone's least recently used prompts
+    third = _cache(tmp_path, max_bytes=8, fuzzy_threshold=None)
+    third.put("green smoothie", b"cccc")
+    assert not os.path.exists(first) and os.path.exists(second)
+    one.put("chicken salad", b"dddd")
+    assert one.get("oatmeal with berries") is None
+    with open(tmp_path / "manifest.json") as f:
+        prompts = sorted(entry["prompt"] for entry in json.load(f)["entries"])
+    assert prompts == ["avocado toast", "chicken salad", "green smoothie"]
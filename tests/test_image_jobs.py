@@ -0,0 +1,72 @@
+"""Background image jobs and their delivery to the owner's event stream."""
+
+import asyncio
+import threading
+import time
+
+from hack_seneca.image_jobs import DONE, FAILED, ImageJobQueue, image_owner
+
+DIGEST = "ab" * 32
+
+
+def _generator(release=None, fail=False):
+    def generate(prompt):
+        if release is not None:
+            release.wait(5)
+        if fail:
+            raise RuntimeError("FLUX timed out")
+        return f"/tmp/cas/ab/{DIGEST}.png"
+    return generate
+
+
+def _wait_for(queue, job, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while sum(queue.stats()[status] for status in (DONE, FAILED)) < queue.stats()["submitted"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+def test_submit_returns_before_generation_and_jobs_started_in_a_request_are_listed():
+    release = threading.Event()
+    queue = ImageJobQueue(_generator(release))
+    with image_owner("alice") as started:
+        job = queue.submit("grilled chicken")
+    assert job.status != DONE and job.owner == "alice" and started == [job.job_id]
+    assert queue.stats()["pending"] == 1
+    release.set()
+    data = _wait_for(queue, job).to_dict()
+    assert data["status"] == DONE and data["file_url"] == f"/api/images/{job.job_id}/file"
+    assert data["image_url"] == f"/static/images/{DIGEST}.png"
+
+
+def test_failures_are_reported_not_raised():
+    queue = ImageJobQueue(_generator(fail=True))
+    job = _wait_for(queue, queue.submit("salad", owner="alice"))
+    assert (job.status, job.error, job.file_url) == (FAILED, "FLUX timed out", None)
+    assert queue.stats()["failed"] == 1
+
+
+def test_event_stream_wakes_only_for_its_owner():
+    release = threading.Event()
+    queue = ImageJobQueue(_generator(release))
+
+    async def listen():
+        cursor = queue.latest_sequence()
+        waiting = asyncio.ensure_future(queue.wait_events("alice", cursor, 5.0))
+        await asyncio.sleep(0.05)
+        queue.submit("oatmeal", owner="bob")
+        mine = queue.submit("salmon", owner="alice")
+        started = time.monotonic()
+        release.set()
+        events = await waiting
+        return mine, events, time.monotonic() - started
+
+    mine, events, waited = asyncio.run(listen())
+    assert waited < 2.0
+    assert [(name, job["job_id"]) for _, name, job in events][-1] == ("image_ready", mine.job_id)
+    assert all(job["owner"] == "alice" for _, _, job in events)
+
+
+def test_idle_stream_times_out_empty():
+    queue = ImageJobQueue(_generator())
+    assert asyncio.run(queue.wait_events("alice", queue.latest_sequence(), 0.05)) == []
@@ -0,0 +1,67 @@
+"""Request traces, spans and the per-step metrics built from them."""
+
+import pytest
+
+from hack_seneca.instrumentation import TraceStore, current_trace_id, install_crew_instrumentation, span, trace_request
+
+
+def test_spans_attach_to_the_open_trace_only():
+    with span("outside"):
+        pass
+    with trace_request("chat", trace_id="abc") as trace:
+        assert current_trace_id() == "abc"
+        with span("route", kind="step", route="fitness"):
+            pass
+        with pytest.raises(ValueError):
+            with span("cache"):
+                raise ValueError("backend down")
+    assert current_trace_id() is None
+    assert [(s.name, s.error) for s in trace.spans] == [("route", None), ("cache", "backend down")]
+    assert trace.spans[0].attrs == {"route": "fitness"}
+
+
+def test_store_keeps_recent_traces_and_aggregates_steps():
+    store = TraceStore(max_traces=2)
+    for i in range(3):
+        with trace_request(f"chat {i}") as trace:
+            with span("route"):
+                pass
+        store.add(trace)
+    assert [t["label"] for t in store.recent()] == ["chat 2", "chat 1"]
+    (step,) = store.metrics()["steps"]
+    assert (step["kind"], step["name"], step["count"], step["errors"]) == ("step", "route", 3, 0)
+
+
+def test_crew_runs_are_traced_down_to_llm_calls(monkeypatch):
+    from hack_seneca import crew as crew_module
+    from hack_seneca.tiers import TIERS, _scripted_llm
+
+    llm = _scripted_llm(0.0)
+    monkeypatch.setattr(crew_module, "get_llm", lambda model=None: llm)
+    install_crew_instrumentation()
+    inputs = {
+        "user_id": "user_00001", "user_profile": "Age: 30", "user_activities": "n/a", "user_measurements": "n/a",
+        "user_nutrition": "n/a", "context": "This is the start of a new conversation.",
+        "knowledge": "No relevant notes.", "user_message": "Give me a push day workout",
+    }
+    with trace_request("chat") as trace:
+        crew_module.tier_crew(TIERS["fast"], "fitness").kickoff(inputs=inputs)
+    assert {"crew", "task", "agent"} <= {s.kind for s in trace.spans}
+    assert all(s.error is None for s in trace.spans)
+
+
+def test_llm_events_become_llm_spans():
+    from crewai.events import LLMCallCompletedEvent, LLMCallFailedEvent, LLMCallStartedEvent, crewai_event_bus
+
+    install_crew_instrumentation()
+    with trace_request("chat") as trace:
+        for outcome in ("ok", "failed"):
+            crewai_event_bus.emit(None, LLMCallStartedEvent(model="azure/gpt-4o", messages="hi"))
+            if outcome == "ok":
+                crewai_event_bus.emit(None, LLMCallCompletedEvent(model="azure/gpt-4o", messages="hi", response="hello", call_type="llm_call"))
+            else:
+                crewai_event_bus.emit(None, LLMCallFailedEvent(model="azure/gpt-4o", error="429 Too Many Requests"))
+    llm_spans = [s for s in trace.spans if s.kind == "llm"]
+    assert [(s.name, s.llm_calls, s.error) for s in llm_spans] == [
+        ("azure/gpt-4o", 1, None), ("azure/gpt-4o", 1, "429 Too Many Requests"),
+    ]
@@ -0,0 +1,92 @@
+"""Hedge budget under concurrent timeouts, per-provider pools and failover."""
+
+import threading
+import time
+
+from crewai.llms.base_llm import BaseLLM
+
+from hack_seneca.llm_router import HedgeBudget, HedgedLLM, LLMProvider
+
+
+class _FakeLLM(BaseLLM):
+    def __init__(self, name, delay=0.0, fail=False):
+        super().__init__(model=f"fake/{name}")
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.model} returned 503")
+        return self.model
+
+
+def _replay(budget, concurrency=8, rounds=50):
+    """Batches of concurrent calls that all time out and ask for a hedge together"""
+    granted = []
+    for _ in range(rounds):
+        barrier = threading.Barrier(concurrency)
+
+        def call():
+            budget.record_call()
+            barrier.wait()
+            if budget.try_acquire():
+                granted.append(1)
+
+        threads = [threading.Thread(target=call) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return len(granted)
+
+
+def test_concurrent_hedges_are_all_counted():
+    budget = HedgeBudget(max_ratio=0.1, window=1000, burst=2)
+    granted = _replay(budget)
+    assert granted == budget.hedges_in_window()
+    assert granted <= 2 + 0.1 * 400
+
+
+def test_hedges_stay_capped_in_a_sliding_window():
+    budget = HedgeBudget(max_ratio=0.1, window=200, burst=2)
+    granted = _replay(budget, rounds=100)  # 800 calls = 4 windows
+    assert budget.hedges_in_window() <= 2 + 0.1 * 200
+    assert granted <= 4 * (2 + 0.1 * 200)
+
+
+def test_no_hedges_beyond_the_burst_without_calls():
+    budget = HedgeBudget(max_ratio=0.1, burst=2)
+    assert [budget.try_acquire() for _ in range(4)] == [True, True, False, False]
+
+
+def test_slow_provider_is_hedged_to_the_other():
+    slow, fast = _FakeLLM("slow", delay=0.5), _FakeLLM("fast")
+    llm = HedgedLLM([LLMProvider("slow", slow), LLMProvider("fast", fast)], initial_delay=0.05)
+    llm.providers[1].profile.record(1.0, ok=True)  # rank "slow" first
+    assert llm.call("hi") == "fake/fast"
+    assert llm.stats()["hedges"] == 1 and llm.stats()["hedge_wins"] == 1
+    assert llm.providers[0].in_flight == 1  # the losing call runs on in its own provider's pool
+    deadline = time.monotonic() + 5
+    while llm.providers[0].in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert llm.providers[0].in_flight == 0
+
+
+def test_no_hedge_to_a_provider_whose_pool_is_busy():
+    slow = _FakeLLM("slow", delay=0.3)
+    llm = HedgedLLM([LLMProvider("only", slow)], initial_delay=0.05, workers_per_provider=1)
+    assert llm.call("hi") == "fake/slow"
+    stats = llm.stats()
+    assert (stats["hedges"], stats["hedges_saturated"], slow.calls) == (0, 1, 1)
+
+
+def test_failures_fail_over_and_are_printed_once(capsys):
+    broken, backup = _FakeLLM("broken", fail=True), _FakeLLM("backup")
+    llm = HedgedLLM([LLMProvider("broken", broken), LLMProvider("backup", backup)], hedging=False)
+    llm.providers[1].profile.record(100.0, ok=True)  # slow enough that "broken" stays first
+    assert [llm.call("hi") for _ in range(2)] == ["fake/backup"] * 2
+    assert llm.stats()["failovers"] == broken.calls == 2
+    assert capsys.readouterr().out.count("[LLM-ROUTER]") == 1
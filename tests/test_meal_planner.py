@@ -0,0 +1,77 @@
+"""Macro targets and the local meal-plan solver."""
+
+import pytest
+
+from hack_seneca import meal_planner as module
+from hack_seneca.meal_planner import (
+    derive_targets,
+    meal_plan_capture,
+    meal_planner,
+    plan_user,
+    record_plan,
+)
+
+PROFILES = [
+    {"weight": 70, "height": 175, "age": 30, "gender": "male", "goals": "maintenance"},
+    {"weight": 62, "height": 165, "age": 41, "gender": "female", "goals": "weight_loss"},
+    {"weight": 90, "height": 185, "age": 25, "gender": "male", "goals": "muscle_gain"},
+]
+
+
+def _within_targets(result, kcal_error=0.1):
+    for kcal, protein, _, _ in result.day_totals():
+        assert abs(kcal - result.targets.calories) <= kcal_error * result.targets.calories
+        assert protein >= 0.9 * result.targets.protein_g
+
+
+def test_targets_follow_goal_activity_and_intake_history():
+    base = derive_targets(PROFILES[0])
+    assert derive_targets({**PROFILES[0], "goals": "weight_loss"}).calories < base.calories
+    active = derive_targets(PROFILES[0], activities=[{"active_minutes": 100}] * 7)
+    assert active.calories > base.calories
+    eats_little = derive_targets(PROFILES[0], nutrition=[{"calories_consumed": 1500}] * 7)
+    assert eats_little.calories <= 2000 and "within 500 kcal" in eats_little.basis
+    assert derive_targets(PROFILES[0], calories=2500, protein_g=180).vector[:2] == (2500, 180)
+
+
+@pytest.mark.parametrize("profile", PROFILES)
+@pytest.mark.parametrize("meals_per_day", [3, 4, 5])
+def test_solved_days_hit_calorie_and_protein_targets(profile, meals_per_day):
+    result = meal_planner.plan(derive_targets(profile), days=1, meals_per_day=meals_per_day)
+    assert len(result.days[0]) == meals_per_day
+    _within_targets(result)
+
+
+def test_diets_and_exclusions_are_respected():
+    result = meal_planner.plan(derive_targets(PROFILES[0]), days=3, diet=["vegan", "keto-ish"], exclude=["tofu"])
+    meals = [meal for day in result.days for meal in day]
+    assert result.diet == ["vegan"]
+    assert all("vegan" in meal.recipe["tags"] for meal in meals)
+    assert not any("tofu" in " ".join([meal.recipe["name"]] + meal.recipe["ingredients"]).lower() for meal in meals)
+
+
+def test_a_week_varies_its_recipes():
+    result = meal_planner.plan(derive_targets(PROFILES[2]), days=7)
+    assert len(result.days) == 7
+    _within_targets(result, kcal_error=0.15)
+    names = [tuple(meal.recipe["name"] for meal in day) for day in result.days]
+    assert len(set(names)) == 7
+
+
+def test_pure_python_solver_matches_numpy(monkeypatch):
+    targets = derive_targets(PROFILES[1])
+    with_numpy = meal_planner.plan(targets, days=2)
+    monkeypatch.setattr(module, "NUMPY_AVAILABLE", False)
+    without = meal_planner.plan(targets, days=2)
+    assert without.day_totals() == with_numpy.day_totals()
+
+
+def test_plans_are_captured_only_inside_a_request():
+    result = meal_planner.plan(derive_targets(PROFILES[0]))
+    assert record_plan(result) is False and plan_user() is None
+    with meal_plan_capture("user_00001") as plans:
+        assert plan_user() == "user_00001"
+        assert record_plan(result) is True
+    assert plans == [result] and plan_user() is None
+    plan = result.to_plan()
+    assert plan.daily_calories == result.targets.calories and len(plan.meals) == 4
@@ -0,0 +1,61 @@
+"""Cache-friendly task prompt layout and the prefix cache model used to measure it."""
+
+import os
+from types import SimpleNamespace
+
+import yaml
+
+from hack_seneca.context_builder import count_tokens
+from hack_seneca.prompt_cache import (
+    CACHE_MIN_TOKENS,
+    DYNAMIC_MARKER,
+    PrefixCacheSimulator,
+    cacheable_tokens,
+    check_layout,
+    _user_inputs,
+    legacy_layout,
+)
+
+TASKS_YAML = os.path.join(os.path.dirname(__file__), "..", "src", "hack_seneca", "config", "tasks.yaml")
+
+
+def _tasks():
+    with open(TASKS_YAML) as f:
+        config = yaml.safe_load(f)
+    return [SimpleNamespace(name=name, **task) for name, task in config.items()]
+
+
+def test_shipped_tasks_keep_placeholders_below_the_marker():
+    assert check_layout(_tasks()) == []
+
+
+def test_placeholders_above_the_marker_are_reported():
+    task = SimpleNamespace(
+        name="bad", description=f"Help {{user_id}} now.\n{DYNAMIC_MARKER}\n{{user_message}}", expected_output="Text"
+    )
+    assert check_layout([task]) == ["bad: {user_id} above the dynamic block"]
+
+
+def test_cacheable_tokens_follow_the_provider_steps():
+    assert [cacheable_tokens(n) for n in (0, 1023, 1024, 1151, 1152, 2000)] == [0, 0, 1024, 1024, 1152, 1920]
+
+
+def test_static_first_layout_shares_a_cached_prefix_between_users():
+    task = next(task for task in _tasks() if task.name == "nutritionist_task")
+    # A static system prompt just under the provider minimum: only the static task text can push it over
+    static_tokens = count_tokens(task.description.split(DYNAMIC_MARKER)[0])
+    system = ""
+    while count_tokens(system) < CACHE_MIN_TOKENS - static_tokens // 2:
+        system += "You are Certified Nutritionist & Meal Planner. Rules for tools and answer format. "
+
+    def prompt(description, expected, user):
+        for key, value in _user_inputs(user, "High-protein vegetarian lunch").items():
+            description = description.replace("{" + key + "}", value)  # as CrewAI interpolates inputs
+        return system + description + expected
+
+    current, legacy = PrefixCacheSimulator(), PrefixCacheSimulator()
+    for user in (1, 2):
+        current.submit(prompt(task.description, task.expected_output, user))
+        legacy.submit(prompt(*legacy_layout(task.description, task.expected_output), user))
+    assert legacy.cached_tokens == 0
+    assert current.cached_tokens >= 1024
@@ -0,0 +1,40 @@
+"""Async waits in the fair queue and refunds."""
+
+import asyncio
+import threading
+import time
+
+from hack_seneca.rate_limiter import ModelLimiter
+
+
+def test_async_waiters_queue_without_threads():
+    limiter = ModelLimiter("test", "model", rpm=600, max_wait=5.0)  # one request every 0.1 s once drained
+    while limiter.try_acquire(1):
+        pass
+
+    async def burst():
+        threads = threading.active_count()
+        calls = [asyncio.create_task(limiter.acquire_async(1, f"user{i}")) for i in range(3)]
+        await asyncio.sleep(0.05)
+        assert threading.active_count() == threads
+        assert limiter.snapshot()["waiting"] == 3
+        return await asyncio.gather(*calls)
+
+    started = time.monotonic()
+    waits = asyncio.run(burst())
+    assert sorted(waits) == waits
+    assert 0.2 <= time.monotonic() - started < 1.0
+    assert limiter.snapshot()["waiting"] == 0
+
+
+def test_refund_wakes_an_async_waiter():
+    limiter = ModelLimiter("test", "model", rpm=1, max_wait=5.0)
+    assert limiter.try_acquire(1)
+
+    async def wait_for_refund():
+        call = asyncio.create_task(limiter.acquire_async(1))
+        await asyncio.sleep(0.05)
+        threading.Timer(0.05, limiter.refund, args=(1,)).start()
+        return await call
+
+    assert asyncio.run(wait_for_refund()) < 1.0
@@ -0,0 +1,72 @@
+"""Hits, misses, expiry and invalidation in the semantic response cache."""
+
+from hack_seneca import response_cache as module
+from hack_seneca.response_cache import ResponseCache
+from hack_seneca.shared_state import LocalSharedState
+
+PAYLOAD = {"response": "Day 1: push, day 2: pull, day 3: legs", "message_type": "workout"}
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _stored(**kwargs):
+    cache = ResponseCache(**kwargs)
+    cache.store("Give me a 3-day PPL split", "fitness", "muscle|intermediate|rested", "alice", PAYLOAD, 12.0)
+    return cache
+
+
+def test_rephrased_question_hits_and_other_questions_miss():
+    cache = _stored()
+    assert cache.lookup("3-day PPL split please", "fitness", "muscle|intermediate|rested") == PAYLOAD
+    assert cache.lookup("4-day PPL split please", "fitness", "muscle|intermediate|rested") is None
+    assert cache.lookup("3-day PPL split please", "nutrition", "muscle|intermediate|rested") is None
+    assert cache.lookup("3-day PPL split please", "fitness", "muscle|intermediate|tired") is None
+    assert cache.lookup("what should I eat after training", "fitness", "muscle|intermediate|rested") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["seconds_saved"]) == (1, 4, 12.0)
+
+
+def test_entries_expire_and_are_bounded(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(module.time, "time", clock)
+    cache = _stored(ttl_seconds=60, max_entries=2)
+    cache.store("post-workout meal", "nutrition", "any|any|rested", "bob", PAYLOAD, 1.0)
+    cache.store("best pre-workout snack", "nutrition", "any|any|rested", "bob", PAYLOAD, 1.0)
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup("3-day PPL split", "fitness", "muscle|intermediate|rested") is None  # evicted
+
+    clock.now += 61
+    assert cache.lookup("post-workout meal", "nutrition", "any|any|rested") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_profile_changes_invalidate_only_that_users_answers():
+    cache = _stored()
+    cache.store("post-workout meal", "nutrition", "any|any|rested", "bob", PAYLOAD, 1.0)
+    assert cache.observe_profile("alice", {"goals": "muscle"}) is False
+    assert cache.observe_profile("alice", {"goals": "muscle"}) is False
+    assert cache.observe_profile("alice", {"goals": "endurance"}) is True
+    assert cache.lookup("3-day PPL split", "fitness", "muscle|intermediate|rested") is None
+    assert cache.lookup("post-workout meal", "nutrition", "any|any|rested") == PAYLOAD
+
+
+def test_replayed_entries_keep_their_original_expiry(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(module.time, "time", clock)
+    backend = LocalSharedState()
+    one, other = ResponseCache(ttl_seconds=60), ResponseCache(ttl_seconds=60)
+    one.attach(backend)
+    other.attach(backend)
+    one.store("Give me a 3-day PPL split", "fitness", "any|any|rested", "alice", PAYLOAD, 12.0)
+
+    clock.now += 50
+    other._on_shared_event(next(iter(one._entries)), "set")  # what the listener does in another worker
+    assert other.lookup("3-day PPL split", "fitness", "any|any|rested") == PAYLOAD
+    clock.now += 11
+    assert other.lookup("3-day PPL split", "fitness", "any|any|rested") is None
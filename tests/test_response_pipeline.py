@@ -0,0 +1,26 @@
+"""Keyword matcher against plain substring search."""
+
+from hack_seneca.response_pipeline import KeywordMatcher, _sample_plan, analyze_response, matcher
+
+
+def _substring_hits(keyword_matcher, text):
+    return {keyword for keyword in keyword_matcher.keywords if keyword in text}
+
+
+def test_overlapping_keywords_are_all_found():
+    keyword_matcher = KeywordMatcher(["eat", "meat", "meal", "meals", "fitness", "fitness plan", "sets", "set", "setback"])
+    for text in ("great meals", "a fitness plan", "offsets", "mealsetback", "meat", "", "nothing here"):
+        assert keyword_matcher.scan(text) == _substring_hits(keyword_matcher, text), text
+
+
+def test_pipeline_keywords_match_substring_search():
+    text = _sample_plan(2).lower()
+    assert matcher.scan(text) == _substring_hits(matcher, text)
+
+
+def test_analysis_uses_the_keyword_hits():
+    analysis = analyze_response("Beginner upper body workout: 3 sets of 12 reps, about 30 minutes.")
+    assert analysis.message_type == "workout"
+    assert analysis.data["difficulty"] == "Beginner"
+    assert analysis.data["focus"] == "upper body"
+    assert analyze_response("Try a high protein breakfast with oats.").message_type == "nutrition"
@@ -0,0 +1,87 @@
+"""Conversation turns in the retrieval index stay bounded per user."""
+
+from hack_seneca.conversation import ConversationStore
+from hack_seneca.retrieval import RetrievalIndex
+
+
+def _index(tmp_path, **kwargs):
+    store = ConversationStore(db_path=str(tmp_path / "conversations.db"))
+    index = RetrievalIndex(knowledge_dir=str(tmp_path), conversations=store, rescan_seconds=3600, **kwargs)
+    return store, index
+
+
+def _turn_docs(index, user_id):
+    return sorted(doc.text for doc in index._docs.values() if doc.source == "conversation" and doc.scope == user_id)
+
+
+def _sync(index, user_id):
+    index.sync_conversations(user_id)
+    index._backfill.submit(lambda: None).result(timeout=5)
+
+
+def test_backfill_runs_off_the_request_path_and_keeps_recent_turns(tmp_path):
+    store, index = _index(tmp_path, turns_per_user=3)
+    for i in range(6):
+        store.append("alice", "old", "user", f"I ran {i} km on the trail")
+    store.append("bob", "old", "user", "I swim on Sundays")
+
+    index.sync_conversations("alice")
+    assert _turn_docs(index, "alice") == []  # the request doesn't wait for the backfill
+    index._backfill.submit(lambda: None).result(timeout=5)
+    assert _turn_docs(index, "alice") == [f"User: I ran {i} km on the trail" for i in (3, 4, 5)]
+    assert _turn_docs(index, "bob") == []
+
+    store.append("alice", "old", "user", "I ran 6 km on the trail")
+    index.sync_conversations("alice")
+    assert _turn_docs(index, "alice") == [f"User: I ran {i} km on the trail" for i in (4, 5, 6)]
+
+
+def test_least_recently_asked_users_are_evicted(tmp_path):
+    store, index = _index(tmp_path, turns_per_user=5, turn_users=2)
+    for user_id in ("alice", "bob", "carol"):
+        store.append(user_id, "old", "user", f"{user_id} likes rowing")
+    for user_id in ("alice", "bob", "alice", "carol"):
+        _sync(index, user_id)
+    assert _turn_docs(index, "bob") == []
+    assert _turn_docs(index, "alice") == ["User: alice likes rowing"]
+    assert _turn_docs(index, "carol") == ["User: carol likes rowing"]
+    assert index.stats()["conversation_users"] == 2
+
+
+def _user_data():
+    return {
+        "profile": {"age": 30, "fitness_level": "beginner", "goals": "endurance"},
+        "activities": [{"date": f"2025-09-{d:02d}", "steps": 8000 + d, "calories_burned": 2000 + d} for d in range(1, 8)],
+    }
+
+
+def test_unrelated_queries_inject_nothing(tmp_path):
+    _, index = _index(tmp_path)
+    assert index.notes_for("alice", _user_data(), "3-day PPL split") == ("No relevant notes.", set())
+    notes, sources = index.notes_for("alice", _user_data(), "calories burned on 2025-09-03")
+    assert "2025-09-03" in notes.splitlines()[0]
+    assert sources == {"record"}
+
+
+def test_notes_report_conversation_and_knowledge_sources(tmp_path):
+    (tmp_path / "reference").mkdir()
+    (tmp_path / "reference" / "guide.md").write_text("Deload every fourth week by cutting volume in half.")
+    store, index = _index(tmp_path)
+    store.append("alice", "old", "user", "My deload weeks feel too easy")
+    _sync(index, "alice")
+    notes, sources = index.notes_for("alice", _user_data(), "how should I deload", session_id="new")
+    assert sources == {"knowledge", "conversation"}
+    assert index.notes_for("alice", _user_data(), "how should I deload", session_id="old")[1] == {"knowledge"}
+
+
+def test_only_reference_and_owned_knowledge_files_are_indexed(tmp_path):
+    (tmp_path / "user_preference.txt").write_text("User name is John Doe. User is based in San Francisco.")
+    (tmp_path / "users" / "bob").mkdir(parents=True)
+    (tmp_path / "users" / "bob" / "notes.md").write_text("Bob trains for a marathon in San Francisco.")
+    (tmp_path / "reference").mkdir()
+    (tmp_path / "reference" / "hydration.md").write_text("Drink water before training in San Francisco heat.")
+    _, index = _index(tmp_path)
+    index.sync_knowledge(force=True)
+    texts = [hit.doc.text for hit in index.search("San Francisco", "alice")]
+    assert texts == ["Drink water before training in San Francisco heat."]
+    assert len(index.search("San Francisco", "bob")) == 2
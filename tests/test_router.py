@@ -0,0 +1,21 @@
+"""Keyword rules only short-cut the classifier when they aren't contradicted."""
+
+from hack_seneca.router import ROUTE_FITNESS, ROUTE_MANAGER, ROUTE_NUTRITION, get_router
+
+
+def test_lone_keyword_the_classifier_disagrees_with_goes_to_the_manager():
+    router = get_router()
+    assert router.keyword_hits("protein shake after gym") == {ROUTE_FITNESS: 1}
+    decision = router.route("protein shake after gym")
+    assert decision.route == ROUTE_MANAGER
+    assert decision.source == "fallback"
+    assert router.route("protein shake after gym", specialist_only=True).route == ROUTE_NUTRITION
+
+
+def test_rules_apply_when_the_classifier_agrees_or_several_keywords_match():
+    router = get_router()
+    assert router.route("How do I fix my squat form").source == "rules"
+    assert router.keyword_hits("best shoes for the gym") == {ROUTE_FITNESS: 1}
+    assert router.route("best shoes for the gym").route == ROUTE_MANAGER
+    decision = router.route("best shoes for gym workouts and squats")
+    assert (decision.route, decision.source) == (ROUTE_FITNESS, "rules")
@@ -0,0 +1,73 @@
+"""Session resolution, authentication and eviction in the session store."""
+
+import time
+
+from hack_seneca.sessions import SessionStore
+from hack_seneca.shared_state import SQLiteSharedState
+
+
+def _store(**kwargs):
+    loads = []
+
+    def loader(user_id):
+        loads.append(user_id)
+        return {"user_id": user_id, "activities": [{"steps": 1000}] * 10}
+
+    return SessionStore(loader=loader, **kwargs), loads
+
+
+def test_token_resolves_only_for_its_own_user():
+    store, _ = _store()
+    session = store.create("alice")
+    assert store.resolve(session.token, "alice") is session
+    assert store.resolve(session.token, None) is session
+    assert store.resolve(session.token, "bob") is None
+    assert store.resolve("forged", "alice") is None
+    assert store.resolve(None, None) is None
+
+
+def test_user_id_alone_never_attaches_to_an_existing_session():
+    store, _ = _store()
+    session = store.create("alice")
+    fallback = store.resolve(None, "alice")
+    assert fallback is not None and fallback.user_id == "alice"
+    assert fallback.token != session.token
+    assert store.resolve(None, "alice").token not in (session.token, fallback.token)
+
+
+def test_user_data_loads_once_and_reloads_after_invalidation():
+    store, loads = _store()
+    session = store.create("alice")
+    assert store.user_data(session)["user_id"] == "alice"
+    store.user_data(session)
+    assert loads == ["alice"]
+    store.invalidate_user_data("alice")
+    store.user_data(session)
+    assert loads == ["alice", "alice"]
+
+
+def test_expired_and_least_recently_used_sessions_are_dropped():
+    store, _ = _store(max_sessions=2)
+    first, second = store.create("a"), store.create("b")
+    store.get(first.token)
+    store.create("c")
+    assert store.get(second.token) is None
+    assert store.get(first.token) is first
+
+    store.ttl_seconds = 0
+    first.last_access -= 1
+    assert store.get(first.token) is None
+
+
+def test_tokens_resolve_across_workers_until_logout(tmp_path):
+    path = str(tmp_path / "shared.db")
+    one = SessionStore(loader=dict, shared=SQLiteSharedState(path))
+    other = SessionStore(loader=dict, shared=SQLiteSharedState(path))
+    session = one.create("alice")
+    assert other.resolve(session.token, "alice").user_id == "alice"
+    assert other.resolve(session.token, "bob") is None
+    one.end(session.token)
+    deadline = time.monotonic() + 5
+    while other.get(session.token) is not None and time.monotonic() < deadline:
+        time.sleep(0.05)  # the logout reaches the other worker on its next event poll
+    assert other.get(session.token) is None
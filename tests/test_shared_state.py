@@ -0,0 +1,58 @@
+"""Key/value TTLs, cross-worker events and the L1 cache of the shared-state backends."""
+
+import time
+
+from hack_seneca.response_cache import ResponseCache
+from hack_seneca.shared_state import LocalSharedState, SharedCache, SQLiteSharedState
+
+
+def _eventually(check, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not check() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return check()
+
+
+def test_values_round_trip_and_expire(tmp_path):
+    for backend in (LocalSharedState(), SQLiteSharedState(str(tmp_path / "shared.db"))):
+        backend.set("ns", "kept", {"a": [1, 2]})
+        backend.set("ns", "short", "x", ttl_seconds=0.05)
+        assert backend.get("ns", "kept") == {"a": [1, 2]}
+        assert backend.get("other", "kept") is None
+        time.sleep(0.1)
+        assert backend.get("ns", "short") is None
+        backend.delete("ns", "kept")
+        assert backend.get("ns", "kept") is None
+
+
+def test_events_reach_other_workers_but_not_their_origin(tmp_path):
+    path = str(tmp_path / "shared.db")
+    one, other = SQLiteSharedState(path, poll_interval=0.02), SQLiteSharedState(path, poll_interval=0.02)
+    seen_one, seen_other = [], []
+    one.subscribe("ns", lambda key, op: seen_one.append((key, op)))
+    other.subscribe("ns", lambda key, op: seen_other.append((key, op)))
+    one.publish("ns", "alice", "invalidate")
+    assert _eventually(lambda: seen_other == [("alice", "invalidate")])
+    assert seen_one == []
+
+
+def test_l1_is_dropped_when_another_worker_writes(tmp_path):
+    path = str(tmp_path / "shared.db")
+    one = SharedCache(SQLiteSharedState(path, poll_interval=0.02), "ns", l1_ttl_seconds=60)
+    other = SharedCache(SQLiteSharedState(path, poll_interval=0.02), "ns", l1_ttl_seconds=60)
+    one.set("k", 1)
+    assert other.get("k") == 1 and other.get("k") == 1
+    assert other.stats["l1_hits"] == 1
+    one.set("k", 2)
+    assert _eventually(lambda: other.get("k") == 2)
+
+
+def test_cached_answers_and_invalidations_are_shared(tmp_path):
+    path = str(tmp_path / "shared.db")
+    one, other = ResponseCache(), ResponseCache()
+    one.attach(SQLiteSharedState(path, poll_interval=0.02))
+    other.attach(SQLiteSharedState(path, poll_interval=0.02))
+    one.store("post-workout meal", "nutrition", "any|any|rested", "alice", {"response": "Eggs"}, 3.0)
+    assert _eventually(lambda: other.lookup("post workout meal", "nutrition", "any|any|rested") is not None)
+    one.invalidate_user("alice")
+    assert _eventually(lambda: other.lookup("post workout meal", "nutrition", "any|any|rested") is None)
@@ -0,0 +1,86 @@
+"""Coalescing of identical in-flight requests."""
+
+import asyncio
+import time
+
+import pytest
+
+from hack_seneca.single_flight import SingleFlight, normalize_text, request_key
+
+
+def _slow(calls, result="answer", delay=0.1, error=None):
+    def fn(message):
+        calls.append(message)
+        time.sleep(delay)
+        if error:
+            raise error
+        return f"{result}: {message}"
+    return fn
+
+
+def test_keys_ignore_case_and_whitespace_but_not_content():
+    assert request_key("alice", normalize_text("Push  Day ")) == request_key("alice", normalize_text("push day"))
+    assert request_key("alice", "push day") != request_key("bob", "push day")
+    assert request_key(b"\x00img") != request_key(b"\x00img2")
+
+
+def test_identical_concurrent_requests_run_once():
+    flight, calls = SingleFlight("chat"), []
+
+    async def burst():
+        return await asyncio.gather(*(flight.do("k", _slow(calls), "push day") for _ in range(5)))
+
+    assert asyncio.run(burst()) == ["answer: push day"] * 5
+    assert calls == ["push day"]
+    stats = flight.stats()
+    assert (stats["executed"], stats["coalesced"], stats["max_waiters"], stats["in_flight"]) == (1, 4, 4, 0)
+
+
+def test_different_keys_and_later_requests_run_again():
+    flight, calls = SingleFlight("chat"), []
+
+    async def run():
+        await asyncio.gather(flight.do("a", _slow(calls), "a"), flight.do("b", _slow(calls), "b"))
+        await flight.do("a", _slow(calls), "a")
+
+    asyncio.run(run())
+    assert sorted(calls) == ["a", "a", "b"]
+
+
+def test_errors_reach_every_waiter():
+    flight, calls = SingleFlight("chat"), []
+
+    async def burst():
+        fn = _slow(calls, error=RuntimeError("Azure down"))
+        return await asyncio.gather(*(flight.do("k", fn, "x") for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(burst())
+    assert [str(r) for r in results] == ["Azure down"] * 3
+    assert len(calls) == 1 and flight.stats()["errors"] == 1
+
+
+def test_waiters_still_get_the_answer_when_the_leader_disconnects():
+    flight, calls = SingleFlight("chat"), []
+
+    async def run():
+        leader = asyncio.ensure_future(flight.do("k", _slow(calls, delay=0.2), "x"))
+        await asyncio.sleep(0.05)
+        follower = asyncio.ensure_future(flight.do("k", _slow(calls), "x"))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == "answer: x"
+    assert calls == ["x"]
+
+
+def test_disabled_groups_run_every_request():
+    flight, calls = SingleFlight("chat", enabled=False), []
+
+    async def burst():
+        return await asyncio.gather(*(flight.do("k", _slow(calls, delay=0.01), "x") for _ in range(3)))
+
+    asyncio.run(burst())
+    assert len(calls) == 3
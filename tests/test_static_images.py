@@ -0,0 +1,50 @@
+"""Hash-named image files, WebP thumbnails and their static URLs."""
+
+import io
+import os
+
+import pytest
+
+from hack_seneca.image_cache import THUMBNAIL_SIZES, ImageCache, asset_urls, parse_asset_name
+
+Image = pytest.importorskip("PIL.Image")
+
+DIGEST = "ab" * 32
+
+
+def _png(color="red", size=(1024, 768)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_only_hash_names_at_configured_sizes_are_assets():
+    size = THUMBNAIL_SIZES[0]
+    assert parse_asset_name(f"{DIGEST}.png") == (DIGEST, None)
+    assert parse_asset_name(f"{DIGEST}_{size}.webp") == (DIGEST, size)
+    for name in (f"{DIGEST}_{size}.png", f"{DIGEST}.webp", f"{DIGEST}_99.webp", "../manifest.json", f"{DIGEST[:-1]}.png"):
+        assert parse_asset_name(name) is None
+
+
+def test_stored_images_get_thumbnails_and_static_urls(tmp_path):
+    cache = ImageCache(root=str(tmp_path))
+    path = cache.put("grilled chicken", _png())
+    digest = os.path.basename(path)[:-4]
+    for size in THUMBNAIL_SIZES:
+        with Image.open(cache.thumbnail_path(digest, size)) as thumbnail:
+            assert thumbnail.format == "WEBP" and max(thumbnail.size) == size
+    urls = asset_urls(path)
+    assert urls["image_url"] == f"/static/images/{digest}.png"
+    assert urls["thumbnail_url"] == f"/static/images/{digest}_{max(THUMBNAIL_SIZES)}.webp"
+    assert asset_urls("/somewhere/else.png") == {}
+
+
+def test_missing_thumbnails_are_rendered_on_request(tmp_path):
+    cache = ImageCache(root=str(tmp_path))
+    path = cache.put("grilled chicken", _png())
+    digest = os.path.basename(path)[:-4]
+    size = THUMBNAIL_SIZES[0]
+    os.remove(cache.thumbnail_path(digest, size))
+    assert cache.asset_path(digest, size) == cache.thumbnail_path(digest, size)
+    assert cache.asset_path(digest) == path
+    assert cache.asset_path("cd" * 32) is None and cache.asset_path("cd" * 32, size) is None
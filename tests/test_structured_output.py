@@ -0,0 +1,29 @@
+"""Typed specialist output rendered for the chat and the CLI."""
+
+from types import SimpleNamespace
+
+from hack_seneca.meal_planner import derive_targets, meal_planner, render_crew_output
+from hack_seneca.structured_output import NutritionPlan, WorkoutPlan
+
+
+def test_typed_plan_is_rendered_not_repr():
+    plan = WorkoutPlan(goal="strength", duration_minutes=45, exercises=[{"name": "Bench Press", "sets": 4, "reps": "6-8"}])
+    output = SimpleNamespace(pydantic=plan, raw='{"goal": "strength"}')
+    typed, text = render_crew_output(output)
+    assert typed is plan
+    assert "Bench Press" in text
+    assert "WorkoutPlan(" not in text and "{" not in text
+
+
+def test_prose_falls_back_to_raw():
+    output = SimpleNamespace(pydantic=None, raw="Assistant: Drink water.")
+    assert render_crew_output(output) == (None, "Drink water.")
+
+
+def test_solved_meals_replace_the_nutritionists():
+    solved = meal_planner.plan(derive_targets({"weight": 70, "height": 175, "age": 30}), 1, 3)
+    written = NutritionPlan(goal="cut", meals=[{"name": "Made-up salad", "calories": 100}])
+    typed, text = render_crew_output(SimpleNamespace(pydantic=written, raw=""), [solved])
+    assert typed.goal == "cut"
+    assert "Made-up salad" not in text
+    assert [meal.name for meal in typed.meals] == [meal.name for meal in solved.to_plan().meals]
@@ -0,0 +1,26 @@
+"""Tier selection and the scripted specialist answers of the tier benchmark."""
+
+import pytest
+
+from hack_seneca.router import ROUTE_MANAGER, RouteDecision
+from hack_seneca.structured_output import NutritionPlan, WorkoutPlan, render_markdown
+from hack_seneca.tiers import _NUTRITION, _WORKOUT, TIER_BALANCED, TIERS, resolve_tier
+
+
+def test_unknown_or_missing_tiers_get_the_default():
+    assert resolve_tier("FAST").name == "fast"
+    assert resolve_tier(None).name == resolve_tier("nonsense").name == TIER_BALANCED
+
+
+def test_only_thorough_always_goes_through_the_manager():
+    decision = RouteDecision("fitness", 0.9, "rules")
+    assert TIERS["thorough"].route_for(decision) == ROUTE_MANAGER
+    assert TIERS["fast"].route_for(decision) == TIERS["balanced"].route_for(decision) == "fitness"
+
+
+@pytest.mark.parametrize("schema, answer", [(WorkoutPlan, _WORKOUT), (NutritionPlan, _NUTRITION)])
+def test_scripted_answers_use_the_schema_fields(schema, answer):
+    assert set(answer) <= set(schema.model_fields)
+    plan = schema.model_validate(answer)
+    assert all(getattr(plan, field) for field in answer)
+    assert render_markdown(plan)
@@ -0,0 +1,55 @@
+"""The SQLite user repository answers like the JSON-backed store it replaces."""
+
+import pytest
+
+from hack_seneca.user_db import SQLiteUserRepository, import_json
+from hack_seneca.user_store import RECORD_FILES, SESSION_LIMITS, UserDataStore, write_synthetic_data
+
+
+def _both(tmp_path, users=15, records=12):
+    ids = write_synthetic_data(str(tmp_path), users, records)
+    repo = SQLiteUserRepository(str(tmp_path / "fitness.db"), import_from=str(tmp_path))
+    return repo, UserDataStore(str(tmp_path)), ids
+
+
+def test_lookups_match_the_json_store(tmp_path):
+    repo, store, ids = _both(tmp_path)
+    for user_id in (ids[0], ids[-1], "nobody"):
+        assert repo.profile(user_id) == store.profile(user_id)
+        assert repo.user_data(user_id) == store.user_data(user_id)
+        assert repo.user_data(user_id, SESSION_LIMITS) == store.user_data(user_id, SESSION_LIMITS)
+        for kind in RECORD_FILES:
+            assert repo.recent(user_id, kind) == store.recent(user_id, kind)
+            dates = sorted(row["date"] for row in store.recent(user_id, kind))
+            if dates:
+                start, end = dates[1], dates[-2]
+                assert repo.between(user_id, kind, start, end) == store.between(user_id, kind, start, end)
+    fields = ["calories_consumed", "protein_g"]
+    got, expected = repo.aggregate(ids[0], "nutrition", fields), store.aggregate(ids[0], "nutrition", fields)
+    assert got["count"] == expected["count"]
+    for field in fields:
+        assert got[field] == pytest.approx(expected[field])
+
+
+def test_reimport_is_idempotent_and_writes_replace_by_date(tmp_path):
+    repo, store, ids = _both(tmp_path)
+    before = repo.stats()
+    import_json(str(tmp_path), repo)
+    assert repo.stats()["records"] == before["records"] and repo.stats()["users"] == before["users"]
+
+    newest = dict(store.recent(ids[0], "activities", 1)[0], steps=1, notes="rest day")
+    repo.add_records("activities", [newest])
+    assert repo.recent(ids[0], "activities", 1) == [newest]
+    assert repo.stats()["records"]["activities"] == before["records"]["activities"]
+
+
+def test_extra_fields_round_trip_and_unknown_columns_raise(tmp_path):
+    repo = SQLiteUserRepository(str(tmp_path / "fitness.db"))
+    profile = {"user_id": "u1", "name": "Ana", "age": 30, "goals": ["strength", "mobility"], "injuries": {"knee": "left"}}
+    repo.upsert_profiles([profile])
+    assert repo.profile("u1") == profile
+
+    repo.add_records("measurements", [{"user_id": "u1", "date": "2026-01-02", "weight_kg": 70.5}])
+    assert repo.recent("u1", "measurements")[0]["measurement_id"] == "measurement_u1_2026-01-02"
+    with pytest.raises(KeyError):
+        repo.aggregate("u1", "measurements", ["shoe_size"])
@@ -0,0 +1,48 @@
+"""Indexed user-data lookups and reloads in the JSON-backed store."""
+
+import json
+import os
+
+from hack_seneca.user_store import RECENT_LIMITS, UserDataStore, _legacy_login, write_synthetic_data
+
+
+def _store(tmp_path, users=20, records=10, **kwargs):
+    ids = write_synthetic_data(str(tmp_path), users, records)
+    return UserDataStore(str(tmp_path), **kwargs), ids
+
+
+def test_logins_match_the_previous_load_filter_sort_path(tmp_path):
+    store, ids = _store(tmp_path)
+    for user_id in (ids[0], ids[-1]):
+        data = store.user_data(user_id)
+        legacy = _legacy_login(str(tmp_path), user_id)
+        assert {kind: data[kind] for kind in legacy} == legacy
+        assert len(data["activities"]) == RECENT_LIMITS["activities"]
+    assert store.user_data("nobody") == {"user_id": "nobody", "profile": None, "activities": [],
+                                         "measurements": [], "nutrition": []}
+    assert store.loads == 1
+
+
+def test_ranges_and_aggregates_skip_missing_values(tmp_path):
+    store, ids = _store(tmp_path)
+    rows = store.recent(ids[0], "nutrition")
+    dates = sorted(row["date"] for row in rows)
+    window = store.between(ids[0], "nutrition", dates[2], dates[5])
+    assert [row["date"] for row in window] == dates[5:1:-1]
+    summary = store.aggregate(ids[0], "nutrition", ["calories_consumed", "fiber_g"], dates[2], dates[5])
+    values = [row["calories_consumed"] for row in window]
+    assert summary["count"] == 4
+    assert summary["calories_consumed"] == {"avg": sum(values) / 4, "min": min(values), "max": max(values)}
+    assert summary["fiber_g"] == {"avg": None, "min": None, "max": None}
+
+
+def test_changed_files_are_reindexed(tmp_path):
+    store, ids = _store(tmp_path, reload_seconds=0)
+    assert store.profile(ids[0])["user_id"] == ids[0]
+    path = tmp_path / "fitness-users.json"
+    profiles = json.loads(path.read_text())
+    profiles[0]["goals"] = "endurance"
+    path.write_text(json.dumps(profiles))
+    os.utime(path, (0, os.path.getmtime(path) + 10))
+    assert store.profile(ids[0])["goals"] == "endurance"
+    assert store.loads == 2
@@ -0,0 +1,46 @@
+"""Requests the workout templates can't meet go to the crew instead of a default plan."""
+
+import pytest
+
+from hack_seneca.workout_generator import WorkoutGenerator
+
+USER_DATA = {
+    "profile": {"age": 34, "fitness_level": "intermediate", "goals": "muscle_gain"},
+    "activities": [{"date": f"2025-09-{day:02d}", "active_minutes": 55} for day in range(1, 15)],
+}
+
+
+@pytest.fixture(scope="module")
+def generator():
+    return WorkoutGenerator()
+
+
+@pytest.mark.parametrize("message, reason", [
+    ("workout for my chest", "unsupported_target"),
+    ("a 7 day workout plan", "unsupported_days"),
+    ("4 day push pull legs plan", "unsupported_days"),
+])
+def test_unsupported_requests_are_not_parsed(generator, message, reason):
+    assert generator.parse(message, USER_DATA) == (None, reason)
+
+
+def test_time_limit_shorter_than_any_template_goes_to_crew(generator):
+    assert generator.generate("10 minute ab workout", USER_DATA) is None
+    assert generator.misses["unsupported_time"] == 1
+
+
+@pytest.mark.parametrize("message, program, days", [
+    ("give me a push day workout", "push", 1),
+    ("6 day push pull legs plan", "push+pull+legs", 6),
+    ("3 day workout plan", "full_body", 3),
+    ("20 minute hiit workout", "hiit", 1),
+])
+def test_supported_requests_are_generated(generator, message, program, days):
+    generated = generator.generate(message, USER_DATA)
+    assert generated is not None
+    assert (generated.program, generated.days) == (program, days)
+
+
+def test_time_limit_is_respected(generator):
+    generated = generator.generate("20 minute hiit workout", USER_DATA)
+    assert generated.plan.duration_minutes <= 20